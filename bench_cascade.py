@@ -0,0 +1,146 @@
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+# -------------------------------
+# Cascade benchmark
+# -------------------------------
+# Runs packmat_counter.VideoProcessor over the same clips twice, once with the
+# full model on every frame (baseline) and once in cascade mode, and reports
+# per-class count agreement, processing fps and the detector time saved. The
+# baseline per-frame model time is measured on sample frames of each clip.
+#
+#   python bench_cascade.py videos/a.mp4 videos/b.mp4 --full-model packmat_i2.pt \
+#       --light-model packmat_n.pt --light-imgsz 320
+#   python bench_cascade.py            # synthetic clip, stub detectors
+
+BENCH_CAMERA = "cascade_bench"
+
+
+def _write_config(path, cascade_cfg, zones):
+    entry = {"zones": zones} if zones else {}
+    configs = {BENCH_CAMERA + "_base": dict(entry), BENCH_CAMERA: dict(entry, cascade=cascade_cfg)}
+    with open(path, "w") as f:
+        json.dump(configs, f, indent=2)
+
+
+def baseline_ms_per_frame(model_path, clip, samples=30):
+    import cv2
+    from model_registry import get_model, resolve_device
+    from raw_detections import run_detector
+    device = resolve_device()
+    model = get_model(model_path, device)
+    cap = cv2.VideoCapture(clip)
+    frames = []
+    while len(frames) < samples:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    run_detector(model, frames[0], conf=0.25, verbose=False, device=device)  # warm-up
+    start = time.perf_counter()
+    for frame in frames:
+        run_detector(model, frame, conf=0.25, verbose=False, device=device)
+    return (time.perf_counter() - start) * 1000 / len(frames)
+
+
+def run_clip(clip, camera_id, model_path):
+    from packmat_counter import VideoProcessor
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        processor = VideoProcessor(clip, model_path, camera_id=camera_id)
+        start = time.perf_counter()
+        processor.process_video()
+        seconds = time.perf_counter() - start
+    frames = processor.cascade_report["frames"] if processor.cascade_report else None
+    return {
+        "counts": processor.zone_counter.counts_by_class(),
+        "seconds": seconds,
+        "cascade": processor.cascade_report,
+        "frames": frames
+    }
+
+
+def count_disagreement(base, other):
+    labels = set(base) | set(other)
+    return sum(abs(base.get(l, 0) - other.get(l, 0)) for l in labels)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cascade vs full-model counts and compute")
+    parser.add_argument("clips", nargs="*", help="recorded clips (default: a generated synthetic clip)")
+    parser.add_argument("--full-model", default="stub:20")
+    parser.add_argument("--light-model", default="stub:3")
+    parser.add_argument("--light-imgsz", type=int, default=None)
+    parser.add_argument("--near-frac", type=float, default=0.15)
+    parser.add_argument("--ambiguous", type=float, nargs=2, default=[0.25, 0.6])
+    parser.add_argument("--zones", default=None, help="camera id whose zones to use from camera_config.json")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="max per-clip miscount vs baseline as a share of the baseline count")
+    parser.add_argument("--out", default="cascade_report.json")
+    args = parser.parse_args()
+
+    zones = None
+    if args.zones:
+        from camera_config import load_camera_config
+        zones = load_camera_config(args.zones).get("zones")
+    out_path = os.path.abspath(args.out)
+    clips = [os.path.abspath(c) for c in args.clips]
+    workdir = tempfile.mkdtemp(prefix="packmat_cascade_")
+    cwd = os.getcwd()
+    os.chdir(workdir)  # outputs/ and the bench camera_config.json go here
+    try:
+        if not clips:
+            from synthetic_source import SyntheticScene, write_clip
+            clips = [write_clip(os.path.join(workdir, "synthetic.mp4"), SyntheticScene(spacing=60), 600)]
+        _write_config("camera_config.json", {"light_model": args.light_model, "light_imgsz": args.light_imgsz,
+                                             "near_frac": args.near_frac, "ambiguous": args.ambiguous}, zones)
+
+        results = []
+        ok = True
+        for clip in clips:
+            base = run_clip(clip, BENCH_CAMERA + "_base", args.full_model)
+            cascade = run_clip(clip, BENCH_CAMERA, args.full_model)
+            frames = cascade["frames"]
+            report = dict(cascade["cascade"])
+            baseline_ms = baseline_ms_per_frame(args.full_model, clip)
+            report["baseline_ms_per_frame"] = round(baseline_ms, 2)
+            report["compute_saved"] = round(1 - report["cascade_ms_per_frame"] / baseline_ms, 4)
+            miss = count_disagreement(base["counts"], cascade["counts"])
+            error = miss / max(sum(base["counts"].values()), 1)
+            passed = error <= args.tolerance
+            ok = ok and passed
+            results.append({
+                "clip": clip,
+                "baseline_counts": base["counts"],
+                "cascade_counts": cascade["counts"],
+                "miscount": miss,
+                "error": round(error, 4),
+                "passes": passed,
+                "baseline_fps": round(frames / base["seconds"], 1),
+                "cascade_fps": round(frames / cascade["seconds"], 1),
+                "cascade": report
+            })
+            print(f"[CASCADE] {os.path.basename(clip)}: counts {base['counts']} vs {cascade['counts']} "
+                  f"(miscount {miss}), {report['escalation_rate']:.0%} frames escalated {report['reasons']}, "
+                  f"detector {report['cascade_ms_per_frame']:.1f} vs {baseline_ms:.1f} ms/frame "
+                  f"({report['compute_saved']:.0%} saved), fps {results[-1]['baseline_fps']} -> "
+                  f"{results[-1]['cascade_fps']}{'' if passed else '  FAIL'}")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(out_path, "w") as f:
+        json.dump({"full_model": args.full_model, "light_model": args.light_model,
+                   "tolerance": args.tolerance, "clips": results}, f, indent=2)
+    print(f"[CASCADE] {'OK' if ok else 'FAILED'}; report: {out_path}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
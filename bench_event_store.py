@@ -0,0 +1,107 @@
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from event_store import EventSink, EventStore
+
+# -------------------------------
+# Event store benchmark
+# -------------------------------
+# Fills a temporary event store with --days of synthetic crossings for
+# --cameras cameras, checks that aggregate() agrees with the generated totals,
+# and times typical range / group-by queries, cold (first mapping of every
+# partition) and warm.
+#
+#   python bench_event_store.py --days 90 --cameras 8 --per-day 2000
+
+LABELS = ("jerrycan_bundle", "carton", "carton_brown")
+
+
+def fill(root, days, cameras, per_day, seed=0):
+    rng = np.random.default_rng(seed)
+    first_day = date.today() - timedelta(days=days - 1)
+    truth = {}
+    for d in range(days):
+        day = first_day + timedelta(days=d)
+        day_start = time.mktime(day.timetuple())
+        for camera_id in range(1, cameras + 1):
+            offsets = np.sort(rng.uniform(0, 86400, per_day))
+            labels = rng.integers(0, len(LABELS), per_day)
+            # One truck visit per ~200 crossings
+            for v, chunk in enumerate(np.array_split(np.arange(per_day), max(1, per_day // 200))):
+                sink = EventSink(camera_id, f"tv_{day.isoformat()}_{camera_id}_{v}", root=root,
+                                 flush_every=10 ** 9, flush_seconds=10 ** 9)
+                for i in chunk:
+                    sink.record([{"track_id": int(i), "label": LABELS[labels[i]]}], ts=day_start + offsets[i])
+                sink.close()
+            for i in range(len(LABELS)):
+                truth[(str(camera_id), LABELS[i])] = truth.get((str(camera_id), LABELS[i]), 0) + \
+                    int((labels == i).sum())
+    return first_day, truth
+
+
+def timed(fn, repeats):
+    times = []
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return result, times
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Event store fill + query timing")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--cameras", type=int, default=8)
+    parser.add_argument("--per-day", type=int, default=2000, help="crossings per camera per day")
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(prefix="packmat_events_")
+    try:
+        start = time.perf_counter()
+        first_day, truth = fill(root, args.days, args.cameras, args.per_day)
+        total = args.days * args.cameras * args.per_day
+        print(f"[BENCH] {total} events in {args.days * args.cameras} partitions, "
+              f"written in {time.perf_counter() - start:.1f}s")
+
+        store = EventStore(root)
+        all_time = (None, None)
+        last_week = (datetime.combine(date.today() - timedelta(days=6), datetime.min.time()), None)
+        queries = [
+            ("total, all days", all_time, ()),
+            ("camera x class, all days", all_time, ("camera", "label")),
+            ("camera x day, all days", all_time, ("camera", "day")),
+            ("camera x shift, all days", all_time, ("camera", "shift")),
+            ("hour, last 7 days", last_week, ("hour",)),
+        ]
+        ok = True
+        for name, (q_start, q_end), group_by in queries:
+            store._cache.clear()
+            _, cold = timed(lambda: store.aggregate(q_start, q_end, group_by), 1)
+            rows, warm = timed(lambda: store.aggregate(q_start, q_end, group_by), args.repeats)
+            print(f"[BENCH] {name:<28} {len(rows):>6} rows  cold {cold[0]:8.1f} ms  "
+                  f"warm {statistics.median(warm):8.1f} ms")
+            if q_start is None and sum(r["count"] for r in rows) != total:
+                ok = False
+                print(f"[BENCH] MISMATCH: {name} sums to {sum(r['count'] for r in rows)}, expected {total}")
+
+        by_class = {(r["camera"], r["label"]): r["count"] for r in store.aggregate(group_by=("camera", "label"))}
+        if by_class != truth:
+            ok = False
+            print("[BENCH] MISMATCH: per camera / class counts differ from the generated events")
+        print("[BENCH] OK" if ok else "[BENCH] FAILED")
+        return 0 if ok else 1
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,88 @@
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+# -------------------------------
+# Import-time benchmark
+# -------------------------------
+# Measures how long a fresh interpreter needs to import the HTTP entry points
+# (index / index2) and lists the slowest modules from `python -X importtime`.
+# The background warm-up thread is started by the import but not waited for;
+# the heavy-module check runs with PACKMAT_WARMUP=0 so it only sees what the
+# import itself pulled in.
+#
+#   python bench_import_time.py --runs 5 --budget 1.0
+
+ENTRY_POINTS = ["index", "index2"]
+HEAVY_MODULES = ["torch", "ultralytics", "cv2", "mysql.connector"]
+
+
+def _run_import(module, warmup):
+    code = (
+        "import time, sys; t = time.perf_counter(); "
+        f"import {module}; "
+        "print('BENCH_SECONDS=%f' % (time.perf_counter() - t)); "
+        f"print('BENCH_HEAVY=' + ','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    env = dict(os.environ, PACKMAT_WARMUP="1" if warmup else "0")
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    if out.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{out.stderr}")
+    # The warm-up thread may print too, so pick out our own lines
+    values = dict(line.split("=", 1) for line in out.stdout.splitlines() if line.startswith("BENCH_"))
+    return float(values["BENCH_SECONDS"]), values["BENCH_HEAVY"]
+
+
+def time_import(module, runs):
+    timings = [_run_import(module, warmup=True)[0] for _ in range(runs)]
+    _, heavy = _run_import(module, warmup=False)
+    return timings, heavy
+
+
+def slowest_modules(module, top=10):
+    env = dict(os.environ, PACKMAT_WARMUP="0")
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                         capture_output=True, text=True, env=env,
+                         cwd=os.path.dirname(os.path.abspath(__file__)))
+    rows = []
+    for line in out.stderr.splitlines():
+        m = re.match(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|\s+(.*)", line)
+        if m:
+            rows.append((int(m.group(2)), m.group(3).rstrip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark HTTP layer import time")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=1.0, help="max median import time in seconds")
+    parser.add_argument("--modules", nargs="+", default=ENTRY_POINTS)
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        start = time.time()
+        timings, heavy = time_import(module, args.runs)
+        median = statistics.median(timings)
+        print(f"[BENCH] import {module}: median {median * 1000:.0f} ms, "
+              f"min {min(timings) * 1000:.0f} ms, max {max(timings) * 1000:.0f} ms "
+              f"({args.runs} runs, {time.time() - start:.1f}s)")
+        if heavy:
+            print(f"[BENCH]   heavy modules imported synchronously: {heavy}")
+        for cumulative_us, name in slowest_modules(module):
+            print(f"[BENCH]   {cumulative_us / 1000:8.1f} ms  {name}")
+        if median > args.budget:
+            print(f"[BENCH] import {module} exceeds budget of {args.budget:.2f}s")
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
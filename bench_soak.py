@@ -0,0 +1,161 @@
+import argparse
+import contextlib
+import gc
+import os
+import shutil
+import sys
+import tempfile
+import time
+import weakref
+
+from synthetic_source import SyntheticScene, SyntheticCapture, StubDetector
+from model_registry import register_model
+
+# -------------------------------
+# Soak benchmark
+# -------------------------------
+# Drives many back-to-back sessions of packmat_counter_g.VideoProcessor over
+# accelerated synthetic streams (stub detector, no camera or GPU) and checks
+# that process RSS, open file descriptors and thread count stay flat, that
+# every session's processor is garbage collected, and that the tracker / zone
+# counter state stays bounded within one long "shift" session.
+#
+#   python bench_soak.py --sessions 40 --frames 200 --shift-frames 5000
+
+STUB_MODEL = "soak_stub.pt"
+
+
+def _proc_status(field):
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return 0
+
+
+def sample():
+    return {
+        "rss_mb": _proc_status("VmRSS") / 1024.0,
+        "fds": len(os.listdir("/proc/self/fd")),
+        "threads": _proc_status("Threads")
+    }
+
+
+def run_session(index, scene, frames, camera_id="soak"):
+    from packmat_counter_g import VideoProcessor
+    session_id = f"soak_{index}"
+    processor = VideoProcessor(None, model_path=STUB_MODEL, camera_id=camera_id, session_id=session_id,
+                               capture=SyntheticCapture(scene, frames))
+    count = processor.process_video()
+    output_path = processor.output_path
+    ref = weakref.ref(processor)
+    del processor
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    return count, ref
+
+
+def run_shift(scene, frames, camera_id="soak_shift"):
+    """One long session, tracking the peak size of the per-track structures."""
+    from packmat_counter_g import VideoProcessor
+    processor = VideoProcessor(None, model_path=STUB_MODEL, camera_id=camera_id,
+                               capture=SyntheticCapture(scene, frames))
+    peak = {"tracks": 0, "counted_ids": 0, "zone_counted": 0}
+    update = processor.zone_counter.update
+
+    def checked_update(tracks):
+        events = update(tracks)
+        peak["tracks"] = max(peak["tracks"], len(tracks))
+        peak["counted_ids"] = max(peak["counted_ids"], len(processor.tracker.counted_ids))
+        peak["zone_counted"] = max(peak["zone_counted"], len(processor.zone_counter.counted))
+        return events
+
+    processor.zone_counter.update = checked_update
+    count = processor.process_video()
+    peak["tracks_created"] = processor.tracker.next_id
+    peak["count"] = count
+    if os.path.exists(processor.output_path):
+        os.remove(processor.output_path)
+    return peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Back-to-back session soak: RSS / fds / threads must stay flat")
+    parser.add_argument("--sessions", type=int, default=40)
+    parser.add_argument("--frames", type=int, default=200, help="frames per session")
+    parser.add_argument("--warmup", type=int, default=5, help="sessions before the baseline sample")
+    parser.add_argument("--shift-frames", type=int, default=5000, help="length of the long session (0 to skip)")
+    parser.add_argument("--width", type=int, default=960)
+    parser.add_argument("--height", type=int, default=540)
+    parser.add_argument("--rss-tolerance-mb", type=float, default=16.0)
+    args = parser.parse_args()
+
+    register_model(STUB_MODEL, "cuda", StubDetector())
+    scene = SyntheticScene(args.width, args.height)
+
+    workdir = tempfile.mkdtemp(prefix="packmat_soak_")
+    cwd = os.getcwd()
+    os.chdir(workdir)  # outputs/ and checkpoints/ go to a scratch dir
+    failures = []
+    report = sys.stdout
+    try:
+        # Per-frame logging would dominate the run
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            baseline = None
+            leaked = 0
+            samples = []
+            start = time.time()
+            for i in range(args.sessions):
+                count, ref = run_session(i, scene, args.frames)
+                gc.collect()
+                if ref() is not None:
+                    leaked += 1
+                s = sample()
+                samples.append(s)
+                if i + 1 == args.warmup:
+                    baseline = s
+                print(f"[SOAK] session {i + 1:>3}/{args.sessions} count={count:>3} "
+                      f"rss={s['rss_mb']:.1f} MB fds={s['fds']} threads={s['threads']}", file=report)
+            elapsed = time.time() - start
+            shift = run_shift(scene, args.shift_frames) if args.shift_frames else None
+            gc.collect()
+            after_shift = sample()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    baseline = baseline or samples[0]
+    final = samples[-1]
+    rss_growth = final["rss_mb"] - baseline["rss_mb"]
+    print(f"[SOAK] {args.sessions} sessions x {args.frames} frames in {elapsed:.1f}s "
+          f"({args.sessions * args.frames / elapsed:.0f} fps)")
+    print(f"[SOAK] after warm-up: rss {baseline['rss_mb']:.1f} -> {final['rss_mb']:.1f} MB ({rss_growth:+.1f}), "
+          f"fds {baseline['fds']} -> {final['fds']}, threads {baseline['threads']} -> {final['threads']}")
+
+    if rss_growth > args.rss_tolerance_mb:
+        failures.append(f"RSS grew {rss_growth:.1f} MB (> {args.rss_tolerance_mb} MB)")
+    if final["fds"] > baseline["fds"]:
+        failures.append(f"open fds grew {baseline['fds']} -> {final['fds']}")
+    if final["threads"] > baseline["threads"]:
+        failures.append(f"threads grew {baseline['threads']} -> {final['threads']}")
+    if leaked:
+        failures.append(f"{leaked} session processors were not garbage collected")
+
+    if shift is not None:
+        print(f"[SOAK] shift session: {args.shift_frames} frames, {shift['tracks_created']} tracks, "
+              f"count={shift['count']}, peak live tracks={shift['tracks']}, "
+              f"peak counted_ids={shift['counted_ids']}, peak zone counted={shift['zone_counted']}, "
+              f"rss after {after_shift['rss_mb']:.1f} MB")
+        bound = max(shift["tracks"], 1)
+        if shift["counted_ids"] > bound or shift["zone_counted"] > bound:
+            failures.append("per-track counted state outgrew the live tracks")
+
+    if failures:
+        for f in failures:
+            print(f"[SOAK] FAIL: {f}")
+        sys.exit(1)
+    print("[SOAK] OK: memory, descriptors and threads flat")
+
+
+if __name__ == "__main__":
+    main()
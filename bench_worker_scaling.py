@@ -0,0 +1,194 @@
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+
+from frame_ring import SharedFrameRing, RingCapture
+from tracking import ObjectTracker, apply_nms
+from counting_zones import ZoneCounter, default_zones, draw_zones
+import camera_worker
+
+# -------------------------------
+# Worker scaling benchmark
+# -------------------------------
+# Runs N synthetic cameras (N = number of cores the benchmark is pinned to) in
+# thread mode (all in one process, like index2 today) and in process mode
+# (capture + processing process per camera over SharedFrameRing) and reports
+# aggregate processed FPS. The per-frame work is the real tracker, zone
+# counter and overlay drawing plus a fixed amount of Python work standing in
+# for detection post-processing; the model itself is left out.
+#
+#   python bench_worker_scaling.py --cores 1 2 4 --seconds 10
+
+WIDTH, HEIGHT = 1280, 720
+
+
+def _synthetic_frames(n=8):
+    rng = np.random.default_rng(0)
+    return [rng.integers(0, 255, (HEIGHT, WIDTH, 3), dtype=np.uint8) for _ in range(n)]
+
+
+def _synthetic_detections(i):
+    dets = []
+    for k in range(6):
+        y = (i * 7 + k * 110) % HEIGHT
+        x = 100 + k * 180
+        dets.append(((x, y, x + 120, y + 80), "carton", 0.9 - k * 0.01))
+    return dets
+
+
+def process_frames(capture, stop_event, counter, python_work=20000):
+    import cv2
+    tracker = ObjectTracker()
+    zones = default_zones(WIDTH, HEIGHT)
+    zone_counter = ZoneCounter(zones, verbose=False)
+    i = 0
+    while not stop_event.is_set():
+        ok, frame = capture.read()
+        if not ok:
+            break
+        acc = 0
+        for j in range(python_work):
+            acc += j & 7
+        small = cv2.resize(frame, (640, 640))
+        detections = apply_nms(_synthetic_detections(i))
+        tracker.update_tracks(detections)
+        zone_counter.update(tracker.tracks)
+        draw_zones(frame, zones, zone_counter)
+        for data in tracker.tracks.values():
+            x1, y1, x2, y2 = data['bbox']
+            cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 3)
+        del small
+        counter[0] += 1
+        i += 1
+
+
+def produce_frames(ring, stop_event, fps):
+    frames = _synthetic_frames()
+    ring.set_fps(fps)
+    interval = 1.0 / fps
+    next_due = time.time()
+    i = 0
+    while not stop_event.is_set():
+        ring.write(frames[i % len(frames)])
+        i += 1
+        next_due += interval
+        delay = next_due - time.time()
+        if delay > 0:
+            time.sleep(delay)
+    ring.close_stream()
+
+
+class _ListCapture:
+    """In-process frame source for thread mode, paced like the ring producer."""
+
+    def __init__(self, frames, fps, stop_event):
+        self.frames = frames
+        self.interval = 1.0 / fps
+        self.next_due = time.time()
+        self.stop_event = stop_event
+        self.i = 0
+
+    def read(self):
+        delay = self.next_due - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        self.next_due = max(self.next_due + self.interval, time.time() - 1.0)
+        self.i += 1
+        return not self.stop_event.is_set(), self.frames[self.i % len(self.frames)].copy()
+
+
+def run_threads(cameras, seconds, fps):
+    stop_event = threading.Event()
+    counters = [[0] for _ in range(cameras)]
+    frames = _synthetic_frames()
+    threads = [
+        threading.Thread(target=process_frames, args=(_ListCapture(frames, fps, stop_event), stop_event, counters[i]))
+        for i in range(cameras)
+    ]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop_event.set()
+    for t in threads:
+        t.join()
+    return sum(c[0] for c in counters) / seconds
+
+
+def _producer_main(ring_name, slots, max_bytes, stop_event, fps):
+    ring = SharedFrameRing.attach(ring_name, slots, max_bytes)
+    produce_frames(ring, stop_event, fps)
+    ring.close()
+
+
+def _consumer_main(ring_name, slots, max_bytes, go_event, stop_event, result_queue):
+    ring = SharedFrameRing.attach(ring_name, slots, max_bytes)
+    counter = [0]
+    go_event.wait()
+    process_frames(RingCapture(ring, stop_event=stop_event), stop_event, counter)
+    result_queue.put(counter[0])
+    ring.close()
+
+
+def run_processes(cameras, seconds, fps, slots=4):
+    ctx = camera_worker.CTX
+    max_bytes = WIDTH * HEIGHT * 3
+    go_event = ctx.Event()
+    stop_event = ctx.Event()
+    results = ctx.Queue()
+    rings = [SharedFrameRing.create(slots, max_bytes) for _ in range(cameras)]
+    procs = []
+    for ring in rings:
+        procs.append(ctx.Process(target=_producer_main, args=(ring.name, slots, max_bytes, stop_event, fps)))
+        procs.append(ctx.Process(target=_consumer_main, args=(ring.name, slots, max_bytes, go_event, stop_event, results)))
+    for p in procs:
+        p.start()
+    # Let the spawned interpreters finish importing before timing
+    time.sleep(3.0)
+    go_event.set()
+    time.sleep(seconds)
+    stop_event.set()
+    total = sum(results.get(timeout=30) for _ in rings)
+    for p in procs:
+        p.join(timeout=10)
+    for ring in rings:
+        ring.close()
+    return total / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Thread vs worker-process scaling across core counts")
+    parser.add_argument("--cores", type=int, nargs="+", default=None,
+                        help="core counts to test (default: 1, 2, 4, ... up to the machine)")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--fps", type=float, default=200.0,
+                        help="source fps per synthetic camera; keep it above what one core can process")
+    args = parser.parse_args()
+
+    available = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count()))
+    cores = args.cores
+    if cores is None:
+        cores, k = [], 1
+        while k <= len(available):
+            cores.append(k)
+            k *= 2
+
+    print(f"[BENCH] {len(available)} cores available, {WIDTH}x{HEIGHT} frames @ {args.fps} fps per camera")
+    print(f"{'cores':>5} {'cameras':>7} {'thread fps':>11} {'process fps':>12} {'speedup':>8}")
+    for k in cores:
+        if k > len(available):
+            print(f"[BENCH] skipping {k} cores, only {len(available)} available")
+            continue
+        if hasattr(os, "sched_setaffinity"):
+            os.sched_setaffinity(0, available[:k])  # children inherit the mask
+        thread_fps = run_threads(k, args.seconds, args.fps)
+        process_fps = run_processes(k, args.seconds, args.fps)
+        print(f"{k:>5} {k:>7} {thread_fps:>11.1f} {process_fps:>12.1f} {process_fps / thread_fps:>7.2f}x")
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, available)
+
+
+if __name__ == "__main__":
+    main()
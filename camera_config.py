@@ -0,0 +1,33 @@
+import os
+import json
+
+CAMERA_CONFIG_FILE = "camera_config.json"
+
+
+def load_all_camera_configs(config_file=CAMERA_CONFIG_FILE):
+    if os.path.exists(config_file):
+        with open(config_file, "r") as f:
+            return json.load(f)
+    return {}
+
+
+def load_camera_config(camera_id, config_file=CAMERA_CONFIG_FILE):
+    """
+    Return the per-camera settings for camera_id (keys are camera ids as
+    strings). Falls back to the "default" entry, then to an empty dict, so a
+    camera without an entry keeps the built-in behaviour.
+    """
+    configs = load_all_camera_configs(config_file)
+    return configs.get(str(camera_id), configs.get("default", {}))
+
+
+def save_camera_config(camera_id, settings, config_file=CAMERA_CONFIG_FILE):
+    """Merge settings into the entry for camera_id and write the file back."""
+    configs = load_all_camera_configs(config_file)
+    entry = configs.get(str(camera_id), {})
+    entry.update(settings)
+    configs[str(camera_id)] = entry
+    tmp_file = config_file + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump(configs, f, indent=2)
+    os.replace(tmp_file, config_file)
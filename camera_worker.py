@@ -0,0 +1,427 @@
+import multiprocessing as mp
+import os
+import threading
+import time
+
+from frame_ring import SharedFrameRing, RingCapture, DEFAULT_MAX_FRAME_BYTES
+
+# -------------------------------
+# Per-camera worker processes
+# -------------------------------
+# Worker-process mode: every camera gets a capture process and a processing
+# process. The capture process writes decoded frames into a SharedFrameRing;
+# the processing process runs VideoProcessor over a RingCapture. Both talk to
+# the parent over a Pipe carrying small control dicts only:
+#
+#   parent -> worker: {"cmd": "stop"} | {"cmd": "profile", "seconds": s}
+#   worker -> parent: {"event": "started" | "progress" | "result" | "capture_ended" | "profile", ...}
+#
+# CameraWorkerPool supervises the processes and restarts crashed ones; a
+# restarted processing process resumes the count from its session checkpoint.
+
+CTX = mp.get_context("spawn")  # no fork: CUDA and threads do not survive it
+
+
+def _open_source(source):
+    import cv2
+    from synthetic_source import is_loop_source, LoopingFileCapture
+    if is_loop_source(source):
+        return LoopingFileCapture(source)
+    if str(source).startswith("rtsp"):
+        from gStreamer import get_gst_pipeline
+        pipeline = get_gst_pipeline(rtsp_url=source, drop_frames=True, latency=0)
+        return cv2.VideoCapture(pipeline, cv2.CAP_GSTREAMER)
+    return cv2.VideoCapture(source)
+
+
+def session_frame_bytes(camera_id, default=DEFAULT_MAX_FRAME_BYTES):
+    """Ring slot size for a camera: "max_frame_size": [w, h] in its camera_config.json entry."""
+    from camera_config import load_camera_config
+    size = load_camera_config(camera_id).get("max_frame_size")
+    if not size:
+        return default
+    width, height = size
+    return int(width) * int(height) * 3
+
+
+def _profile_and_send(camera_id, role, seconds, interval, send):
+    from sampling_profiler import process_threads, sample_stacks, to_collapsed
+    counts, rounds = sample_stacks(process_threads(f"cam_{camera_id}/{role}"), seconds, interval)
+    send({"event": "profile", "role": role, "collapsed": to_collapsed(counts), "samples": rounds})
+
+
+def _listen_for_stop(conn, on_stop, camera_id=None, role=None, send=None):
+    while True:
+        try:
+            msg = conn.recv()
+        except (EOFError, OSError):
+            on_stop()
+            return
+        if msg.get("cmd") == "stop":
+            on_stop()
+            return
+        if msg.get("cmd") == "profile" and send is not None:
+            threading.Thread(target=_profile_and_send, name="profiler", daemon=True,
+                             args=(camera_id, role, msg.get("seconds", 10), msg.get("interval", 0.005), send)).start()
+
+
+def capture_main(camera_id, source, ring_name, ring_slots, max_frame_bytes, conn, realtime=False):
+    import cv2
+    from stream_supervisor import StreamSupervisor
+
+    ring = SharedFrameRing.attach(ring_name, ring_slots, max_frame_bytes)
+    live = str(source).startswith(("rtsp", "loop:"))
+    # Files end instead of reconnecting
+    stream = StreamSupervisor(lambda: _open_source(source), camera_id=camera_id,
+                              max_retries=None if live else 0)
+    stopped = threading.Event()
+    send_lock = threading.Lock()
+
+    def send(msg):
+        with send_lock:
+            conn.send(msg)
+
+    def on_stop():
+        stopped.set()
+        stream.stop()
+
+    threading.Thread(target=_listen_for_stop, args=(conn, on_stop, camera_id, "capture", send), daemon=True).start()
+
+    if not stream.open():
+        send({"event": "capture_ended", "error": f"could not open {source}"})
+        ring.close_stream()
+        ring.close()
+        return
+
+    fps = stream.get(cv2.CAP_PROP_FPS) or 30
+    ring.set_fps(fps)
+    send({"event": "started", "role": "capture", "pid": os.getpid()})
+
+    frame_interval = 1.0 / fps
+    next_due = time.time()
+    frames = 0
+    while not stopped.is_set():
+        ret, frame = stream.read()
+        if not ret:
+            break
+        if frame.nbytes > ring.max_frame_bytes:
+            # A restart would hit the same frame size again: fail the session
+            h, w = frame.shape[:2]
+            send({"event": "capture_ended", "fatal": True,
+                  "error": f"{w}x{h} frames do not fit the {ring.max_frame_bytes} byte ring slots; "
+                           f"set \"max_frame_size\": [{w}, {h}] in camera_config.json"})
+            break
+        ring.write(frame)
+        frames += 1
+        if realtime and not live:
+            # Pace file sources like a live camera
+            next_due += frame_interval
+            delay = next_due - time.time()
+            if delay > 0:
+                time.sleep(delay)
+
+    ring.close_stream()
+    stream.release()
+    send({"event": "capture_ended", "frames": frames, "stopped": stopped.is_set()})
+    ring.close()
+
+
+def processing_main(camera_id, ring_name, ring_slots, max_frame_bytes, conn, session_id=None,
+                    model_path="packmat_i2.pt", progress_interval=1.0):
+    from packmat_counter_g import VideoProcessor
+
+    ring = SharedFrameRing.attach(ring_name, ring_slots, max_frame_bytes)
+    capture = RingCapture(ring)
+    send_lock = threading.Lock()
+
+    def send(msg):
+        with send_lock:
+            conn.send(msg)
+
+    processor = VideoProcessor(rtsp_url=None, model_path=model_path, camera_id=camera_id,
+                               session_id=session_id, capture=capture)
+    threading.Thread(target=_listen_for_stop, args=(conn, processor.stop, camera_id, "processing", send),
+                     daemon=True).start()
+    send({"event": "started", "role": "processing", "pid": os.getpid(), "count": processor.counter})
+
+    done = threading.Event()
+
+    def report_progress():
+        while not done.wait(progress_interval):
+            send({"event": "progress", "count": processor.counter, "stream": processor.stream_health()})
+
+    threading.Thread(target=report_progress, daemon=True).start()
+
+    count = processor.process_video()
+    done.set()
+    send({
+        "event": "result",
+        "count": count,
+        "output_path": processor.output_path,
+        "zone_counts": processor.zone_counter.counts_by_zone(),
+        "stream": processor.stream_health()
+    })
+    ring.close()
+
+
+class CameraSession:
+    def __init__(self, camera_id, source, session_id, ring):
+        self.camera_id = camera_id
+        self.source = source
+        self.session_id = session_id
+        self.ring = ring
+        self.state = "starting"
+        self.started_at = time.time()
+        self.capture_proc = None
+        self.capture_conn = None
+        self.processing_proc = None
+        self.processing_conn = None
+        self.capture_ended = False
+        self.stopping = False
+        self.restarts = {"capture": 0, "processing": 0}
+        self.next_restart_at = {"capture": 0.0, "processing": 0.0}
+        self.count = 0
+        self.stream = None
+        self.result = None
+        self.error = None
+        self.profiles = {}
+        self.finishing = False
+        self.done = threading.Event()
+
+    def summary(self):
+        return {
+            "camera_id": self.camera_id,
+            "session_id": self.session_id,
+            "state": self.state,
+            "count": self.count,
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "restarts": dict(self.restarts),
+            "capture_pid": self.capture_proc.pid if self.capture_proc else None,
+            "processing_pid": self.processing_proc.pid if self.processing_proc else None,
+            "stream": self.stream,
+            "result": self.result,
+            "error": self.error
+        }
+
+
+class CameraWorkerPool:
+    def __init__(self, model_path="packmat_i2.pt", ring_slots=4, max_frame_bytes=DEFAULT_MAX_FRAME_BYTES,
+                 max_restarts=5, realtime_files=False, monitor_interval=0.2):
+        self.model_path = model_path
+        self.ring_slots = ring_slots
+        self.max_frame_bytes = max_frame_bytes
+        self.max_restarts = max_restarts
+        self.realtime_files = realtime_files
+        self.monitor_interval = monitor_interval
+        self.sessions = {}
+        self._lock = threading.Lock()
+        self._shutdown = threading.Event()
+        self._monitor = threading.Thread(target=self._monitor_loop, name="worker-supervisor", daemon=True)
+        self._monitor.start()
+
+    # -- process management ----------------------------------------------
+
+    def _spawn_capture(self, session):
+        parent_conn, child_conn = CTX.Pipe()
+        proc = CTX.Process(
+            target=capture_main, name=f"capture-{session.camera_id}",
+            args=(session.camera_id, session.source, session.ring.name, self.ring_slots,
+                  session.ring.max_frame_bytes, child_conn, self.realtime_files),
+            daemon=True)
+        proc.start()
+        child_conn.close()
+        session.capture_proc, session.capture_conn = proc, parent_conn
+
+    def _spawn_processing(self, session):
+        parent_conn, child_conn = CTX.Pipe()
+        proc = CTX.Process(
+            target=processing_main, name=f"processing-{session.camera_id}",
+            args=(session.camera_id, session.ring.name, self.ring_slots, session.ring.max_frame_bytes,
+                  child_conn, session.session_id, self.model_path),
+            daemon=True)
+        proc.start()
+        child_conn.close()
+        session.processing_proc, session.processing_conn = proc, parent_conn
+
+    def start_session(self, camera_id, source, session_id=None):
+        camera_id = str(camera_id)
+        with self._lock:
+            existing = self.sessions.get(camera_id)
+            if existing is not None and not existing.done.is_set():
+                raise RuntimeError(f"Camera {camera_id} already has a running session")
+            ring = SharedFrameRing.create(self.ring_slots, session_frame_bytes(camera_id, self.max_frame_bytes))
+            session = CameraSession(camera_id, source, session_id, ring)
+            self._spawn_capture(session)
+            self._spawn_processing(session)
+            session.state = "running"
+            self.sessions[camera_id] = session
+        print(f"[WORKER] Camera {camera_id} started: capture pid {session.capture_proc.pid}, "
+              f"processing pid {session.processing_proc.pid}")
+        return session.summary()
+
+    def stop_session(self, camera_id, timeout=30):
+        camera_id = str(camera_id)
+        session = self.sessions.get(camera_id)
+        if session is None:
+            return None
+        session.stopping = True
+        for conn in (session.capture_conn, session.processing_conn):
+            try:
+                conn.send({"cmd": "stop"})
+            except (OSError, ValueError):
+                pass
+        if not session.done.wait(timeout):
+            print(f"[WORKER] Camera {camera_id} did not stop within {timeout}s, terminating")
+            self._finish(session, "terminated")
+        return session.summary()
+
+    def profile(self, camera_id, seconds=10, interval=0.005):
+        """
+        Sample the stacks of a running camera's capture and processing
+        processes; returns (collapsed stacks, sampling rounds) or None.
+        """
+        session = self.sessions.get(str(camera_id))
+        if session is None or session.done.is_set():
+            return None
+        session.profiles = {}
+        pending = {}
+        for role, conn, proc in (("capture", session.capture_conn, session.capture_proc),
+                                 ("processing", session.processing_conn, session.processing_proc)):
+            # The capture process of a file source exits once the file has ended
+            if proc is None or not proc.is_alive() or (role == "capture" and session.capture_ended):
+                continue
+            try:
+                conn.send({"cmd": "profile", "seconds": seconds, "interval": interval})
+                pending[role] = proc
+            except (OSError, ValueError):
+                pass
+        deadline = time.time() + seconds + 10
+        while time.time() < deadline and not session.done.is_set() and \
+                any(role not in session.profiles and proc.is_alive() for role, proc in pending.items()):
+            time.sleep(0.1)
+        profiles = list(session.profiles.values())
+        return "".join(p["collapsed"] for p in profiles), max((p["samples"] for p in profiles), default=0)
+
+    def status(self):
+        with self._lock:
+            sessions = list(self.sessions.items())
+        return {camera_id: s.summary() for camera_id, s in sessions}
+
+    def running_cameras(self):
+        with self._lock:
+            return [camera_id for camera_id, s in self.sessions.items() if not s.done.is_set()]
+
+    def shutdown(self):
+        for camera_id in self.running_cameras():
+            self.stop_session(camera_id, timeout=10)
+        self._shutdown.set()
+
+    # -- supervision -----------------------------------------------------
+
+    def _finish(self, session, state):
+        # stop_session (request thread) and the monitor can both get here:
+        # the first one finalizes, the other waits for it
+        with self._lock:
+            finishing, session.finishing = session.finishing, True
+        if finishing:
+            session.done.wait(30)
+            return
+        for conn in (session.capture_conn, session.processing_conn):
+            try:
+                conn.send({"cmd": "stop"})
+            except (OSError, ValueError):
+                pass
+        for proc in (session.capture_proc, session.processing_proc):
+            if proc is not None:
+                proc.join(timeout=5)
+                if proc.is_alive():
+                    proc.terminate()
+                    proc.join(timeout=5)
+        for conn in (session.capture_conn, session.processing_conn):
+            if conn is not None:
+                conn.close()
+        session.ring.close()
+        session.state = state
+        session.done.set()
+        print(f"[WORKER] Camera {session.camera_id} session {state}. Count={session.count}")
+
+    def _drain(self, session):
+        for role, conn in (("capture", session.capture_conn), ("processing", session.processing_conn)):
+            try:
+                while conn.poll():
+                    msg = conn.recv()
+                    event = msg.get("event")
+                    if event == "progress":
+                        session.count = msg["count"]
+                        session.stream = msg.get("stream")
+                    elif event == "started" and role == "processing":
+                        session.count = msg.get("count", session.count)
+                    elif event == "capture_ended":
+                        session.capture_ended = True
+                        if msg.get("error"):
+                            print(f"[WORKER] Camera {session.camera_id}: {msg['error']}")
+                        if msg.get("fatal"):
+                            session.error = msg["error"]
+                    elif event == "profile":
+                        session.profiles[msg["role"]] = msg
+                    elif event == "result":
+                        session.result = msg
+                        session.count = msg["count"]
+                        session.stream = msg.get("stream")
+            except (EOFError, OSError):
+                pass
+
+    def _restart(self, session, role, exitcode):
+        if session.restarts[role] >= self.max_restarts:
+            print(f"[WORKER] Camera {session.camera_id} {role} crashed {self.max_restarts} times, giving up")
+            self._finish(session, "failed")
+            return
+        now = time.time()
+        if now < session.next_restart_at[role]:
+            return
+        session.restarts[role] += 1
+        session.next_restart_at[role] = now + min(30.0, 0.5 * 2 ** session.restarts[role])
+        print(f"[WORKER] Camera {session.camera_id} {role} exited with code {exitcode}, restarting "
+              f"(restart {session.restarts[role]}/{self.max_restarts})")
+        if role == "capture":
+            session.capture_conn.close()
+            self._spawn_capture(session)
+        else:
+            session.processing_conn.close()
+            self._spawn_processing(session)
+
+    def _check(self, session):
+        self._drain(session)
+        if session.error is not None:
+            self._finish(session, "failed")
+            return
+        if session.result is not None:
+            self._finish(session, "stopped" if session.stopping else "completed")
+            return
+
+        processing = session.processing_proc
+        if not processing.is_alive():
+            self._drain(session)
+            if session.result is not None:
+                self._finish(session, "stopped" if session.stopping else "completed")
+            elif session.stopping:
+                self._finish(session, "stopped")
+            else:
+                self._restart(session, "processing", processing.exitcode)
+            return
+
+        capture = session.capture_proc
+        if not capture.is_alive() and not session.capture_ended and not session.stopping:
+            self._restart(session, "capture", capture.exitcode)
+
+    def _monitor_loop(self):
+        while not self._shutdown.wait(self.monitor_interval):
+            with self._lock:
+                sessions = list(self.sessions.values())
+            for session in sessions:
+                if session.done.is_set():
+                    continue
+                try:
+                    self._check(session)
+                except Exception as e:
+                    print(f"[WORKER] Supervisor error for camera {session.camera_id}: {e}")
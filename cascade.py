@@ -0,0 +1,164 @@
+import time
+from collections import Counter
+
+import numpy as np
+
+from raw_detections import select_detections, run_detector
+
+# -------------------------------
+# Two-stage detector cascade
+# -------------------------------
+# A light detector runs on every inference frame. The full model only runs
+# when the light stage cannot settle the count by itself:
+#
+#   near_zone   a light detection or a live track overlaps a counting zone
+#               (grown by near_frac of the frame height)
+#   ambiguous   a light detection's confidence is inside the ambiguous band
+#
+# and then only on a crop around the zones concerned / ambiguous boxes, grown
+# to whole boxes. Inside the crop the full model's detections are used,
+# outside it the confident light ones, so tracks far from the line stay alive.
+# The crop is still fed at imgsz, so an escalation costs about one full-model
+# frame; the saving is the frames that never escalate.
+# Configured per camera in camera_config.json:
+#
+#   "cascade": {"light_model": "packmat_n.pt", "light_imgsz": 320,
+#               "near_frac": 0.15, "ambiguous": [0.25, 0.6]}
+
+
+def _grow(box, px, width, height):
+    x1, y1, x2, y2 = box
+    return (max(0, int(x1 - px)), max(0, int(y1 - px)), min(width, int(x2 + px)), min(height, int(y2 + px)))
+
+
+def _fit_aspect(box, aspect, bounds):
+    """Grow box around its centre to width / height == aspect, shifted to stay inside bounds."""
+    x1, y1, x2, y2 = box
+    w, h = max(1, x2 - x1), max(1, y2 - y1)
+    if w / h < aspect:
+        w = min(bounds[2] - bounds[0], int(round(h * aspect)))
+    else:
+        h = min(bounds[3] - bounds[1], int(round(w / aspect)))
+    nx1 = int(min(max(bounds[0], (x1 + x2 - w) / 2), bounds[2] - w))
+    ny1 = int(min(max(bounds[1], (y1 + y2 - h) / 2), bounds[3] - h))
+    return (nx1, ny1, nx1 + w, ny1 + h)
+
+
+def _overlaps(box, boxes):
+    """(N,) bool: which of boxes (N, 4) intersect box."""
+    if not len(boxes):
+        return np.zeros(0, dtype=bool)
+    return (boxes[:, 0] < box[2]) & (boxes[:, 2] > box[0]) & (boxes[:, 1] < box[3]) & (boxes[:, 3] > box[1])
+
+
+class CascadeDetector:
+    def __init__(self, light_model, zones, frame_size, light_lock=None, light_imgsz=None, near_frac=0.15,
+                 ambiguous=(0.25, 0.6), margin_frac=0.03):
+        self.light_model = light_model
+        self.light_lock = light_lock
+        self.light_imgsz = light_imgsz
+        self.width, self.height = frame_size
+        self.ambiguous = tuple(ambiguous)
+        self.margin = int(margin_frac * self.height)
+        near_px = near_frac * self.height
+        # Bounding box of each zone, grown by the "near" distance
+        self.zone_boxes = np.array([
+            _grow((*z.points.min(axis=0), *z.points.max(axis=0)), near_px, self.width, self.height)
+            for z in zones
+        ], dtype=np.int64).reshape(-1, 4)
+
+        self.frames = 0
+        self.escalated = 0
+        self.reasons = Counter()
+        self.light_ms = 0.0
+        self.full_ms = 0.0
+
+    @classmethod
+    def from_config(cls, cascade_cfg, zones, frame_size, device):
+        """None unless the camera config names a light model."""
+        if not cascade_cfg or not cascade_cfg.get("light_model"):
+            return None
+        from model_registry import get_model, get_model_lock
+        path = cascade_cfg["light_model"]
+        return cls(get_model(path, device), zones, frame_size, light_lock=get_model_lock(path, device),
+                   light_imgsz=cascade_cfg.get("light_imgsz"), near_frac=cascade_cfg.get("near_frac", 0.15),
+                   ambiguous=cascade_cfg.get("ambiguous", (0.25, 0.6)))
+
+    def detect(self, frame, tracks, full_model, names, conf_thresh, imgsz=None, roi_px=None, resize=False,
+               full_lock=None, **kwargs):
+        """Tracker-ready ((x1, y1, x2, y2), label, conf) detections for one frame."""
+        self.frames += 1
+        start = time.perf_counter()
+        light_imgsz = self.light_imgsz or imgsz
+        raw, scale, offset = run_detector(self.light_model, frame, light_imgsz, roi_px, resize,
+                                          lock=self.light_lock, **kwargs)
+        light = select_detections(raw, self.light_model.names, self.ambiguous[0], scale=scale, offset=offset)
+        self.light_ms += (time.perf_counter() - start) * 1000
+
+        light_boxes = np.array([d[0] for d in light], dtype=np.int64).reshape(-1, 4)
+        track_boxes = np.array([t["bbox"] for t in tracks.values()], dtype=np.int64).reshape(-1, 4)
+        candidates = np.concatenate([light_boxes, track_boxes])
+
+        regions = []
+        for zone_box in self.zone_boxes:
+            if _overlaps(zone_box, candidates).any():
+                regions.append(tuple(zone_box))
+        near = bool(regions)
+        ambiguous = [d for d in light if d[2] < self.ambiguous[1]]
+        regions += [_grow(d[0], self.margin, self.width, self.height) for d in ambiguous]
+        # >= so that with conf_thresh == ambiguous[1] every box is either kept or escalated
+        confident = [d for d in light if d[2] >= conf_thresh]
+        if not regions:
+            return confident
+
+        self.escalated += 1
+        if near:
+            self.reasons["near_zone"] += 1
+        if ambiguous:
+            self.reasons["ambiguous"] += 1
+        crop = np.array(regions).min(axis=0)[:2].tolist() + np.array(regions).max(axis=0)[2:].tolist()
+        # Whole boxes only: grow the crop over anything it cuts through
+        for _ in range(2):
+            cut = candidates[_overlaps(crop, candidates)]
+            if len(cut):
+                crop = [min(crop[0], cut[:, 0].min()), min(crop[1], cut[:, 1].min()),
+                        max(crop[2], cut[:, 2].max()), max(crop[3], cut[:, 3].max())]
+        crop = _grow(crop, self.margin, self.width, self.height)
+        bounds = tuple(roi_px) if roi_px is not None else (0, 0, self.width, self.height)
+        crop = (max(crop[0], bounds[0]), max(crop[1], bounds[1]), min(crop[2], bounds[2]), min(crop[3], bounds[3]))
+        if resize:
+            # The resize path squashes its input to imgsz x imgsz: give the crop
+            # the aspect of the full input so objects are scaled as in the
+            # baseline, not stretched (a band around the line is ~6:1)
+            crop = _fit_aspect(crop, (bounds[2] - bounds[0]) / float(bounds[3] - bounds[1]), bounds)
+
+        start = time.perf_counter()
+        raw, scale, offset = run_detector(full_model, frame, imgsz, crop, resize, lock=full_lock, **kwargs)
+        full = select_detections(raw, names, conf_thresh, scale=scale, offset=offset)
+        self.full_ms += (time.perf_counter() - start) * 1000
+
+        def outside(box):
+            cx, cy = (box[0] + box[2]) / 2, (box[1] + box[3]) / 2
+            return not (crop[0] <= cx < crop[2] and crop[1] <= cy < crop[3])
+
+        return full + [d for d in confident if outside(d[0])]
+
+    def report(self, baseline_full_ms=None):
+        """
+        Escalation and timing summary. With the per-frame time of the full
+        model on whole frames, also the share of detector time saved.
+        """
+        frames = max(self.frames, 1)
+        report = {
+            "frames": self.frames,
+            "escalated": self.escalated,
+            "escalation_rate": round(self.escalated / frames, 4),
+            "reasons": dict(self.reasons),
+            "light_ms_per_frame": round(self.light_ms / frames, 2),
+            "full_ms_per_escalation": round(self.full_ms / max(self.escalated, 1), 2),
+            "cascade_ms_per_frame": round((self.light_ms + self.full_ms) / frames, 2)
+        }
+        if baseline_full_ms:
+            report["baseline_ms_per_frame"] = round(baseline_full_ms, 2)
+            report["compute_saved"] = round(1 - report["cascade_ms_per_frame"] / baseline_full_ms, 4)
+        return report
@@ -0,0 +1,266 @@
+import cv2
+import numpy as np
+
+# -------------------------------
+# Counting zones
+# -------------------------------
+# A zone is either a line (two points) or a polygon (3+ points). Points in
+# camera_config.json are fractions of the frame width/height so one config
+# works regardless of the stream resolution, e.g.
+#
+#   "zones": [
+#     {"name": "lane_a", "type": "line", "points": [[0.0, 0.6], [0.5, 0.8]],
+#      "direction": "forward", "classes": ["carton", "carton_brown"]},
+#     {"name": "dock", "type": "polygon",
+#      "points": [[0.5, 0.5], [1.0, 0.5], [1.0, 1.0], [0.5, 1.0]],
+#      "direction": "in"}
+#   ]
+#
+# Line directions: "forward" counts movement from the left-hand to the
+# right-hand side of the line walked from its first to its second point (for a
+# line drawn left-to-right that is top-to-bottom), "reverse" the opposite,
+# "both" either way. Polygon directions: "in", "out" or "both".
+
+LINE_DIRECTIONS = {"forward": 1, "reverse": 2, "both": 3}
+POLYGON_DIRECTIONS = {"in": 1, "out": 2, "both": 3}
+MAX_ZONES = 63  # per-track "already counted" state is kept as a bitmask
+
+ZONE_COLOR = (0, 0, 255)
+
+
+class CountingZone:
+    def __init__(self, name, kind, points, direction=None, classes=None):
+        if kind not in ("line", "polygon"):
+            raise ValueError(f"Unknown zone type '{kind}' for zone '{name}'")
+        points = np.asarray(points, dtype=np.float64)
+        if kind == "line" and points.shape != (2, 2):
+            raise ValueError(f"Line zone '{name}' needs exactly two points")
+        if kind == "polygon" and (points.ndim != 2 or points.shape[0] < 3):
+            raise ValueError(f"Polygon zone '{name}' needs at least three points")
+
+        directions = LINE_DIRECTIONS if kind == "line" else POLYGON_DIRECTIONS
+        if direction is None:
+            direction = "forward" if kind == "line" else "in"
+        if direction not in directions:
+            raise ValueError(f"Invalid direction '{direction}' for {kind} zone '{name}'")
+
+        self.name = name
+        self.kind = kind
+        self.points = points
+        self.direction = direction
+        self.direction_code = directions[direction]
+        self.classes = None if classes is None else {c.lower() for c in classes}
+
+    def accepts(self, label):
+        return self.classes is None or label.lower() in self.classes
+
+
+def default_zones(frame_width, frame_height):
+    """The original counting line: horizontal at 75% height, top-to-bottom."""
+    line_y = int(frame_height * 0.75)
+    return [CountingZone("line", "line", [(0, line_y), (frame_width, line_y)], "forward")]
+
+
+def zones_from_config(zone_cfgs, frame_width, frame_height):
+    if not zone_cfgs:
+        return default_zones(frame_width, frame_height)
+
+    zones = []
+    for i, cfg in enumerate(zone_cfgs):
+        points = [(x * frame_width, y * frame_height) for x, y in cfg["points"]]
+        kind = cfg.get("type", "line" if len(points) == 2 else "polygon")
+        zones.append(CountingZone(
+            cfg.get("name", f"zone_{i}"), kind, points,
+            direction=cfg.get("direction"), classes=cfg.get("classes")
+        ))
+    return zones
+
+
+def _cross(ax, ay, bx, by):
+    return ax * by - ay * bx
+
+
+def _points_in_polygons(points, vertices):
+    """
+    Even-odd ray cast of (N, 2) points against (M, K, 2) padded polygons in a
+    single broadcast. Returns an (N, M) bool array.
+    """
+    xi, yi = vertices[..., 0], vertices[..., 1]
+    nxt = np.roll(vertices, -1, axis=1)
+    xj, yj = nxt[..., 0], nxt[..., 1]
+
+    px = points[:, 0][:, None, None]
+    py = points[:, 1][:, None, None]
+
+    straddles = (yi > py) != (yj > py)
+    dy = np.where(yj == yi, 1.0, yj - yi)
+    x_cross = (xj - xi) * (py - yi) / dy + xi
+    hits = straddles & (px < x_cross)
+    return (hits.sum(axis=2) % 2) == 1
+
+
+class ZoneCounter:
+    """
+    Counts track crossings for every zone of a camera.
+
+    All geometry is packed into numpy arrays up front; update() builds one
+    array of movement segments from the tracker and tests it against every
+    line and polygon in a single vectorised pass, so the per-frame cost does
+    not grow a Python loop per zone.
+    """
+
+    def __init__(self, zones, verbose=True):
+        if len(zones) > MAX_ZONES:
+            raise ValueError(f"At most {MAX_ZONES} zones per camera are supported")
+        self.zones = list(zones)
+        self.verbose = verbose
+        self.zone_names = [z.name for z in self.zones]
+
+        line_idx = [i for i, z in enumerate(self.zones) if z.kind == "line"]
+        poly_idx = [i for i, z in enumerate(self.zones) if z.kind == "polygon"]
+        self._line_idx = np.array(line_idx, dtype=np.intp)
+        self._poly_idx = np.array(poly_idx, dtype=np.intp)
+
+        if line_idx:
+            pts = np.stack([self.zones[i].points for i in line_idx])
+            self._line_a = pts[:, 0, :]
+            self._line_ab = pts[:, 1, :] - pts[:, 0, :]
+            self._line_dir = np.array([self.zones[i].direction_code for i in line_idx])
+
+        if poly_idx:
+            # Pad polygons to the same vertex count by repeating the last
+            # vertex; zero-length edges never straddle a ray so results match.
+            max_k = max(len(self.zones[i].points) for i in poly_idx)
+            verts = np.empty((len(poly_idx), max_k, 2))
+            for row, i in enumerate(poly_idx):
+                p = self.zones[i].points
+                verts[row, :len(p)] = p
+                verts[row, len(p):] = p[-1]
+            self._poly_verts = verts
+            self._poly_dir = np.array([self.zones[i].direction_code for i in poly_idx])
+
+        self._zone_bits = np.left_shift(np.int64(1), np.arange(len(self.zones), dtype=np.int64))
+        self.labels = []
+        self._label_index = {}
+        self._allowed = np.zeros((len(self.zones), 0), dtype=bool)
+        self.counts = np.zeros((len(self.zones), 0), dtype=np.int64)
+        self.counted = {}  # track id -> bitmask of zones it was counted in
+
+    def _label_id(self, label):
+        idx = self._label_index.get(label)
+        if idx is None:
+            idx = len(self.labels)
+            self.labels.append(label)
+            self._label_index[label] = idx
+            column = np.array([[z.accepts(label)] for z in self.zones], dtype=bool)
+            self._allowed = np.hstack([self._allowed, column])
+            self.counts = np.hstack([self.counts, np.zeros((len(self.zones), 1), dtype=np.int64)])
+        return idx
+
+    def _line_hits(self, prev, cur):
+        a = self._line_a[None, :, :]
+        ab = self._line_ab[None, :, :]
+        p = prev[:, None, :]
+        q = cur[:, None, :]
+
+        side_p = _cross(ab[..., 0], ab[..., 1], p[..., 0] - a[..., 0], p[..., 1] - a[..., 1])
+        side_q = _cross(ab[..., 0], ab[..., 1], q[..., 0] - a[..., 0], q[..., 1] - a[..., 1])
+        forward = (side_p < 0) & (side_q >= 0)
+        reverse = (side_p >= 0) & (side_q < 0)
+
+        # The movement must cross the segment itself, not its extension.
+        pq = q - p
+        end_a = _cross(pq[..., 0], pq[..., 1], a[..., 0] - p[..., 0], a[..., 1] - p[..., 1])
+        end_b = _cross(pq[..., 0], pq[..., 1], a[..., 0] + ab[..., 0] - p[..., 0],
+                       a[..., 1] + ab[..., 1] - p[..., 1])
+        within = end_a * end_b <= 0
+
+        want_fwd = (self._line_dir & 1).astype(bool)[None, :]
+        want_rev = (self._line_dir & 2).astype(bool)[None, :]
+        return within & ((forward & want_fwd) | (reverse & want_rev))
+
+    def _polygon_hits(self, prev, cur):
+        n = len(prev)
+        inside = _points_in_polygons(np.vstack([prev, cur]), self._poly_verts)
+        was_in, now_in = inside[:n], inside[n:]
+        entered = ~was_in & now_in
+        left = was_in & ~now_in
+        want_in = (self._poly_dir & 1).astype(bool)[None, :]
+        want_out = (self._poly_dir & 2).astype(bool)[None, :]
+        return (entered & want_in) | (left & want_out)
+
+    def update(self, tracks):
+        """
+        Test every track matched on this frame against all zones and return
+        the crossing events recorded, as dicts with track_id, zone and label.
+        """
+        # Forget counted flags of tracks the tracker has dropped (ids are not
+        # reused) so the dict stays bounded over a whole shift
+        if any(obj_id not in tracks for obj_id in self.counted):
+            self.counted = {obj_id: bits for obj_id, bits in self.counted.items() if obj_id in tracks}
+
+        moving = [
+            (obj_id, data) for obj_id, data in tracks.items()
+            if data['missed'] == 0 and data.get('prev_center') is not None
+        ]
+        if not moving or not self.zones:
+            return []
+
+        ids = np.fromiter((obj_id for obj_id, _ in moving), dtype=np.int64, count=len(moving))
+        prev = np.array([data['prev_center'] for _, data in moving], dtype=np.float64)
+        cur = np.array([data['center'] for _, data in moving], dtype=np.float64)
+        label_ids = np.fromiter((self._label_id(data['label']) for _, data in moving),
+                                dtype=np.intp, count=len(moving))
+        done = np.fromiter((self.counted.get(obj_id, 0) for obj_id, _ in moving),
+                           dtype=np.int64, count=len(moving))
+
+        hits = np.zeros((len(moving), len(self.zones)), dtype=bool)
+        if len(self._line_idx):
+            hits[:, self._line_idx] = self._line_hits(prev, cur)
+        if len(self._poly_idx):
+            hits[:, self._poly_idx] = self._polygon_hits(prev, cur)
+
+        hits &= self._allowed.T[label_ids]
+        hits &= (done[:, None] & self._zone_bits[None, :]) == 0
+        if not hits.any():
+            return []
+
+        rows, zone_ids = np.nonzero(hits)
+        np.add.at(self.counts, (zone_ids, label_ids[rows]), 1)
+
+        events = []
+        for row, z in zip(rows.tolist(), zone_ids.tolist()):
+            obj_id = int(ids[row])
+            self.counted[obj_id] = self.counted.get(obj_id, 0) | (1 << z)
+            label = self.labels[label_ids[row]]
+            events.append({"track_id": obj_id, "zone": self.zone_names[z], "label": label})
+            if self.verbose:
+                print(f"[COUNTED] ID {obj_id} crossed zone '{self.zone_names[z]}' ({label}). Count={self.total}")
+        return events
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+    def counts_by_zone(self):
+        return {
+            name: {label: int(self.counts[z, c]) for c, label in enumerate(self.labels) if self.counts[z, c]}
+            for z, name in enumerate(self.zone_names)
+        }
+
+    def counts_by_class(self):
+        return {label: int(self.counts[:, c].sum()) for c, label in enumerate(self.labels)}
+
+
+def draw_zones(frame, zones, zone_counter=None):
+    per_zone = zone_counter.counts.sum(axis=1) if zone_counter is not None else None
+    for i, zone in enumerate(zones):
+        pts = zone.points.astype(np.int32)
+        if zone.kind == "line":
+            cv2.line(frame, tuple(map(int, pts[0])), tuple(map(int, pts[1])), ZONE_COLOR, 2)
+        else:
+            cv2.polylines(frame, [pts.reshape(-1, 1, 2)], True, ZONE_COLOR, 2)
+        if per_zone is not None and len(zones) > 1:
+            x, y = pts.min(axis=0)
+            cv2.putText(frame, f"{zone.name}: {int(per_zone[i])}", (int(x) + 10, int(y) - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.7, ZONE_COLOR, 2)
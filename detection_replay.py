@@ -0,0 +1,226 @@
+import argparse
+import json
+import os
+import struct
+import time
+
+from raw_detections import RawDetections, select_detections, run_detector, roi_pixels, DETECTION_DTYPE, \
+    CONF_THRESHOLD, NMS_IOU_THRESHOLD
+from tracking import apply_nms, ObjectTracker
+from counting_zones import ZoneCounter, zones_from_config
+from camera_config import load_camera_config
+
+# -------------------------------
+# Detection record / replay
+# -------------------------------
+# Record the raw model outputs of a video once, then rerun class filter, NMS,
+# tracking and zone counting from the file with any settings, without the
+# model or even the video.
+#
+# File layout (little endian):
+#   b"PKMDET01" | uint32 header length | header JSON
+#   per inferred frame: uint32 frame index | uint32 n | n * DETECTION_DTYPE records
+#   footer: uint32 0xFFFFFFFF | uint32 footer length | footer JSON (frame_count, ...)
+# A file cut short by a crash still loads; it just has no footer. The header
+# keeps the processor's input (imgsz, ROI, resize) and inference stride, and
+# replays default to that stride.
+#
+#   python detection_replay.py record videos/cam_1_x.mp4 replays/cam_1_x.pkd --camera-id 1 [--gstreamer]
+#   python detection_replay.py replay replays/cam_1_x.pkd --conf 0.55 --max-missed 8
+
+MAGIC = b"PKMDET01"
+GSTREAMER_FRAME_SKIP = 2  # packmat_counter_g.py runs the model on every 2nd frame
+FOOTER_MARK = 0xFFFFFFFF
+_FRAME_HEADER = struct.Struct("<II")
+
+
+class DetectionRecorder:
+    def __init__(self, path, names, **meta):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.frames = 0
+        self.last_frame_idx = -1
+        header = dict(meta)
+        header["names"] = {str(k): v for k, v in dict(enumerate(names) if isinstance(names, list) else names).items()}
+        header_bytes = json.dumps(header).encode("utf-8")
+        self._f = open(path, "wb")
+        self._f.write(MAGIC)
+        self._f.write(struct.pack("<I", len(header_bytes)))
+        self._f.write(header_bytes)
+
+    def write(self, frame_idx, raw):
+        data = raw.to_bytes()
+        self._f.write(_FRAME_HEADER.pack(frame_idx, len(raw)))
+        self._f.write(data)
+        self.frames += 1
+        self.last_frame_idx = frame_idx
+
+    def close(self, **footer):
+        if self._f is None:
+            return
+        footer.setdefault("frame_count", self.last_frame_idx + 1)
+        footer["inferred_frames"] = self.frames
+        footer_bytes = json.dumps(footer).encode("utf-8")
+        self._f.write(_FRAME_HEADER.pack(FOOTER_MARK, len(footer_bytes)))
+        self._f.write(footer_bytes)
+        self._f.close()
+        self._f = None
+
+
+def load_replay(path):
+    """Returns (meta, frames) with frames a list of (frame_idx, RawDetections)."""
+    with open(path, "rb") as f:
+        buf = f.read()
+    if buf[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a detection replay file")
+    pos = len(MAGIC)
+    (header_len,) = struct.unpack_from("<I", buf, pos)
+    pos += 4
+    meta = json.loads(buf[pos:pos + header_len].decode("utf-8"))
+    meta["names"] = {int(k): v for k, v in meta["names"].items()}
+    pos += header_len
+
+    record_size = DETECTION_DTYPE.itemsize
+
+    frames = []
+    while pos + _FRAME_HEADER.size <= len(buf):
+        frame_idx, n = _FRAME_HEADER.unpack_from(buf, pos)
+        pos += _FRAME_HEADER.size
+        if frame_idx == FOOTER_MARK:
+            meta.update(json.loads(buf[pos:pos + n].decode("utf-8")))
+            break
+        end = pos + n * record_size
+        if end > len(buf):
+            break  # truncated last frame
+        frames.append((frame_idx, RawDetections.from_bytes(buf[pos:end])))
+        pos = end
+
+    meta.setdefault("frame_count", frames[-1][0] + 1 if frames else 0)
+    return meta, frames
+
+
+def replay_counts(replay, conf_thresh=CONF_THRESHOLD, nms_iou=NMS_IOU_THRESHOLD, tracker_iou=0.3,
+                  max_missed=5, frame_skip=None, zone_cfgs=None):
+    """
+    Run post-processing, tracking and zone counting over a loaded replay.
+    Frames without a record (or skipped by frame_skip) feed the tracker no
+    detections, exactly like the skipped frames of the live processor.
+    frame_skip defaults to the recorded processor's stride.
+    """
+    meta, frames = replay
+    names = meta["names"]
+    frame_skip = frame_skip or meta.get("frame_skip", 1)
+    scale = tuple(meta["scale"]) if meta.get("scale") else None
+    offset = tuple(meta["offset"]) if meta.get("offset") else None
+    if zone_cfgs is None and meta.get("camera_id") is not None:
+        zone_cfgs = load_camera_config(meta["camera_id"]).get("zones")
+    zones = zones_from_config(zone_cfgs, meta["frame_width"], meta["frame_height"])
+
+    tracker = ObjectTracker(iou_threshold=tracker_iou, max_missed=max_missed)
+    zone_counter = ZoneCounter(zones, verbose=False)
+    by_idx = dict(frames)
+
+    start = time.perf_counter()
+    for frame_idx in range(meta["frame_count"]):
+        raw = by_idx.get(frame_idx) if frame_idx % frame_skip == 0 else None
+        detections = []
+        if raw is not None:
+            detections = select_detections(raw, names, conf_thresh, scale=scale, offset=offset)
+            detections = apply_nms(detections, iou_thresh=nms_iou)
+        tracker.update_tracks(detections)
+        zone_counter.update(tracker.tracks)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "count": zone_counter.total,
+        "by_class": zone_counter.counts_by_class(),
+        "by_zone": zone_counter.counts_by_zone(),
+        "frames": meta["frame_count"],
+        "frame_skip": frame_skip,
+        "seconds": elapsed,
+        "fps": meta["frame_count"] / elapsed if elapsed > 0 else 0.0
+    }
+
+
+def record_video(video_path, out_path, model_path="packmat_i2.pt", imgsz=None, camera_id=None, model_conf=0.25,
+                 gstreamer=False, roi=None):
+    """
+    Run the model over every frame of video_path and record its raw outputs,
+    fed as the processor feeds it: native frames with the model letterboxing
+    at imgsz (packmat_counter.py), or squashed to imgsz x imgsz, default 640,
+    and replayed at stride 2 (gstreamer=True, packmat_counter_g.py). imgsz
+    and roi default to the camera's camera_config.json entry.
+    """
+    import cv2
+    from model_registry import get_model, resolve_device
+
+    camera_config = load_camera_config(camera_id) if camera_id is not None else {}
+    imgsz = imgsz or camera_config.get("imgsz") or (640 if gstreamer else None)
+    roi = roi if roi is not None else camera_config.get("roi")
+
+    device = resolve_device()
+    model = get_model(model_path, device)
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open video {video_path}")
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    roi_px = roi_pixels(roi, width, height)
+    x1, y1, x2, y2 = roi_px or (0, 0, width, height)
+    # run_detector's mapping back to frame pixels is the same for every frame
+    scale = [(x2 - x1) / imgsz, (y2 - y1) / imgsz] if gstreamer else None
+    offset = [x1, y1] if roi_px else None
+
+    recorder = DetectionRecorder(
+        out_path, model.names, video=video_path, model=model_path, camera_id=camera_id,
+        processor="gstreamer" if gstreamer else "file", imgsz=imgsz, roi=roi_px, scale=scale, offset=offset,
+        frame_skip=GSTREAMER_FRAME_SKIP if gstreamer else 1, frame_width=width, frame_height=height,
+        fps=cap.get(cv2.CAP_PROP_FPS) or 30, model_conf=model_conf
+    )
+    frame_idx = 0
+    start = time.time()
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        raw, _, _ = run_detector(model, frame, imgsz, roi_px, resize=gstreamer, conf=model_conf, verbose=False,
+                                 device=device)
+        recorder.write(frame_idx, raw)
+        frame_idx += 1
+    cap.release()
+    recorder.close(frame_count=frame_idx)
+    print(f"[REPLAY] Recorded {frame_idx} frames of {video_path} to {out_path} in {time.time() - start:.1f}s")
+    return out_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record raw detections once, replay counting fast")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rec = sub.add_parser("record")
+    rec.add_argument("video")
+    rec.add_argument("out")
+    rec.add_argument("--model", default="packmat_i2.pt")
+    rec.add_argument("--imgsz", type=int, default=None, help="default: the camera's imgsz (640 with --gstreamer)")
+    rec.add_argument("--camera-id", default=None)
+    rec.add_argument("--gstreamer", action="store_true", help="feed frames like packmat_counter_g (resize, stride 2)")
+
+    rep = sub.add_parser("replay")
+    rep.add_argument("replay_file")
+    rep.add_argument("--conf", type=float, default=CONF_THRESHOLD)
+    rep.add_argument("--nms", type=float, default=NMS_IOU_THRESHOLD)
+    rep.add_argument("--tracker-iou", type=float, default=0.3)
+    rep.add_argument("--max-missed", type=int, default=5)
+    rep.add_argument("--frame-skip", type=int, default=None, help="default: the recorded processor's stride")
+
+    args = parser.parse_args()
+    if args.command == "record":
+        record_video(args.video, args.out, args.model, args.imgsz, args.camera_id, gstreamer=args.gstreamer)
+    else:
+        result = replay_counts(load_replay(args.replay_file), args.conf, args.nms, args.tracker_iou,
+                               args.max_missed, args.frame_skip)
+        print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
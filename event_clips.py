@@ -0,0 +1,157 @@
+import json
+import os
+import queue
+import threading
+from collections import deque
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+from sampling_profiler import register_thread, unregister_thread
+
+# -------------------------------
+# Event clips
+# -------------------------------
+# output_mode "clips": instead of a full-length annotated video, the last few
+# seconds of annotated frames are kept JPEG-compressed in memory. Each zone
+# crossing writes a short clip (pre-roll + post-roll) and a JPEG thumbnail of
+# the crossing frame, and appends one line per crossing to index.jsonl in the
+# session's clip directory. Crossings close together share one clip, capped
+# at max_clip_seconds. Encoding to video runs on a writer thread; when it
+# falls max_pending_clips behind, new clips are dropped (and counted) rather
+# than queued without bound.
+
+CLIP_DIR = "clips"
+
+
+class EventClipWriter:
+    def __init__(self, camera_id, session_id, fps, frame_size, out_dir=CLIP_DIR,
+                 pre_seconds=3.0, post_seconds=3.0, max_clip_seconds=30.0, jpeg_quality=80, max_pending_clips=8):
+        self.dir = os.path.join(out_dir, f"cam_{camera_id}", str(session_id))
+        os.makedirs(self.dir, exist_ok=True)
+        self.index_path = os.path.join(self.dir, "index.jsonl")
+        self.camera_id = camera_id
+        self.fps = fps
+        self.frame_size = frame_size
+        self.pre_frames = max(1, int(round(pre_seconds * fps)))
+        self.post_frames = max(1, int(round(post_seconds * fps)))
+        self.max_frames = max(self.pre_frames + self.post_frames, int(round(max_clip_seconds * fps)))
+        self.jpeg_params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality]
+
+        self._ring = deque(maxlen=self.pre_frames)
+        self._active = None  # clip still collecting post-roll
+        self._queue = queue.Queue(maxsize=max_pending_clips)
+        self._thread = threading.Thread(target=self._writer_loop, daemon=True)
+        self._thread.start()
+
+        self.events = 0
+        self.clips = 0
+        self.dropped_clips = 0
+        self.bytes_written = 0
+
+    def push(self, frame, frame_idx, events=()):
+        """Add one annotated frame; events are this frame's ZoneCounter events."""
+        ok, buf = cv2.imencode(".jpg", frame, self.jpeg_params)
+        if not ok:
+            return
+        jpg = buf.tobytes()
+
+        if self._active is not None:
+            self._active["frames"].append(jpg)
+            self._active["remaining"] -= 1
+            if len(self._active["frames"]) >= self.max_frames:
+                self._finish_active()
+
+        if events:
+            if self._active is None:
+                self._active = {
+                    "name": self._clip_name(events[0]),
+                    "frames": list(self._ring) + [jpg],
+                    "events": []
+                }
+            self._active["remaining"] = self.post_frames
+            now = datetime.now()
+            for event in events:
+                thumb = f"t{event['track_id']}_{event['zone']}_{now.strftime('%Y%m%d_%H%M%S_%f')[:-3]}.jpg"
+                self._active["events"].append({
+                    "track_id": event["track_id"],
+                    "zone": event["zone"],
+                    "label": event["label"],
+                    "time": now.isoformat(timespec="milliseconds"),
+                    "frame_idx": frame_idx,
+                    "clip_offset_s": round((len(self._active["frames"]) - 1) / self.fps, 2),
+                    "thumbnail": thumb,
+                    "_jpg": jpg
+                })
+            self.events += len(events)
+
+        self._ring.append(jpg)
+        if self._active is not None and self._active["remaining"] <= 0:
+            self._finish_active()
+
+    def _clip_name(self, event):
+        return f"clip_t{event['track_id']}_{datetime.now().strftime('%Y%m%d_%H%M%S_%f')[:-3]}.mp4"
+
+    def _finish_active(self, block=False):
+        clip, self._active = self._active, None
+        try:
+            self._queue.put(clip, block=block)
+        except queue.Full:
+            self.dropped_clips += 1
+            print(f"[CLIPS] Camera {self.camera_id}: writer {self._queue.maxsize} clips behind, dropped "
+                  f"{clip['name']} ({len(clip['events'])} events, {self.dropped_clips} dropped so far)")
+
+    def _writer_loop(self):
+        register_thread(self.camera_id, "clip_writer")
+        try:
+            while True:
+                clip = self._queue.get()
+                if clip is None:
+                    break
+                try:
+                    self._write_clip(clip)
+                except Exception as e:
+                    print(f"[CLIPS] Failed to write {clip['name']}: {e}")
+        finally:
+            unregister_thread()
+
+    def _write_clip(self, clip):
+        path = os.path.join(self.dir, clip["name"])
+        out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), self.fps, self.frame_size)
+        for jpg in clip["frames"]:
+            out.write(cv2.imdecode(np.frombuffer(jpg, dtype=np.uint8), cv2.IMREAD_COLOR))
+        out.release()
+        written = os.path.getsize(path) if os.path.exists(path) else 0
+
+        lines = []
+        for event in clip["events"]:
+            jpg = event.pop("_jpg")
+            with open(os.path.join(self.dir, event["thumbnail"]), "wb") as f:
+                f.write(jpg)
+            written += len(jpg)
+            event["clip"] = clip["name"]
+            lines.append(json.dumps(event))
+        with open(self.index_path, "a") as f:
+            f.write("\n".join(lines) + "\n")
+
+        self.clips += 1
+        self.bytes_written += written
+        print(f"[CLIPS] Wrote {clip['name']} ({len(clip['frames'])} frames, {len(clip['events'])} events)")
+
+    def close(self):
+        """Write any clip still collecting post-roll and wait for the writer."""
+        if self._active is not None:
+            self._finish_active(block=True)
+        self._queue.put(None)
+        self._thread.join()
+        self._ring.clear()
+
+
+def load_clip_index(clip_dir):
+    """Crossing records of one session's clip directory, in order."""
+    path = os.path.join(clip_dir, "index.jsonl")
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
@@ -0,0 +1,329 @@
+import os
+import threading
+import time
+from collections import Counter
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+# -------------------------------
+# Count-event store
+# -------------------------------
+# Every zone crossing is appended to a local columnar store, one directory per
+# (local day, camera):
+#
+#   events/2026-10-19/cam_3/ts.i8      int64  epoch milliseconds
+#                          track.i4    int32  tracker id
+#                          label.u1    uint8  index into labels.txt
+#                          visit.u4    uint32 index into visits.txt
+#                          zone.u1     uint8  index into zones.txt
+#
+# Each camera has one session (one writer) at a time, so appends never
+# interleave; columns are raw little-endian arrays that the reader loads with
+# np.fromfile (18 bytes per event, and no file descriptor held per column the
+# way a memmap would). A partition's row count is the shortest column, so a
+# crash in the middle of an append only loses that append. Past days never
+# change and stay cached between queries.
+
+EVENT_DIR = "events"
+DEFAULT_SHIFTS = (("A", 6), ("B", 14), ("C", 22))  # (name, local start hour)
+GROUP_FIELDS = ("camera", "zone", "label", "truck_visit_id", "hour", "day", "shift")
+
+_COLUMNS = (("ts", "<i8"), ("track", "<i4"), ("label", "u1"), ("visit", "<u4"), ("zone", "u1"))
+
+
+def parse_shifts(spec):
+    """"A:6,B:14,C:22" -> (("A", 6), ("B", 14), ("C", 22))"""
+    shifts = []
+    for part in spec.split(","):
+        name, hour = part.split(":")
+        shifts.append((name.strip(), int(hour)))
+    return tuple(sorted(shifts, key=lambda s: s[1]))
+
+
+def _day_start_ms(day):
+    return int(time.mktime(day.timetuple())) * 1000
+
+
+def _column_rows(path, name, dtype):
+    file_path = os.path.join(path, f"{name}.{dtype[-2:]}")
+    return os.path.getsize(file_path) // np.dtype(dtype).itemsize if os.path.exists(file_path) else 0
+
+
+def _read_lines(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        return f.read().splitlines()
+
+
+class EventSink:
+    """
+    Appends one camera's crossing events. record() buffers; a flush writes
+    all columns of the buffered rows once `flush_every` events have
+    accumulated, `flush_seconds` after the first buffered one (on a timer, so
+    a quiet or stalled stream does not hold them back), and at close().
+    """
+
+    def __init__(self, camera_id, truck_visit_id, root=EVENT_DIR, flush_every=64, flush_seconds=2.0):
+        self.root = root
+        self.camera_id = str(camera_id)
+        self.truck_visit_id = "" if truck_visit_id is None else str(truck_visit_id)
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self.events = 0
+        self._rows = []  # (ts_ms, track_id, label, zone)
+        self._timer = None
+        self._lock = threading.Lock()
+        self._partition = None  # (day, dir, labels, visit code, zones)
+
+    def record(self, events, ts=None):
+        """events as returned by ZoneCounter.update; ts in epoch seconds (default now)."""
+        if not events:
+            return
+        ts_ms = int((time.time() if ts is None else ts) * 1000)
+        with self._lock:
+            for event in events:
+                self._rows.append((ts_ms, int(event["track_id"]), event["label"], event.get("zone", "")))
+            self.events += len(events)
+            if len(self._rows) >= self.flush_every:
+                self._flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.flush_seconds, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _open_partition(self, day):
+        path = os.path.join(self.root, day.isoformat(), f"cam_{self.camera_id}")
+        os.makedirs(path, exist_ok=True)
+        labels = _read_lines(os.path.join(path, "labels.txt"))
+        visits = _read_lines(os.path.join(path, "visits.txt"))
+        zones = _read_lines(os.path.join(path, "zones.txt"))
+        if self.truck_visit_id in visits:
+            visit = visits.index(self.truck_visit_id)
+        else:
+            visit = len(visits)
+            with open(os.path.join(path, "visits.txt"), "a") as f:
+                f.write(self.truck_visit_id + "\n")
+        self._partition = (day, path, labels, visit, zones)
+
+    def _code(self, value, index):
+        """Code of a label / zone name in the partition's labels.txt / zones.txt."""
+        path, names = self._partition[1], self._partition[index]
+        if value not in names:
+            names.append(value)
+            with open(os.path.join(path, "labels.txt" if index == 2 else "zones.txt"), "a") as f:
+                f.write(value + "\n")
+        return names.index(value)
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        rows, self._rows = self._rows, []
+        # A session running past midnight continues in the next day's partition
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(datetime.fromtimestamp(row[0] / 1000).date(), []).append(row)
+        for day, day_rows in sorted(by_day.items()):
+            if self._partition is None or self._partition[0] != day:
+                self._open_partition(day)
+            path = self._partition[1]
+            columns = {
+                "ts": [r[0] for r in day_rows],
+                "track": [r[1] for r in day_rows],
+                "label": [self._code(r[2], 2) for r in day_rows],
+                "visit": [self._partition[3]] * len(day_rows),
+                "zone": [self._code(r[3], 4) for r in day_rows]
+            }
+            for name, dtype in _COLUMNS:
+                with open(os.path.join(path, f"{name}.{dtype[-2:]}"), "ab") as f:
+                    f.write(np.asarray(columns[name], dtype=dtype).tobytes())
+
+    def close(self):
+        self.flush()
+
+
+class EventStore:
+    """Read side: range filters and group-by counts over all partitions."""
+
+    def __init__(self, root=EVENT_DIR, shifts=DEFAULT_SHIFTS):
+        self.root = root
+        self.shifts = tuple(sorted(shifts, key=lambda s: s[1]))
+        self._cache = {}  # partition dir -> (row count, columns, labels, visits, zones)
+        self._lock = threading.Lock()
+
+    def _partitions(self, start_day, end_day, cameras=None):
+        if not os.path.isdir(self.root):
+            return
+        for day_name in sorted(os.listdir(self.root)):
+            try:
+                day = date.fromisoformat(day_name)
+            except ValueError:
+                continue
+            if (start_day and day < start_day) or (end_day and day > end_day):
+                continue
+            day_dir = os.path.join(self.root, day_name)
+            for cam_name in sorted(os.listdir(day_dir)):
+                camera_id = cam_name[len("cam_"):]
+                if cam_name.startswith("cam_") and (cameras is None or camera_id in cameras):
+                    yield day, camera_id, os.path.join(day_dir, cam_name)
+
+    def _load(self, path, sealed):
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached is not None and sealed:
+                return cached
+            rows = min(_column_rows(path, name, dtype) for name, dtype in _COLUMNS)
+            if cached is not None and cached[0] == rows:
+                return cached
+            columns = {}
+            for name, dtype in _COLUMNS:
+                columns[name] = np.fromfile(os.path.join(path, f"{name}.{dtype[-2:]}"), dtype=dtype,
+                                            count=rows) if rows else np.zeros(0, dtype=dtype)
+            loaded = (rows, columns, _read_lines(os.path.join(path, "labels.txt")),
+                      _read_lines(os.path.join(path, "visits.txt")),
+                      _read_lines(os.path.join(path, "zones.txt")))
+            self._cache[path] = loaded
+            return loaded
+
+    def _shift_keys(self, ms_of_day):
+        """Per event: (started the day before, index into self.shifts)."""
+        starts = np.array([hour * 3600000 for _, hour in self.shifts], dtype=np.int64)
+        idx = np.searchsorted(starts, ms_of_day, side="right") - 1
+        # Before the first shift start the previous day's last shift is running
+        before = idx < 0
+        idx[before] = len(self.shifts) - 1
+        return before, idx
+
+    def aggregate(self, start=None, end=None, group_by=("camera",), cameras=None, labels=None,
+                  truck_visit_id=None, zones=None):
+        """
+        Crossing counts with start <= time < end (datetimes, local time),
+        grouped by any of GROUP_FIELDS. Returns [{<group fields>..., "count"}]
+        sorted by the group key.
+        """
+        group_by = tuple(group_by)
+        unknown = [g for g in group_by if g not in GROUP_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown group_by field(s) {unknown}; expected {GROUP_FIELDS}")
+        start_ms = int(start.timestamp() * 1000) if start else None
+        end_ms = int(end.timestamp() * 1000) if end else None
+        end_day = None
+        if end:
+            end_day = (end - timedelta(microseconds=1)).date()
+        cameras = None if cameras is None else {str(c) for c in cameras}
+        labels = None if labels is None else set(labels)
+        zones = None if zones is None else set(zones)
+        today = date.today()
+
+        counts = Counter()
+        for day, camera_id, path in self._partitions(start.date() if start else None, end_day, cameras):
+            rows, columns, part_labels, part_visits, part_zones = self._load(path, sealed=day < today)
+            if not rows:
+                continue
+            ts = columns["ts"]
+            mask = np.ones(rows, dtype=bool)
+            if start_ms is not None:
+                mask &= ts >= start_ms
+            if end_ms is not None:
+                mask &= ts < end_ms
+            if labels is not None:
+                codes = [i for i, l in enumerate(part_labels) if l in labels]
+                mask &= np.isin(columns["label"], codes)
+            if zones is not None:
+                codes = [i for i, z in enumerate(part_zones) if z in zones]
+                mask &= np.isin(columns["zone"], codes)
+            if truck_visit_id is not None:
+                if str(truck_visit_id) not in part_visits:
+                    continue
+                mask &= columns["visit"] == part_visits.index(str(truck_visit_id))
+            if not mask.any():
+                continue
+
+            # Group keys as integer columns, decoded once per distinct combination
+            keys, decoders = [], []
+            day_ms = _day_start_ms(day)
+            for field in group_by:
+                if field == "camera":
+                    keys.append(np.zeros(int(mask.sum()), dtype=np.int64))
+                    decoders.append(lambda v, c=camera_id: c)
+                elif field == "zone":
+                    keys.append(columns["zone"][mask].astype(np.int64))
+                    decoders.append(lambda v, z=part_zones: z[v] if v < len(z) else str(v))
+                elif field == "label":
+                    keys.append(columns["label"][mask].astype(np.int64))
+                    decoders.append(lambda v, l=part_labels: l[v] if v < len(l) else str(v))
+                elif field == "truck_visit_id":
+                    keys.append(columns["visit"][mask].astype(np.int64))
+                    decoders.append(lambda v, vs=part_visits: vs[v] if v < len(vs) else str(v))
+                elif field == "day":
+                    keys.append(np.zeros(int(mask.sum()), dtype=np.int64))
+                    decoders.append(lambda v, d=day: d.isoformat())
+                elif field == "hour":
+                    keys.append((ts[mask] - day_ms) // 3600000)
+                    decoders.append(lambda v, d=day: (datetime.combine(d, datetime.min.time())
+                                                      + timedelta(hours=int(v))).strftime("%Y-%m-%dT%H:00"))
+                elif field == "shift":
+                    before, idx = self._shift_keys(ts[mask] - day_ms)
+                    keys.append(idx + before * len(self.shifts))
+                    decoders.append(lambda v, d=day, n=len(self.shifts):
+                                    f"{(d - timedelta(days=1) if v >= n else d).isoformat()}/"
+                                    f"{self.shifts[v % n][0]}")
+            if not keys:
+                counts[()] += int(mask.sum())
+                continue
+            # One mixed-radix code per event, counted with bincount
+            sizes = [int(k.max()) + 1 for k in keys]
+            code = np.zeros(len(keys[0]), dtype=np.int64)
+            for k, size in zip(keys, sizes):
+                code = code * size + k
+            combo_counts = np.bincount(code)
+            for combo in np.flatnonzero(combo_counts):
+                values, rest = [], int(combo)
+                for size in reversed(sizes):
+                    rest, v = divmod(rest, size)
+                    values.append(v)
+                key = tuple(decode(v) for decode, v in zip(decoders, reversed(values)))
+                counts[key] += int(combo_counts[combo])
+
+        return [dict(zip(group_by, key), count=n) for key, n in sorted(counts.items())]
+
+
+def parse_time(value, end=False):
+    """ISO date or datetime; a bare date as `end` means the end of that day."""
+    if value is None or value == "":
+        return None
+    if len(value) == 10:
+        day = date.fromisoformat(value)
+        return datetime.combine(day + timedelta(days=1) if end else day, datetime.min.time())
+    return datetime.fromisoformat(value)
+
+
+def query_from_args(store, args):
+    """
+    aggregate() from HTTP query parameters: start, end (ISO date or datetime),
+    group_by (comma separated), camera, zone, class, truck_visit_id. Raises
+    ValueError on bad input.
+    """
+    group_by = [g for g in (args.get("group_by") or "camera").split(",") if g]
+    cameras = [c for c in args.get("camera", "").split(",") if c] or None
+    labels = [l for l in args.get("class", "").split(",") if l] or None
+    zones = [z for z in args.get("zone", "").split(",") if z] or None
+    start = parse_time(args.get("start"))
+    end = parse_time(args.get("end"), end=True)
+    started = time.perf_counter()
+    rows = store.aggregate(start, end, group_by, cameras=cameras, labels=labels,
+                           truck_visit_id=args.get("truck_visit_id") or None, zones=zones)
+    return {
+        "start": start.isoformat() if start else None,
+        "end": end.isoformat() if end else None,
+        "group_by": group_by,
+        "total": sum(r["count"] for r in rows),
+        "rows": rows,
+        "query_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
@@ -0,0 +1,214 @@
+import time
+import numpy as np
+from multiprocessing import shared_memory
+
+# -------------------------------
+# Shared-memory frame ring
+# -------------------------------
+# Single producer (capture process) / single consumer (processing process)
+# ring of raw BGR frames in one multiprocessing.shared_memory block, so frames
+# never get pickled between processes.
+#
+# Layout: a small int64 control block followed by `slots` fixed-size frame
+# buffers. Each slot has its own header (seq, capture time in ns, h, w, c).
+# The producer marks a slot as being written (seq = -1), copies the frame,
+# then publishes seq; the consumer copies out and re-checks seq, so a frame
+# overwritten mid-read is dropped instead of returned torn.
+
+CTRL_WRITE_SEQ = 0   # sequence number of the last published frame (-1: none)
+CTRL_CLOSED = 1      # producer finished (end of file / stopped)
+CTRL_FPS_MILLI = 2   # source fps * 1000
+CTRL_FIELDS = 8
+SLOT_FIELDS = 5      # seq, capture_ns, height, width, channels
+
+DEFAULT_MAX_FRAME_BYTES = 1920 * 1080 * 3
+
+
+class SharedFrameRing:
+    def __init__(self, name=None, slots=4, max_frame_bytes=DEFAULT_MAX_FRAME_BYTES, create=False):
+        header_bytes = (CTRL_FIELDS + slots * SLOT_FIELDS) * 8
+        size = header_bytes + slots * max_frame_bytes
+        if create:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            # Workers are spawned by the owner and share its resource
+            # tracker, so attaching does not hand over ownership; only the
+            # creating process unlinks the segment
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.slots = slots
+        self.max_frame_bytes = max_frame_bytes
+        self.owner = create
+
+        self._ctrl = np.ndarray((CTRL_FIELDS,), dtype=np.int64, buffer=self.shm.buf, offset=0)
+        self._slot_hdr = np.ndarray((slots, SLOT_FIELDS), dtype=np.int64, buffer=self.shm.buf,
+                                    offset=CTRL_FIELDS * 8)
+        self._data = np.ndarray((slots, max_frame_bytes), dtype=np.uint8, buffer=self.shm.buf,
+                                offset=header_bytes)
+        if create:
+            self._ctrl[:] = 0
+            self._ctrl[CTRL_WRITE_SEQ] = -1
+            self._slot_hdr[:] = 0
+            self._slot_hdr[:, 0] = -1
+
+    @classmethod
+    def create(cls, slots=4, max_frame_bytes=DEFAULT_MAX_FRAME_BYTES, name=None):
+        return cls(name=name, slots=slots, max_frame_bytes=max_frame_bytes, create=True)
+
+    @classmethod
+    def attach(cls, name, slots=4, max_frame_bytes=DEFAULT_MAX_FRAME_BYTES):
+        return cls(name=name, slots=slots, max_frame_bytes=max_frame_bytes, create=False)
+
+    # -- producer --------------------------------------------------------
+
+    def write(self, frame, capture_ns=None):
+        if frame.nbytes > self.max_frame_bytes:
+            raise ValueError(f"Frame of {frame.nbytes} bytes exceeds ring slot size {self.max_frame_bytes}")
+        seq = int(self._ctrl[CTRL_WRITE_SEQ]) + 1
+        slot = seq % self.slots
+        hdr = self._slot_hdr[slot]
+        hdr[0] = -1
+        h, w = frame.shape[:2]
+        c = frame.shape[2] if frame.ndim == 3 else 1
+        self._data[slot, :frame.nbytes] = frame.reshape(-1)
+        hdr[1] = capture_ns if capture_ns is not None else time.time_ns()
+        hdr[2], hdr[3], hdr[4] = h, w, c
+        hdr[0] = seq
+        self._ctrl[CTRL_WRITE_SEQ] = seq
+        return seq
+
+    def set_fps(self, fps):
+        self._ctrl[CTRL_FPS_MILLI] = int(fps * 1000)
+
+    def close_stream(self):
+        self._ctrl[CTRL_CLOSED] = 1
+
+    def reopen_stream(self):
+        self._ctrl[CTRL_CLOSED] = 0
+
+    # -- consumer --------------------------------------------------------
+
+    @property
+    def write_seq(self):
+        return int(self._ctrl[CTRL_WRITE_SEQ])
+
+    @property
+    def closed(self):
+        return bool(self._ctrl[CTRL_CLOSED])
+
+    @property
+    def fps(self):
+        return self._ctrl[CTRL_FPS_MILLI] / 1000.0
+
+    def read(self, seq):
+        """
+        Copy out frame `seq`. Returns (frame, capture_ns), or (None, None) if
+        it has been overwritten already or was being rewritten while copied.
+        """
+        slot = seq % self.slots
+        hdr = self._slot_hdr[slot]
+        if hdr[0] != seq:
+            return None, None
+        capture_ns, h, w, c = int(hdr[1]), int(hdr[2]), int(hdr[3]), int(hdr[4])
+        n = h * w * c
+        frame = self._data[slot, :n].copy()
+        if hdr[0] != seq:
+            return None, None
+        shape = (h, w, c) if c > 1 else (h, w)
+        return frame.reshape(shape), capture_ns
+
+    def close(self):
+        self._ctrl = self._slot_hdr = self._data = None
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+class RingCapture:
+    """
+    cv2.VideoCapture-like reader over a SharedFrameRing, so VideoProcessor can
+    consume frames produced by another process. When the consumer falls more
+    than a ring's worth behind it skips to the oldest frame still present,
+    the same way the appsink drops stale buffers.
+    """
+
+    def __init__(self, ring, poll_interval=0.002, stop_event=None):
+        self.ring = ring
+        self.poll_interval = poll_interval
+        self.next_seq = 0
+        self.frames_read = 0
+        self.frames_dropped = 0
+        self.last_capture_ns = None
+        self._stopped = False
+        self._stop_event = stop_event
+        self._first = None
+
+    def _wait_frame(self):
+        while not self._stopped and not (self._stop_event is not None and self._stop_event.is_set()):
+            latest = self.ring.write_seq
+            if latest >= self.next_seq:
+                oldest = latest - self.ring.slots + 1
+                if self.next_seq < oldest:
+                    self.frames_dropped += oldest - self.next_seq
+                    self.next_seq = oldest
+                frame, capture_ns = self.ring.read(self.next_seq)
+                self.next_seq += 1
+                if frame is None:
+                    self.frames_dropped += 1
+                    continue
+                return frame, capture_ns
+            if self.ring.closed:
+                return None, None
+            time.sleep(self.poll_interval)
+        return None, None
+
+    def read(self):
+        if self._first is not None:
+            frame, self._first = self._first, None
+            return True, frame
+        frame, capture_ns = self._wait_frame()
+        if frame is None:
+            return False, None
+        self.frames_read += 1
+        self.last_capture_ns = capture_ns
+        return True, frame
+
+    def backlog(self):
+        """Frames already published but not read yet."""
+        return max(0, self.ring.write_seq - self.next_seq + 1)
+
+    def get(self, prop):
+        import cv2
+        if prop in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT):
+            # Frame size is only known once the producer published a frame
+            if self._first is None:
+                frame, capture_ns = self._wait_frame()
+                if frame is None:
+                    return 0
+                self._first = frame
+                self.frames_read += 1
+                self.last_capture_ns = capture_ns
+            return self._first.shape[1] if prop == cv2.CAP_PROP_FRAME_WIDTH else self._first.shape[0]
+        if prop == cv2.CAP_PROP_FPS:
+            return self.ring.fps
+        return 0
+
+    def isOpened(self):
+        return not self._stopped
+
+    def stop(self):
+        self._stopped = True
+
+    def release(self):
+        self._stopped = True
+
+    def health(self):
+        return {
+            "state": "closed" if self.ring.closed else "streaming",
+            "frames_read": self.frames_read,
+            "frames_dropped": self.frames_dropped,
+            "ring_lag_frames": self.backlog()
+        }
@@ -1,11 +1,21 @@
-import mysql.connector
-from dotenv import load_dotenv
 import os
 
-# Load environment variables from .env file
-load_dotenv()
+_env_loaded = False
+
+
+def _load_env():
+    # Load environment variables from .env file on first use rather than at import
+    global _env_loaded
+    if not _env_loaded:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _env_loaded = True
+
 
 def get_rtsp_link(camera_id):
+    import mysql.connector
+
+    _load_env()
     try:
         # Fetch credentials from environment variables
         db_host = os.getenv("DB_HOST")
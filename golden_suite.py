@@ -0,0 +1,379 @@
+import argparse
+import contextlib
+import fnmatch
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+# -------------------------------
+# Golden-video counting regression suite
+# -------------------------------
+# Runs every processing mode over reference clips with known per-class counts
+# and fails any mode whose count error exceeds its tolerance. Modes cover both
+# VideoProcessors and the replay path:
+#
+#   file/*    packmat_counter.py on the clip file (batching, stride, imgsz,
+#             ROI crop, clip output, cascade, inference cache cold + warm)
+#   live/*    packmat_counter_g.py fed frame by frame (resize path, forced QoS
+#             levels, cascade) and through a shared-memory ring (catch-up batches)
+#   replay/*  detection_replay.py record once, replay at stride 1 and 2
+#
+# Built-in synthetic clips (synthetic_source.py scenes, expected counts from
+# their geometry, rendered into the run's temp dir) run with the stub
+# detector, so the suite needs no GPU or model. The stub sees frames at imgsz like YOLO, and the cascade's light stub
+# runs at 320 with a lower confidence and misses partly visible boxes, so
+# imgsz and cascade modes differ from the baseline as with real models. Real
+# clips are added with a manifest:
+#
+#   {"clips": [{"name": "cam3_morning", "path": "golden/cam3_morning.mp4",
+#               "expected": {"carton": 14, "jerrycan_bundle": 3},
+#               "camera_id": "3", "model": "packmat_i2.pt"}],
+#    "tolerances": {"live/qos_3": 0.05}}
+#
+# Real clips run with their model; file/cached reads raw detections from the
+# inference cache (--cache), so clips already processed by video_process.py
+# replay without the model.
+#
+#   python golden_suite.py                       # synthetic clips, every mode
+#   python golden_suite.py --manifest golden/manifest.json --modes "file/*" --tolerance 0.02
+
+STUB_MODEL = "stub:0"
+STUB_LIGHT_MODEL = "stub:0,conf=0.7,min_area=800"
+STUB_LIGHT_IMGSZ = 320
+SUITE_CAMERA = "golden"
+
+# name -> (SyntheticScene kwargs, frames)
+SYNTHETIC_CLIPS = {
+    "conveyor": ({}, 300),
+    "sparse": ({"spacing": 60}, 600),
+    "fast": ({"speed": 10}, 300),
+    "two_lanes": ({"lanes": 2, "box_w": 200}, 300),
+}
+
+QOS_LEVELS = 3  # qos_controller.DEFAULT_LEVELS
+
+
+def synthetic_clips(out_dir):
+    """Render the built-in scenes not in out_dir yet; returns clip entries with their expected counts."""
+    from synthetic_source import SyntheticScene, write_clip
+    os.makedirs(out_dir, exist_ok=True)
+    clips = []
+    for name, (kwargs, frames) in SYNTHETIC_CLIPS.items():
+        scene = SyntheticScene(**kwargs)
+        path = os.path.abspath(os.path.join(out_dir, f"{name}.mp4"))
+        if not os.path.exists(path):
+            write_clip(path, scene, frames)
+        clips.append({"name": name, "path": path, "expected": scene.expected_counts(frames),
+                      "model": STUB_MODEL, "zones": None})
+    return clips
+
+
+def manifest_clips(path, default_model):
+    from camera_config import load_camera_config
+    with open(path, "r") as f:
+        manifest = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+    clips = []
+    for entry in manifest.get("clips", []):
+        clip_path = entry["path"]
+        if not os.path.isabs(clip_path) and not os.path.exists(clip_path):
+            clip_path = os.path.join(base_dir, clip_path)
+        zones = entry.get("zones")
+        if zones is None and entry.get("camera_id") is not None:
+            zones = load_camera_config(entry["camera_id"]).get("zones")
+        clips.append({
+            "name": entry.get("name", os.path.splitext(os.path.basename(clip_path))[0]),
+            "path": os.path.abspath(clip_path),
+            "expected": entry["expected"],
+            "model": entry.get("model", default_model),
+            "light_model": entry.get("light_model"),
+            "light_imgsz": entry.get("light_imgsz"),
+            "zones": zones
+        })
+    return clips, manifest.get("tolerances", {})
+
+
+# -------------------------------
+# Modes
+# -------------------------------
+# Each mode: backend, camera config entries, processor attributes set after
+# construction, extra constructor arguments.
+
+def build_modes(clip, light_model, light_imgsz=None):
+    from resolution_tuner import parse_rois
+    roi = parse_rois(["zones"], {"zones": clip["zones"]}, 0.15)[0][1]
+    no_qos = {"qos": False}
+    cascade = {"cascade": {"light_model": light_model, "light_imgsz": light_imgsz}} if light_model else None
+
+    modes = [
+        ("file/baseline", "file", {}, {}, {}),
+        ("file/batch_8", "file", {"batch_size": 8}, {}, {}),
+        ("file/stride_2", "file", {}, {"frame_skip": 2}, {}),
+        ("file/imgsz_320", "file", {"imgsz": 320}, {}, {}),
+        ("file/roi_zones", "file", {"roi": roi}, {}, {}),
+        ("file/clips_output", "file", {"output_mode": "clips"}, {}, {}),
+        ("file/cached", "cached", {}, {}, {}),
+        ("live/baseline", "live", dict(no_qos), {}, {}),
+        ("live/ring_catchup", "ring", dict(no_qos, batch_size=4), {}, {}),
+        ("replay/stride_1", "replay", {}, {}, {"frame_skip": 1}),
+        ("replay/stride_2", "replay", {}, {}, {"frame_skip": 2}),
+    ]
+    # Forced QoS degradation levels; a huge budget / hold keeps them fixed
+    for level in range(1, QOS_LEVELS + 1):
+        modes.append((f"live/qos_{level}", "live", {"qos": {"budget_ms": 1e12, "hold_seconds": 1e12}},
+                      {"qos_level": level}, {}))
+    if cascade:
+        modes.append(("file/cascade", "file", dict(cascade), {}, {}))
+        modes.append(("live/cascade", "live", dict(no_qos, **cascade), {}, {}))
+    return modes
+
+
+class _ClipCapture:
+    """Unpaced clip reader with the stop() / health() of the live captures."""
+
+    def __init__(self, path):
+        import cv2
+        self.cap = cv2.VideoCapture(path)
+        self.frames_read = 0
+
+    def read(self):
+        ret, frame = self.cap.read()
+        if ret:
+            self.frames_read += 1
+        return ret, frame
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def stop(self):
+        pass
+
+    def release(self):
+        self.cap.release()
+
+    def health(self):
+        return {"state": "file", "frames_read": self.frames_read}
+
+
+def _write_config(camera_id, zones, settings):
+    entry = dict(settings)
+    if zones:
+        entry["zones"] = zones
+    with open("camera_config.json", "w") as f:
+        json.dump({camera_id: entry}, f)
+
+
+def _frame_count(path):
+    import cv2
+    cap = cv2.VideoCapture(path)
+    frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return frames
+
+
+def _apply_attrs(processor, attrs):
+    level = attrs.get("qos_level")
+    if level:
+        processor.qos._set_level(level, "forced by golden suite")
+        processor._apply_qos_level()
+    if "frame_skip" in attrs:
+        processor.frame_skip = attrs["frame_skip"]
+
+
+def _run_file(clip, camera_id, attrs, inference_cache=None):
+    from packmat_counter import VideoProcessor
+    processor = VideoProcessor(clip["path"], clip["model"], camera_id=camera_id, inference_cache=inference_cache)
+    _apply_attrs(processor, attrs)
+    start = time.perf_counter()
+    processor.process_video()
+    return processor.zone_counter.counts_by_class(), time.perf_counter() - start, {}
+
+
+def _run_live(clip, camera_id, attrs):
+    from packmat_counter_g import VideoProcessor
+    processor = VideoProcessor(None, clip["model"], camera_id=camera_id, capture=_ClipCapture(clip["path"]))
+    _apply_attrs(processor, attrs)
+    start = time.perf_counter()
+    processor.process_video()
+    return processor.zone_counter.counts_by_class(), time.perf_counter() - start, {}
+
+
+def _run_ring(clip, camera_id, attrs, slots=16):
+    import cv2
+    from frame_ring import SharedFrameRing, RingCapture
+    from packmat_counter_g import VideoProcessor
+    cap = cv2.VideoCapture(clip["path"])
+    ret, first = cap.read()
+    ring = SharedFrameRing.create(slots=slots, max_frame_bytes=first.nbytes)
+    ring.set_fps(cap.get(cv2.CAP_PROP_FPS) or 25)
+    capture = RingCapture(ring)
+
+    def produce(frame):
+        # As fast as possible, but never overwrite an unread frame: the
+        # consumer is always behind, so it runs in catch-up batches
+        while frame is not None:
+            while ring.write_seq - capture.next_seq >= slots - 2 and not capture._stopped:
+                time.sleep(0.001)
+            ring.write(frame)
+            ret, frame = cap.read()
+            if not ret:
+                frame = None
+        ring.close_stream()
+
+    # Started first: the processor waits for a frame to learn the frame size
+    producer = threading.Thread(target=produce, args=(first,), daemon=True)
+    start = time.perf_counter()
+    producer.start()
+    try:
+        processor = VideoProcessor(None, clip["model"], camera_id=camera_id, capture=capture)
+        _apply_attrs(processor, attrs)
+        processor.process_video()
+        elapsed = time.perf_counter() - start
+        health = capture.health()
+    finally:
+        capture.stop()
+        producer.join(timeout=10)
+        cap.release()
+        ring.close()
+    return processor.zone_counter.counts_by_class(), elapsed, {"frames_dropped": health["frames_dropped"]}
+
+
+def _run_cached(clip, camera_id, attrs, cache_path):
+    from inference_cache import InferenceCache
+    cache = InferenceCache(cache_path)
+    try:
+        cold_counts, cold_seconds, _ = _run_file(clip, camera_id, attrs, inference_cache=cache)
+        counts, seconds, _ = _run_file(clip, camera_id, attrs, inference_cache=cache)
+    finally:
+        cache.close()
+    extra = {"cold_fps_seconds": round(cold_seconds, 3)}
+    if cold_counts != counts:
+        extra["cold_counts"] = cold_counts
+    return counts, seconds, extra
+
+
+def _run_replay(clip, kwargs, replay_dir):
+    from detection_replay import record_video, load_replay, replay_counts
+    path = os.path.join(replay_dir, f"{clip['name']}.pkd")
+    if not os.path.exists(path):
+        record_video(clip["path"], path, model_path=clip["model"])
+    result = replay_counts(load_replay(path), zone_cfgs=clip["zones"], **kwargs)
+    return result["by_class"], result["seconds"], {}
+
+
+def run_mode(clip, mode, workdir, cache_path):
+    name, backend, settings, attrs, kwargs = mode
+    camera_id = f"{SUITE_CAMERA}_{clip['name']}"
+    _write_config(camera_id, clip["zones"], settings)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        if backend == "file":
+            return _run_file(clip, camera_id, attrs)
+        if backend == "cached":
+            return _run_cached(clip, camera_id, attrs, cache_path)
+        if backend == "live":
+            return _run_live(clip, camera_id, attrs)
+        if backend == "ring":
+            return _run_ring(clip, camera_id, attrs)
+        if backend == "replay":
+            return _run_replay(clip, kwargs, workdir)
+    raise ValueError(f"Unknown backend {backend}")
+
+
+def count_error(expected, counts):
+    """Per-class absolute miscount as a share of the expected total."""
+    labels = set(expected) | set(counts)
+    miss = sum(abs(counts.get(l, 0) - expected.get(l, 0)) for l in labels)
+    return miss, miss / max(sum(expected.values()), 1)
+
+
+def _tolerance(mode_name, tolerances, default):
+    for pattern, value in tolerances.items():
+        if fnmatch.fnmatch(mode_name, pattern):
+            return value
+    return default
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Counting accuracy of every processing mode on reference clips")
+    parser.add_argument("--manifest", default=None, help="JSON list of real clips with expected counts")
+    parser.add_argument("--no-synthetic", action="store_true", help="only the manifest clips")
+    parser.add_argument("--synthetic-dir", default=None,
+                        help="keep the rendered synthetic clips here (default: the run's temp dir)")
+    parser.add_argument("--model", default="packmat_i2.pt", help="model of manifest clips without one")
+    parser.add_argument("--light-model", default=None, help="light model for the cascade modes of real clips")
+    parser.add_argument("--cache", default=os.path.join("cache", "inference.sqlite"),
+                        help="inference cache for file/cached on real clips")
+    parser.add_argument("--modes", nargs="*", default=None, help="mode name patterns, e.g. 'file/*' live/qos_3")
+    parser.add_argument("--clips", nargs="*", default=None, help="clip name patterns")
+    parser.add_argument("--tolerance", type=float, default=0.0,
+                        help="max count error (share of the expected total) per clip and mode")
+    parser.add_argument("--out", default="golden_report.json")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="packmat_golden_")
+    clips, tolerances = [], {}
+    if not args.no_synthetic:
+        clips += synthetic_clips(args.synthetic_dir or os.path.join(workdir, "synthetic"))
+    if args.manifest:
+        real, tolerances = manifest_clips(args.manifest, args.model)
+        clips += real
+    if args.clips:
+        clips = [c for c in clips if any(fnmatch.fnmatch(c["name"], p) for p in args.clips)]
+    real_cache = os.path.abspath(args.cache)
+    out_path = os.path.abspath(args.out)
+
+    cwd = os.getcwd()
+    os.chdir(workdir)  # the suite's camera_config.json, outputs/, clips/ and replays go here
+    results = []
+    try:
+        for clip in clips:
+            stub = clip["model"] == STUB_MODEL
+            light_model = STUB_LIGHT_MODEL if stub else (clip.get("light_model") or args.light_model)
+            light_imgsz = STUB_LIGHT_IMGSZ if stub else clip.get("light_imgsz")
+            cache_path = os.path.join(workdir, "stub_cache.sqlite") if stub else real_cache
+            frames = _frame_count(clip["path"])
+            for mode in build_modes(clip, light_model, light_imgsz):
+                name = mode[0]
+                if args.modes and not any(fnmatch.fnmatch(name, p) for p in args.modes):
+                    continue
+                tolerance = _tolerance(name, tolerances, args.tolerance)
+                row = {"clip": clip["name"], "mode": name, "detector": clip["model"],
+                       "expected": clip["expected"], "tolerance": tolerance}
+                try:
+                    counts, seconds, extra = run_mode(clip, mode, workdir, cache_path)
+                    miss, error = count_error(clip["expected"], counts)
+                    row.update(counts=counts, miscount=miss, error=round(error, 4),
+                               fps=round(frames / seconds, 1) if seconds > 0 else None,
+                               passes=error <= tolerance, **extra)
+                except Exception as e:
+                    row.update(error=None, passes=False, exception=f"{type(e).__name__}: {e}")
+                results.append(row)
+                status = "ok" if row["passes"] else "FAIL"
+                if "exception" in row:
+                    print(f"[GOLDEN] {clip['name']:<14} {name:<20} ERROR {row['exception']}")
+                else:
+                    print(f"[GOLDEN] {clip['name']:<14} {name:<20} miscount {row['miscount']:>3} "
+                          f"error {row['error']:6.1%} (tol {tolerance:.1%})  {row['fps']:>7} fps  {status}")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    failed = [r for r in results if not r["passes"]]
+    with open(out_path, "w") as f:
+        json.dump({"tolerance": args.tolerance, "tolerances": tolerances, "results": results}, f, indent=2)
+    print(f"[GOLDEN] {len(results) - len(failed)}/{len(results)} clip/mode runs within tolerance; report: {out_path}")
+    for r in failed:
+        print(f"[GOLDEN] FAIL {r['clip']} {r['mode']}: "
+              + (r.get("exception") or f"expected {r['expected']}, counted {r['counts']}"))
+    return 1 if failed or not results else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,10 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from get_rtsp_link import get_rtsp_link
 from save_to_DB import save_video_log
 from video_tracker import mark_video_as_processed
-from packmat_counter import VideoProcessor
-from video_recorder import record_camera_stream
+from service_readiness import ServiceReadiness, warmup_enabled, warmup_disabled
+from sampling_profiler import register_thread, unregister_thread, session_threads, sample_stacks, to_collapsed
+import importlib
 import threading
 import os
 
@@ -11,6 +12,21 @@ from datetime import datetime
 
 app = Flask(__name__)
 
+MODEL_PATH = os.environ.get("PACKMAT_MODEL", "packmat_i2.pt")
+
+# cv2 / torch / ultralytics / mysql are loaded in the background (and lazily
+# by the session threads) so the HTTP layer is up immediately
+readiness = ServiceReadiness([
+    ("video_recorder", lambda: importlib.import_module("video_recorder")),
+    ("packmat_counter", lambda: importlib.import_module("packmat_counter")),
+    ("mysql", lambda: importlib.import_module("mysql.connector")),
+    ("model", lambda: importlib.import_module("model_registry").warmup_model(MODEL_PATH)),
+])
+if warmup_enabled(main=__name__ == "__main__"):
+    readiness.start()
+elif warmup_disabled():
+    readiness.skip()
+
 # Shared state
 processing_status = {
     "status": "idle",
@@ -19,6 +35,8 @@ processing_status = {
     "camera_id": None
 }
 processing_thread = None
+current_processor = None
+event_store = None
 stop_processing = False
 
 
@@ -27,21 +45,37 @@ def concurrent_record_and_process(rtsp_link, camera_id, truck_visit_id):
 
     # Start recording in its own thread
     def record():
+        from video_recorder import record_camera_stream
+        register_thread(camera_id, "recorder")
         print(f"[{camera_id}] Starting recording...")
-        record_camera_stream(camera_id, rtsp_link, duration=120)
+        try:
+            record_camera_stream(camera_id, rtsp_link, duration=120)
+        finally:
+            unregister_thread()
         print(f"[{camera_id}] Recording finished.")
 
     # Start detection/processing in its own thread
     def detect():
+        global current_processor
+        from packmat_counter import VideoProcessor
         print(f"[{camera_id}] Starting object detection...")
-        processor = VideoProcessor(
-            video_path=rtsp_link,  # pass RTSP stream directly
-            model_path="packmat_i2.pt",
-            camera_id=camera_id
-        )
-        count = processor.process_video(stop_flag=lambda: stop_processing)
+        register_thread(camera_id, "detect")
+        try:
+            processor = VideoProcessor(
+                video_path=rtsp_link,  # pass RTSP stream directly
+                model_path=MODEL_PATH,
+                camera_id=camera_id,
+                truck_visit_id=truck_visit_id
+            )
+            current_processor = processor
+            count = processor.process_video(stop_flag=lambda: stop_processing)
+        finally:
+            unregister_thread()
         processing_status["count"] = count
         processing_status["output_path"] = processor.output_path
+        processing_status["zone_counts"] = processor.zone_counter.counts_by_zone()
+        processing_status["qos"] = processor.qos.status() if processor.qos else None
+        current_processor = None
 
         if not stop_processing:
             save_video_log(truck_visit_id, processor.output_path, count)
@@ -99,7 +133,8 @@ def process_video_and_generate_output():
         "status": "running",
         "count": 0,
         "output_path": None,
-        "camera_id": camera_id
+        "camera_id": camera_id,
+        "zone_counts": {}
     })
 
     stop_processing = False
@@ -130,6 +165,7 @@ def stop_and_return_count():
             "status": "stopped",
             "message": "Stopped manually.",
             "object_count": processing_status["count"],
+            "zone_counts": processing_status.get("zone_counts", {}),
             "output_path": processing_status["output_path"]
         }), 200
 
@@ -137,6 +173,7 @@ def stop_and_return_count():
         return jsonify({
             "status": "completed",
             "object_count": processing_status["count"],
+            "zone_counts": processing_status.get("zone_counts", {}),
             "output_path": processing_status["output_path"]
         }), 200
 
@@ -147,6 +184,74 @@ def stop_and_return_count():
         }), 200
 
 
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    return jsonify({"status": "ok"}), 200
+
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    status = readiness.status()
+    return jsonify(status), 200 if readiness.is_ready() else 503
+
+
+@app.route("/stream_health", methods=["GET"])
+def stream_health():
+    processor = current_processor
+    if processing_status["status"] != "running" or processor is None:
+        return jsonify({"status": processing_status["status"], "stream": None}), 200
+    return jsonify({
+        "status": processing_status["status"],
+        "count": processor.counter,
+        "stream": processor.stream_health()
+    }), 200
+
+
+@app.route("/admin/profile", methods=["GET", "POST"])
+def admin_profile():
+    """
+    Sample the running session's detect / recorder / clip writer threads of
+    one camera for `seconds` and return collapsed stacks (text/plain):
+    GET /admin/profile?camera=3&seconds=10
+    """
+    data = request.get_json(silent=True) or {}
+    camera_id = str(request.args.get("camera", data.get("camera", processing_status.get("camera_id"))))
+    try:
+        seconds = float(request.args.get("seconds", data.get("seconds", 10)))
+    except ValueError:
+        return jsonify({"status": "error", "message": "seconds must be a number"}), 400
+
+    threads = session_threads(camera_id)
+    if not threads:
+        return jsonify({"status": "error", "message": f"No running session for camera {camera_id}."}), 404
+    counts, samples = sample_stacks(threads, seconds)
+    return Response(to_collapsed(counts), mimetype="text/plain", headers={"X-Profile-Samples": str(samples)})
+
+
+@app.route("/qos", methods=["GET"])
+def qos_status():
+    """Degradation level, lag and level changes of the running (or last) session."""
+    processor = current_processor
+    if processor is not None:
+        return jsonify({"status": processing_status["status"],
+                        "qos": processor.qos.status() if processor.qos else None}), 200
+    return jsonify({"status": processing_status["status"], "qos": processing_status.get("qos")}), 200
+
+
+@app.route("/counts", methods=["GET"])
+def counts():
+    """Crossing counts from the local event store (see event_store.query_from_args)."""
+    global event_store
+    from event_store import EventStore, parse_shifts, DEFAULT_SHIFTS, query_from_args
+    if event_store is None:
+        shifts = os.environ.get("PACKMAT_SHIFTS")
+        event_store = EventStore(shifts=parse_shifts(shifts) if shifts else DEFAULT_SHIFTS)
+    try:
+        return jsonify(query_from_args(event_store, request.args)), 200
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+
 if __name__ == "__main__":
     app.run(debug=True, host="0.0.0.0", port=5005)
 
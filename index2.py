@@ -1,22 +1,54 @@
-from flask import Flask, request, jsonify
-from packmat_counter_g import VideoProcessor
+from flask import Flask, Response, request, jsonify
 from get_rtsp_link import get_rtsp_link
-from video_recorder import record_camera_stream
 from video_tracker import mark_video_as_processed
 from save_to_DB import save_video_log
+from service_readiness import ServiceReadiness, warmup_enabled, warmup_disabled
+from sampling_profiler import register_thread, unregister_thread, session_threads, sample_stacks, to_collapsed
+import importlib
 import os
 import threading
+from collections import deque
 from datetime import datetime
 
 app = Flask(__name__)
 
+# "thread" (default): one session, recording + inference threads in this
+# process. "process": each camera runs in its own capture and processing
+# processes (camera_worker.CameraWorkerPool), several cameras at once.
+WORKER_MODE = os.environ.get("PACKMAT_WORKER_MODE", "thread")
+MODEL_PATH = os.environ.get("PACKMAT_MODEL", "packmat_i2.pt")
+
+# cv2 / torch / ultralytics / mysql are loaded in the background (and lazily
+# by the worker threads) so the HTTP layer is up immediately
+_warmup_steps = [
+    ("video_recorder", lambda: importlib.import_module("video_recorder")),
+    ("mysql", lambda: importlib.import_module("mysql.connector")),
+]
+if WORKER_MODE == "process":
+    # Each processing process loads its own model
+    _warmup_steps.append(("camera_worker", lambda: importlib.import_module("camera_worker")))
+else:
+    _warmup_steps += [
+        ("packmat_counter_g", lambda: importlib.import_module("packmat_counter_g")),
+        ("model", lambda: importlib.import_module("model_registry").warmup_model(MODEL_PATH, "cuda")),
+    ]
+readiness = ServiceReadiness(_warmup_steps)
+if warmup_enabled(main=__name__ == "__main__"):
+    readiness.start()
+elif warmup_disabled():
+    readiness.skip()
+
+# Recorded segment history kept per session (2-minute segments: a day is 720).
+# Older segments are marked processed as they drop out of the window.
+MAX_RECORDED_PATHS = 720
+
 processor_instance = None
 processing_status = {
     "status": "idle",
     "count": 0,
     "output_path": None,
     "camera_id": None,
-    "recorded_paths": []
+    "recorded_paths": deque(maxlen=MAX_RECORDED_PATHS)
 }
 _processing_lock = threading.Lock()
 
@@ -24,10 +56,20 @@ _recorder_thread = None
 _inference_thread = None
 _stop_event = threading.Event()
 
+_worker_pool = None
+_camera_sessions = {}  # process mode: camera_id -> recorder thread / stop event / truck visit
+_sessions_lock = threading.Lock()
+_event_store = None
+
 
-def _recorder_worker(camera_id: str, rtsp_link: str, stop_event: threading.Event, save_dir: str = "videos"):
+def _recorder_worker(camera_id: str, rtsp_link: str, stop_event: threading.Event, save_dir: str = "videos",
+                     recorded_paths=None):
+    from video_recorder import record_camera_stream
+    if recorded_paths is None:
+        recorded_paths = processing_status["recorded_paths"]
     os.makedirs(save_dir, exist_ok=True)
     segment_length = 120  # seconds per segment
+    register_thread(camera_id, "recorder")
     while not stop_event.is_set():
         try:
             # record_camera_stream will create its own timestamped filename in save_dir
@@ -35,43 +77,183 @@ def _recorder_worker(camera_id: str, rtsp_link: str, stop_event: threading.Event
                 camera_id,
                 rtsp_link,
                 duration=segment_length,
-                output_folder=save_dir
+                output_folder=save_dir,
+                stop_event=stop_event
             )
 
             if isinstance(recorded_path, str) and os.path.exists(recorded_path):
                 with _processing_lock:
-                    processing_status["recorded_paths"].append(recorded_path)
+                    if len(recorded_paths) == recorded_paths.maxlen:
+                        mark_video_as_processed(recorded_paths[0])
+                    recorded_paths.append(recorded_path)
 
         except Exception as e:
             print(f"[RECORDER] recording failed for camera {camera_id}: {e}")
             break
 
+    unregister_thread()
     print(f"[RECORDER] Stopped recorder for camera {camera_id}")
 
 
-def _inference_worker(camera_id: str, rtsp_link: str, stop_event: threading.Event, model_path: str = "packmat_i2.pt"):
+def _inference_worker(camera_id: str, rtsp_link: str, stop_event: threading.Event,
+                      model_path: str = "packmat_i2.pt", truck_visit_id=None):
     global processor_instance
+    from packmat_counter_g import VideoProcessor
     print(f"[INFER] Starting inference for camera {camera_id}")
-    try:
-        processor_instance = VideoProcessor(
-            rtsp_url=rtsp_link,
-            model_path=model_path,
-            camera_id=camera_id
-        )
-        count = processor_instance.process_video()
-        output_path = processor_instance.output_path
-    except Exception as e:
-        print(f"[INFER] Inference error for camera {camera_id}: {e}")
-        count = 0
-        output_path = None
+    count = 0
+    output_path = None
+    zone_counts = {}
+    qos = None
+    restart_delay = 1.0
+    register_thread(camera_id, "inference")
+    # A crashed processor is rebuilt for the same truck visit and resumes
+    # from its last checkpoint
+    while not stop_event.is_set():
+        processor_instance = None
+        try:
+            processor_instance = VideoProcessor(
+                rtsp_url=rtsp_link,
+                model_path=model_path,
+                camera_id=camera_id,
+                session_id=truck_visit_id
+            )
+            if stop_event.is_set():
+                processor_instance.stop()
+            count = processor_instance.process_video()
+            output_path = processor_instance.output_path
+            zone_counts = processor_instance.zone_counter.counts_by_zone()
+            qos = processor_instance.qos.status() if processor_instance.qos else None
+            break
+        except Exception as e:
+            print(f"[INFER] Inference error for camera {camera_id}: {e}")
+            if processor_instance is not None:
+                count = processor_instance.counter
+                output_path = processor_instance.output_path
+                zone_counts = processor_instance.zone_counter.counts_by_zone()
+            if truck_visit_id is None:
+                break
+            print(f"[INFER] Restarting inference for camera {camera_id} in {restart_delay:.0f}s")
+            if stop_event.wait(restart_delay):
+                break
+            restart_delay = min(restart_delay * 2, 30.0)
 
     with _processing_lock:
         processing_status["count"] = count
         processing_status["output_path"] = output_path
+        processing_status["zone_counts"] = zone_counts
+        processing_status["qos"] = qos
+        # The session's processor (capture, writer, tracker) is not kept alive
+        # until the next session replaces it
+        processor_instance = None
 
+    unregister_thread()
     print(f"[INFER] Inference stopped for camera {camera_id}. Count={count}, output={output_path}")
 
 
+def _get_worker_pool():
+    global _worker_pool
+    if _worker_pool is None:
+        from camera_worker import CameraWorkerPool
+        _worker_pool = CameraWorkerPool(model_path=MODEL_PATH)
+    return _worker_pool
+
+
+def _get_event_store():
+    global _event_store
+    if _event_store is None:
+        from event_store import EventStore, parse_shifts, DEFAULT_SHIFTS
+        shifts = os.environ.get("PACKMAT_SHIFTS")
+        _event_store = EventStore(shifts=parse_shifts(shifts) if shifts else DEFAULT_SHIFTS)
+    return _event_store
+
+
+def _start_worker_session(camera_id, rtsp_link, truck_visit_id):
+    pool = _get_worker_pool()
+    # Concurrent triggers for one camera: the second one gets the 409
+    with _sessions_lock:
+        if camera_id in pool.running_cameras():
+            return jsonify({"status": "error",
+                            "message": f"Camera {camera_id} already has a running session."}), 409
+
+        # A worker session that finished or failed on its own still has its
+        # recorder running; stop it before the new session takes the camera
+        stale = _camera_sessions.pop(camera_id, None)
+        if stale is not None:
+            stale["stop_event"].set()
+            stale["recorder_thread"].join(timeout=30)
+            print(f"[RECORDER] Camera {camera_id}: stopped the recorder of ended session "
+                  f"{stale['truck_visit_id']}")
+
+        session = {
+            "truck_visit_id": truck_visit_id,
+            "stop_event": threading.Event(),
+            "recorded_paths": deque(maxlen=MAX_RECORDED_PATHS)
+        }
+        pool.start_session(camera_id, rtsp_link, session_id=truck_visit_id)
+        session["recorder_thread"] = threading.Thread(
+            target=_recorder_worker,
+            args=(camera_id, rtsp_link, session["stop_event"], "videos", session["recorded_paths"]),
+            daemon=True)
+        session["recorder_thread"].start()
+        _camera_sessions[camera_id] = session
+
+    if stale is not None:
+        try:
+            for rp in stale["recorded_paths"]:
+                if os.path.exists(rp):
+                    mark_video_as_processed(rp)
+        except Exception as e:
+            print(f"[TRACKER] mark_video_as_processed error: {e}")
+
+    return jsonify({"status": "started", "message": "Recording and inference started in worker processes.",
+                    "camera_id": camera_id}), 200
+
+
+def _stop_worker_session(data):
+    pool = _get_worker_pool()
+    running = pool.running_cameras()
+    camera_id = str(data["Conveyr_id"]) if "Conveyr_id" in data else None
+    if camera_id is None and len(running) == 1:
+        camera_id = running[0]
+    with _sessions_lock:
+        session = _camera_sessions.pop(camera_id, None) if camera_id is not None else None
+    if session is None:
+        return jsonify({"status": "idle", "message": "No running session.", "running_cameras": running}), 200
+
+    session["stop_event"].set()
+    summary = pool.stop_session(camera_id, timeout=30)
+    session["recorder_thread"].join(timeout=30)
+
+    result = summary.get("result") or {}
+    final_count = summary["count"]
+    output_path = result.get("output_path")
+    truck_visit_id = data.get("truck_visit_id", session["truck_visit_id"])
+
+    try:
+        if truck_visit_id and output_path:
+            save_video_log(truck_visit_id, output_path, final_count)
+    except Exception as e:
+        print(f"[DB] save_video_log error: {e}")
+
+    try:
+        for rp in session["recorded_paths"]:
+            if os.path.exists(rp):
+                mark_video_as_processed(rp)
+    except Exception as e:
+        print(f"[TRACKER] mark_video_as_processed error: {e}")
+
+    return jsonify({
+        "status": "completed",
+        "message": "Processing stopped and finalized.",
+        "camera_id": camera_id,
+        "object_count": final_count,
+        "zone_counts": result.get("zone_counts", {}),
+        "output_path": output_path,
+        "recorded_paths": list(session["recorded_paths"]),
+        "worker": summary
+    }), 200
+
+
 @app.route("/process_packmat", methods=["POST"])
 def process_video_and_generate_output():
     global _recorder_thread, _inference_thread, _stop_event
@@ -93,6 +275,9 @@ def process_video_and_generate_output():
     except Exception as e:
         return jsonify({"status": "error", "message": f"DB error: {e}"}), 500
 
+    if WORKER_MODE == "process":
+        return _start_worker_session(camera_id, rtsp_link, truck_visit_id)
+
     if processing_status["status"] == "running":
         return jsonify({"status": "error", "message": "Another session is already running."}), 409
 
@@ -102,7 +287,8 @@ def process_video_and_generate_output():
             "count": 0,
             "output_path": None,
             "camera_id": camera_id,
-            "recorded_paths": []
+            "zone_counts": {},
+            "recorded_paths": deque(maxlen=MAX_RECORDED_PATHS)
         })
 
     _stop_event.clear()
@@ -112,7 +298,7 @@ def process_video_and_generate_output():
     _recorder_thread.start()
 
     _inference_thread = threading.Thread(
-        target=_inference_worker, args=(camera_id, rtsp_link, _stop_event, "packmat_i2.pt"), daemon=True)
+        target=_inference_worker, args=(camera_id, rtsp_link, _stop_event, MODEL_PATH, truck_visit_id), daemon=True)
     _inference_thread.start()
 
     return jsonify({"status": "started", "message": "Recording and inference started.", "camera_id": camera_id}), 200
@@ -124,12 +310,16 @@ def stop_and_return_count():
     data = request.get_json() or {}
     truck_visit_id = data.get("truck_visit_id", None)
 
+    if WORKER_MODE == "process":
+        return _stop_worker_session(data)
+
     if processing_status["status"] != "running":
         return jsonify({"status": processing_status["status"], "message": "No running session."}), 200
 
     _stop_event.set()
-    if processor_instance:
-        processor_instance.stop()
+    processor = processor_instance
+    if processor:
+        processor.stop()
 
     if _inference_thread:
         _inference_thread.join(timeout=30)
@@ -158,11 +348,80 @@ def stop_and_return_count():
         "status": "completed",
         "message": "Processing stopped and finalized.",
         "object_count": final_count,
+        "zone_counts": processing_status.get("zone_counts", {}),
+        "qos": processing_status.get("qos"),
         "output_path": output_path,
-        "recorded_paths": processing_status.get("recorded_paths", [])
+        "recorded_paths": list(processing_status.get("recorded_paths", []))
     }), 200
 
 
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    return jsonify({"status": "ok"}), 200
+
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    status = readiness.status()
+    return jsonify(status), 200 if readiness.is_ready() else 503
+
+
+@app.route("/stream_health", methods=["GET"])
+def stream_health():
+    if WORKER_MODE == "process":
+        return jsonify({"status": "process", "workers": _get_worker_pool().status()}), 200
+    processor = processor_instance
+    if processing_status["status"] != "running" or processor is None:
+        return jsonify({"status": processing_status["status"], "stream": None}), 200
+    return jsonify({
+        "status": processing_status["status"],
+        "count": processor.counter,
+        "stream": processor.stream_health()
+    }), 200
+
+
+@app.route("/admin/profile", methods=["GET", "POST"])
+def admin_profile():
+    """
+    Sample the running session's threads of one camera for `seconds` and
+    return collapsed stacks (text/plain) for flamegraph tools:
+    GET /admin/profile?camera=3&seconds=10
+    """
+    data = request.get_json(silent=True) or {}
+    camera_id = str(request.args.get("camera", data.get("camera", processing_status.get("camera_id"))))
+    try:
+        seconds = float(request.args.get("seconds", data.get("seconds", 10)))
+    except ValueError:
+        return jsonify({"status": "error", "message": "seconds must be a number"}), 400
+
+    if WORKER_MODE == "process":
+        result = _get_worker_pool().profile(camera_id, seconds)
+        if result is None:
+            return jsonify({"status": "error", "message": f"No running session for camera {camera_id}."}), 404
+        collapsed, samples = result
+    else:
+        threads = session_threads(camera_id)
+        if not threads:
+            return jsonify({"status": "error", "message": f"No running session for camera {camera_id}."}), 404
+        counts, samples = sample_stacks(threads, seconds)
+        collapsed = to_collapsed(counts)
+
+    return Response(collapsed, mimetype="text/plain", headers={"X-Profile-Samples": str(samples)})
+
+
+@app.route("/counts", methods=["GET"])
+def counts():
+    """
+    Crossing counts from the local event store, e.g.
+    GET /counts?start=2026-10-01&end=2026-10-31&group_by=camera,shift&class=carton
+    """
+    from event_store import query_from_args
+    try:
+        return jsonify(query_from_args(_get_event_store(), request.args)), 200
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+
 if __name__ == "__main__":
     os.makedirs("videos", exist_ok=True)
     os.makedirs("outputs", exist_ok=True)
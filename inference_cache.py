@@ -0,0 +1,227 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from raw_detections import RawDetections
+from model_registry import STUB_PREFIX
+
+# -------------------------------
+# On-disk inference cache
+# -------------------------------
+# Raw per-frame detections keyed by (video content hash, frame index, model
+# weights hash, input variant) in a single SQLite file. Thresholds, NMS and
+# tracker settings are applied after the cache, so changing them reuses every
+# entry; only new weights or a different input size miss. Total size is
+# bounded with least-recently-used eviction.
+
+CACHE_PATH = os.path.join("cache", "inference.sqlite")
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+_HASH_CHUNK = 1 << 20
+
+_hash_memo = {}
+
+
+def file_hash(path):
+    """sha256 of the file contents, memoised on (path, size, mtime)."""
+    st = os.stat(path)
+    memo_key = (os.path.abspath(path), st.st_size, st.st_mtime_ns)
+    digest = _hash_memo.get(memo_key)
+    if digest is None:
+        h = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+                h.update(chunk)
+        digest = h.hexdigest()
+        _hash_memo[memo_key] = digest
+    return digest
+
+
+def model_hash(model_path):
+    """Weights hash; the stub detector ("stub:<ms>,<options>") has no file, its output depends on the options."""
+    if str(model_path).startswith(STUB_PREFIX):
+        options = str(model_path)[len(STUB_PREFIX):].split(",")[1:]
+        return ",".join(["stub"] + options)
+    return file_hash(model_path)
+
+
+def input_variant(imgsz=None, model_conf=0.25, roi=None):
+    variant = f"imgsz={imgsz or 'native'},conf={model_conf}"
+    if roi:
+        variant += ",roi=" + "_".join(str(v) for v in roi)
+    return variant
+
+
+class InferenceCache:
+    def __init__(self, path=CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS detections (
+                video_hash TEXT, model_hash TEXT, variant TEXT, frame_idx INTEGER,
+                data BLOB, size INTEGER, last_used REAL,
+                PRIMARY KEY (video_hash, model_hash, variant, frame_idx)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS detections_lru ON detections (last_used)")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS models (model_hash TEXT PRIMARY KEY, names TEXT)
+        """)
+        self._conn.commit()
+        (total,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM detections").fetchone()
+        self.total_bytes = total
+
+    def model_names(self, model_hash):
+        with self._lock:
+            row = self._conn.execute("SELECT names FROM models WHERE model_hash = ?", (model_hash,)).fetchone()
+        return None if row is None else {int(k): v for k, v in json.loads(row[0]).items()}
+
+    def put_model_names(self, model_hash, names):
+        names = dict(enumerate(names)) if isinstance(names, list) else dict(names)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO models VALUES (?, ?)",
+                               (model_hash, json.dumps({str(k): v for k, v in names.items()})))
+            self._conn.commit()
+
+    def get_many(self, video_hash, model_hash, variant, first, last):
+        """Fetch frames first..last in one query; returns {frame_idx: RawDetections}."""
+        key = (video_hash, model_hash, variant, first, last)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT frame_idx, data FROM detections WHERE video_hash = ? AND model_hash = ? "
+                "AND variant = ? AND frame_idx BETWEEN ? AND ?", key).fetchall()
+            if rows:
+                self._conn.execute(
+                    "UPDATE detections SET last_used = ? WHERE video_hash = ? AND model_hash = ? "
+                    "AND variant = ? AND frame_idx BETWEEN ? AND ?", (time.time(), *key))
+                self._conn.commit()
+        return {idx: RawDetections.from_bytes(data) for idx, data in rows}
+
+    def put_many(self, video_hash, model_hash, variant, entries):
+        """entries: iterable of (frame_idx, RawDetections)."""
+        now = time.time()
+        rows = []
+        added = 0
+        for frame_idx, raw in entries:
+            data = raw.to_bytes()
+            rows.append((video_hash, model_hash, variant, frame_idx, data, len(data) + 64, now))
+            added += len(data) + 64  # rough per-row overhead
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO detections VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+            self._conn.commit()
+            self.total_bytes += added
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Drop least recently used rows until 90% of the bound
+        target = int(self.max_bytes * 0.9)
+        (self.total_bytes,) = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM detections").fetchone()
+        while self.total_bytes > target:
+            rows = self._conn.execute(
+                "SELECT rowid, size FROM detections ORDER BY last_used LIMIT 1000").fetchall()
+            if not rows:
+                self.total_bytes = 0
+                break
+            freed = 0
+            drop = []
+            for rowid, size in rows:
+                drop.append((rowid,))
+                freed += size
+                if self.total_bytes - freed <= target:
+                    break
+            self._conn.executemany("DELETE FROM detections WHERE rowid = ?", drop)
+            self.total_bytes -= freed
+        self._conn.commit()
+        print(f"[CACHE] Evicted to {self.total_bytes / 1024 ** 2:.1f} MB")
+
+    def for_video(self, video_path, model_path, imgsz=None, model_conf=0.25, roi=None):
+        return VideoInferenceCache(self, video_path, model_path, imgsz, model_conf, roi=roi)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class VideoInferenceCache:
+    """
+    Cache view for one (video, model, input variant) run. Prefetches frames
+    in blocks, buffers writes, and counts hits/misses for the run report.
+    """
+
+    def __init__(self, cache, video_path, model_path, imgsz=None, model_conf=0.25, block=256, roi=None):
+        self.cache = cache
+        self.video_path = video_path
+        self.video_hash = file_hash(video_path)
+        self.model_hash = model_hash(model_path)
+        self.variant = input_variant(imgsz, model_conf, roi)
+        self.block = block
+        self.hits = 0
+        self.misses = 0
+        self.miss_seconds = 0.0
+        self._prefetched = {}
+        self._prefetched_until = -1
+        self._pending = []
+        self.started_at = time.time()
+
+    def names(self):
+        return self.cache.model_names(self.model_hash)
+
+    def put_names(self, names):
+        self.cache.put_model_names(self.model_hash, names)
+
+    def get(self, frame_idx):
+        if frame_idx > self._prefetched_until:
+            self._prefetched = self.cache.get_many(self.video_hash, self.model_hash, self.variant,
+                                                   frame_idx, frame_idx + self.block - 1)
+            self._prefetched_until = frame_idx + self.block - 1
+        raw = self._prefetched.pop(frame_idx, None)
+        if raw is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return raw
+
+    def put(self, frame_idx, raw, inference_seconds=0.0):
+        self.miss_seconds += inference_seconds
+        self._pending.append((frame_idx, raw))
+        if len(self._pending) >= self.block:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self.cache.put_many(self.video_hash, self.model_hash, self.variant, self._pending)
+            self._pending = []
+
+    def report(self):
+        lookups = self.hits + self.misses
+        avg_inference = self.miss_seconds / self.misses if self.misses else None
+        return {
+            "video": self.video_path,
+            "video_hash": self.video_hash,
+            "model_hash": self.model_hash,
+            "variant": self.variant,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "inference_seconds": round(self.miss_seconds, 3),
+            "estimated_seconds_saved": None if avg_inference is None else round(avg_inference * self.hits, 3),
+            "run_seconds": round(time.time() - self.started_at, 3),
+            "cache_mb": round(self.cache.total_bytes / 1024 ** 2, 2)
+        }
+
+    def write_report(self, path):
+        self.flush()
+        report = self.report()
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[CACHE] {report['hits']} hits / {report['misses']} misses "
+              f"({report['hit_rate'] * 100:.1f}%), report: {path}")
+        return report
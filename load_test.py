@@ -0,0 +1,262 @@
+import argparse
+import importlib
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# -------------------------------
+# HTTP load test for /process_packmat
+# -------------------------------
+# Serves index2.py (or index.py) in-process on a real HTTP server with the
+# camera lookup and the video log DB stubbed: every Conveyr_id maps to one of
+# the given video files as a "loop:" source (read at its own fps, looping like
+# a live camera), and the model is "stub:<ms>" unless --model is given. For
+# each step of the camera ramp it fires concurrent trigger requests at --rate
+# per second, lets the sessions run, samples /stream_health for per-camera FPS,
+# then fires the stop requests, and reports request latency, session
+# throughput, achieved FPS and the saturation point. index.py and index2.py
+# in thread mode track a single session, so only one camera can be measured.
+#
+#   python load_test.py --app index2 --mode process --cameras 1 2 4 8 --seconds 20
+#   python load_test.py --videos videos/a.mp4 videos/b.mp4 --model packmat_i2.pt
+
+_db_log = []
+_db_lock = threading.Lock()
+
+
+def _stub_save_video_log(truck_visit_id, output_path, count):
+    with _db_lock:
+        _db_log.append({"truck_visit_id": truck_visit_id, "output_path": output_path, "count": count})
+
+
+def _stub_record_camera_stream(camera_id, rtsp_url, duration=120, output_folder="videos"):
+    time.sleep(0.5)
+    return None
+
+
+def _post(base_url, path, payload, timeout=120):
+    data = json.dumps(payload).encode("utf-8")
+    req = urllib.request.Request(base_url + path, data=data, headers={"Content-Type": "application/json"})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            status, body = resp.status, json.loads(resp.read() or b"{}")
+    except urllib.error.HTTPError as e:
+        status, body = e.code, json.loads(e.read() or b"{}")
+    except Exception as e:
+        status, body = None, {"error": str(e)}
+    return status, body, (time.perf_counter() - start) * 1000
+
+
+def _get(base_url, path, timeout=30):
+    try:
+        with urllib.request.urlopen(base_url + path, timeout=timeout) as resp:
+            return json.loads(resp.read() or b"{}")
+    except Exception:
+        return {}
+
+
+def _frames_by_camera(health, mode, camera_ids):
+    """frames_read per camera from a /stream_health response."""
+    frames = {}
+    if mode == "process":
+        for camera_id, worker in (health.get("workers") or {}).items():
+            stream = worker.get("stream") or {}
+            frames[camera_id] = stream.get("frames_read", 0)
+    elif health.get("stream"):
+        frames[camera_ids[0]] = health["stream"].get("frames_read", 0)
+    return frames
+
+
+def _percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def _latency_summary(values):
+    return {
+        "n": len(values),
+        "p50_ms": _percentile(values, 50),
+        "p95_ms": _percentile(values, 95),
+        "max_ms": max(values) if values else None
+    }
+
+
+def run_step(base_url, mode, cameras, seconds, rate, sample_interval):
+    camera_ids = [str(i + 1) for i in range(cameras)]
+    trigger_latency, stop_latency = [], []
+    statuses = {}
+
+    def trigger(camera_id):
+        return _post(base_url, "/process_packmat",
+                     {"trigger": 1, "Conveyr_id": camera_id, "truck_visit_id": f"load_{camera_id}_{time.time():.0f}"})
+
+    def stop(camera_id):
+        payload = {"truck_visit_id": f"load_{camera_id}"}
+        if mode == "process":
+            payload["Conveyr_id"] = camera_id
+        return _post(base_url, "/process_packmat_end", payload)
+
+    def fire(fn, latencies, kind):
+        # Requests leave at `rate` per second; responses are awaited concurrently
+        with ThreadPoolExecutor(max_workers=max(1, len(camera_ids))) as pool:
+            futures = []
+            for camera_id in camera_ids:
+                futures.append(pool.submit(fn, camera_id))
+                if rate:
+                    time.sleep(1.0 / rate)
+            for future in futures:
+                status, body, ms = future.result()
+                latencies.append(ms)
+                key = f"{kind} {status}"
+                statuses[key] = statuses.get(key, 0) + 1
+
+    step_start = time.time()
+    fire(trigger, trigger_latency, "trigger")
+
+    # Skip the session start-up (model load, first frames) before sampling
+    time.sleep(min(3.0, seconds / 4))
+    first = _frames_by_camera(_get(base_url, "/stream_health"), mode, camera_ids)
+    first_at = time.time()
+    samples = []
+    while time.time() - first_at < seconds:
+        time.sleep(sample_interval)
+        samples.append(_frames_by_camera(_get(base_url, "/stream_health"), mode, camera_ids))
+    last = samples[-1] if samples else first
+    elapsed = time.time() - first_at
+
+    fire(stop, stop_latency, "stop")
+    step_seconds = time.time() - step_start
+
+    fps = {camera_id: (last.get(camera_id, 0) - first.get(camera_id, 0)) / elapsed
+           for camera_id in set(first) | set(last)}
+    completed = statuses.get("stop 200", 0)
+    return {
+        "cameras": cameras,
+        "trigger": _latency_summary(trigger_latency),
+        "stop": _latency_summary(stop_latency),
+        "statuses": statuses,
+        "sessions_running": len(fps),
+        "fps_per_camera": {k: round(v, 2) for k, v in sorted(fps.items())},
+        "fps_mean": round(statistics.mean(fps.values()), 2) if fps else 0.0,
+        "fps_min": round(min(fps.values()), 2) if fps else 0.0,
+        "sessions_per_min": round(completed / step_seconds * 60, 2),
+        "seconds": round(step_seconds, 1)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent trigger/stop load test with stand-in cameras")
+    parser.add_argument("--app", choices=("index", "index2"), default="index2")
+    parser.add_argument("--mode", choices=("thread", "process"), default="process",
+                        help="PACKMAT_WORKER_MODE for index2")
+    parser.add_argument("--videos", nargs="*", default=None,
+                        help="source clips (default: a generated synthetic conveyor clip)")
+    parser.add_argument("--model", default="stub:10", help="model path; stub:<ms> for the stub detector")
+    parser.add_argument("--cameras", type=int, nargs="+", default=[1, 2, 4, 8], help="cameras per ramp step")
+    parser.add_argument("--seconds", type=float, default=20.0, help="measured run time per step")
+    parser.add_argument("--rate", type=float, default=5.0, help="trigger/stop requests per second (0: all at once)")
+    parser.add_argument("--sample-interval", type=float, default=1.0)
+    parser.add_argument("--fps-ratio", type=float, default=0.9,
+                        help="a step is saturated when the slowest camera gets less than this share of source fps")
+    parser.add_argument("--record", action="store_true", help="run the real recorder instead of a stub")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--out", default="load_report.json")
+    args = parser.parse_args()
+
+    out_path = os.path.abspath(args.out)
+    videos = [os.path.abspath(v) for v in args.videos] if args.videos else None
+    workdir = tempfile.mkdtemp(prefix="packmat_load_")
+    cwd = os.getcwd()
+    os.chdir(workdir)  # videos/, outputs/, checkpoints/ of the sessions go here
+
+    if not videos:
+        from synthetic_source import SyntheticScene, write_clip
+        videos = [write_clip(os.path.join(workdir, "synthetic.mp4"), SyntheticScene(), 250, fps=25)]
+
+    import cv2
+    source_fps = {}
+    for path in videos:
+        cap = cv2.VideoCapture(path)
+        source_fps[path] = cap.get(cv2.CAP_PROP_FPS) or 25
+        cap.release()
+
+    os.environ["PACKMAT_WORKER_MODE"] = args.mode
+    os.environ["PACKMAT_MODEL"] = args.model
+    os.environ["PACKMAT_WARMUP"] = "0"  # its mysql step has nothing to connect to here
+    module = importlib.import_module(args.app)
+    module.get_rtsp_link = lambda camera_id: "loop:" + videos[(int(camera_id) - 1) % len(videos)]
+    module.save_video_log = _stub_save_video_log
+    if not args.record:
+        import video_recorder
+        video_recorder.record_camera_stream = _stub_record_camera_stream
+
+    from werkzeug.serving import make_server
+    server = make_server("127.0.0.1", args.port, module.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{args.port}"
+
+    mode = args.mode if args.app == "index2" else "thread"
+    if mode == "thread":
+        # Sessions in this process share the registry model; process workers load their own
+        from model_registry import warmup_model
+        warmup_model(args.model, "cuda" if args.app == "index2" else None)
+    slowest_source = min(source_fps.values())
+    steps = []
+    saturation = None
+    try:
+        for cameras in args.cameras:
+            print(f"[LOAD] {cameras} camera(s) for {args.seconds:.0f}s ...")
+            step = run_step(base_url, mode, cameras, args.seconds, args.rate, args.sample_interval)
+            steps.append(step)
+            ok = all(k.split()[1] == "200" for k in step["statuses"]) and \
+                step["sessions_running"] >= cameras and step["fps_min"] >= args.fps_ratio * slowest_source
+            step["sustained"] = ok
+            print(f"[LOAD] {cameras:>3} cams  trigger p50/p95 {step['trigger']['p50_ms']:.0f}/"
+                  f"{step['trigger']['p95_ms']:.0f} ms  stop p50/p95 {step['stop']['p50_ms']:.0f}/"
+                  f"{step['stop']['p95_ms']:.0f} ms  fps mean/min {step['fps_mean']:.1f}/{step['fps_min']:.1f} "
+                  f"(source {slowest_source:.0f})  {step['sessions_per_min']:.1f} sessions/min  "
+                  f"{step['statuses']}{'' if ok else '  SATURATED'}")
+            if not ok and saturation is None:
+                saturation = cameras
+            time.sleep(2.0)  # let stopped sessions release before the next step
+    finally:
+        server.shutdown()
+        pool = getattr(module, "_worker_pool", None)
+        if pool is not None:
+            pool.shutdown()
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    sustained = [s["cameras"] for s in steps if s["sustained"]]
+    report = {
+        "app": args.app,
+        "mode": mode,
+        "model": args.model,
+        "cpu_count": os.cpu_count(),
+        "source_fps": slowest_source,
+        "max_sustained_cameras": max(sustained) if sustained else 0,
+        "saturated_at": saturation,
+        "db_logs": len(_db_log),
+        "steps": steps
+    }
+    with open(out_path, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"[LOAD] capacity: {report['max_sustained_cameras']} camera(s) sustained at >= "
+          f"{args.fps_ratio:.0%} of {slowest_source:.0f} fps"
+          + (f", saturated at {saturation}" if saturation else "") + f"; report: {out_path}")
+    return 0 if steps else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
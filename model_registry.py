@@ -0,0 +1,110 @@
+import threading
+import time
+
+# -------------------------------
+# Shared YOLO models
+# -------------------------------
+# torch / ultralytics are only imported on first use so the HTTP layer can
+# start without them. Models are cached per (path, device): the background
+# warm-up loads the model once and every session reuses that instance.
+
+_models = {}
+_model_locks = {}
+_registry_lock = threading.Lock()
+
+
+# "stub:<ms>" model paths give synthetic_source.StubDetector (optionally busy
+# for <ms> per call) instead of YOLO, for load tests without weights or GPU;
+# "stub:<ms>,conf=0.7,min_area=6000" sets its confidence / smallest object
+STUB_PREFIX = "stub:"
+
+
+def resolve_device(device=None):
+    if device is not None:
+        return device
+    try:
+        import torch
+    except ImportError:
+        return "cpu"
+    return "cuda" if torch.cuda.is_available() else "cpu"
+
+
+def _load_model(model_path, device):
+    if model_path.startswith(STUB_PREFIX):
+        from synthetic_source import StubDetector
+        spec = model_path[len(STUB_PREFIX):].split(",")
+        options = {k: float(v) for k, v in (part.split("=", 1) for part in spec[1:])}
+        return StubDetector(work_ms=float(spec[0] or 0), **options)
+    from ultralytics import YOLO
+    return YOLO(model_path).to(device)
+
+
+def get_model(model_path="packmat_i2.pt", device=None):
+    device = resolve_device(device)
+    key = (model_path, str(device))
+    with _registry_lock:
+        model = _models.get(key)
+        if model is None:
+            start = time.time()
+            model = _load_model(model_path, device)
+            _models[key] = model
+            _model_locks[key] = threading.Lock()
+            print(f"[INFO] Loaded model {model_path} on {device} in {time.time() - start:.2f}s")
+    return model
+
+
+def register_model(model_path, device, model):
+    """Install an already built model (e.g. a stub detector for benchmarks) under (path, device)."""
+    key = (model_path, str(device))
+    with _registry_lock:
+        _models[key] = model
+        _model_locks.setdefault(key, threading.Lock())
+    return model
+
+
+def get_model_lock(model_path="packmat_i2.pt", device=None):
+    """Lock serialising inference on a shared model instance across sessions."""
+    key = (model_path, str(resolve_device(device)))
+    with _registry_lock:
+        return _model_locks.setdefault(key, threading.Lock())
+
+
+def auto_batch_size(imgsz=640, device=None, max_batch=16, memory_fraction=0.3):
+    """
+    Frames per batched model call that fit in `memory_fraction` of the free
+    GPU memory (system memory on CPU). Rough per-frame cost: the float32
+    input tensor times an allowance for the network's activations.
+    """
+    device = resolve_device(device)
+    per_frame = (imgsz or 640) ** 2 * 3 * 4 * 40
+    free = None
+    if str(device).startswith("cuda"):
+        try:
+            import torch
+            free, _ = torch.cuda.mem_get_info()
+        except Exception:
+            free = None
+    if free is None:
+        try:
+            with open("/proc/meminfo") as f:
+                for line in f:
+                    if line.startswith("MemAvailable:"):
+                        free = int(line.split()[1]) * 1024
+                        break
+        except OSError:
+            free = None
+    if free is None:
+        return 1
+    return max(1, min(max_batch, int(free * memory_fraction // per_frame)))
+
+
+def warmup_model(model_path="packmat_i2.pt", device=None, imgsz=640):
+    """Load the model and run one dummy inference so the first real frame is not slow."""
+    import numpy as np
+    device = resolve_device(device)
+    model = get_model(model_path, device)
+    start = time.time()
+    with get_model_lock(model_path, device):
+        model(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), imgsz=imgsz, verbose=False, device=device)
+    print(f"[INFO] Warmed model {model_path} on {device} in {(time.time() - start) * 1000:.0f} ms")
+    return model
@@ -1,196 +1,298 @@
 import cv2
 import numpy as np
 import os
-from ultralytics import YOLO
 from datetime import datetime
-import torch
 import time
-# IOU calculation
-
-def iou(b1, b2):
-    x1, y1, x2, y2 = b1
-    x1_p, y1_p, x2_p, y2_p = b2
-
-    xi1 = max(x1, x1_p)
-    yi1 = max(y1, y1_p)
-    xi2 = min(x2, x2_p)
-    yi2 = min(y2, y2_p)
-
-    inter_area = max(0, xi2 - xi1) * max(0, yi2 - yi1)
-    b1_area = (x2 - x1) * (y2 - y1)
-    b2_area = (x2_p - x1_p) * (y2_p - y1_p)
-    union_area = b1_area + b2_area - inter_area
-
-    return inter_area / union_area if union_area != 0 else 0
-
-# NMS
-def apply_nms(detections, iou_thresh=0.5):
-    filtered = []
-    detections.sort(key=lambda x: x[2], reverse=True)
-    while detections:
-        best = detections.pop(0)
-        filtered.append(best)
-        detections = [d for d in detections if d[1] != best[1] or iou(d[0], best[0]) < iou_thresh]
-    return filtered
-
-# Tracker
-class ObjectTracker:
-    def __init__(self, iou_threshold=0.3, max_missed=5):
-        self.tracks = {}
-        self.iou_threshold = iou_threshold
-        self.max_missed = max_missed
-        self.next_id = 0
-        self.counted_ids = set()
-
-    def update_tracks(self, detections, line_y, counter):
-        updated_tracks = {}
-        used_ids = set()
-
-        for bbox, label, conf in detections:
-            best_iou = 0
-            best_id = None
-            for obj_id, data in self.tracks.items():
-                current_iou = iou(bbox, data['bbox'])
-                if current_iou > best_iou and current_iou > self.iou_threshold and obj_id not in used_ids:
-                    best_iou = current_iou
-                    best_id = obj_id
-
-            cy = (bbox[1] + bbox[3]) // 2  # object center Y
-
-            print(f"[TRACKING] Object center Y: {cy}, Line Y: {line_y}")
-
-            if best_id is not None:
-                updated_tracks[best_id] = {
-                    'bbox': bbox,
-                    'label': label,
-                    'conf': conf,
-                    'last_y': cy,
-                    'missed': 0
-                }
-
-                if best_id not in self.counted_ids:
-                    last_y = self.tracks[best_id]['last_y']
-                    if last_y < line_y and cy >= line_y:
-                        counter += 1
-                        self.counted_ids.add(best_id)
-
-                used_ids.add(best_id)
-            else:
-                updated_tracks[self.next_id] = {
-                    'bbox': bbox,
-                    'label': label,
-                    'conf': conf,
-                    'last_y': cy,
-                    'missed': 0
-                }
-                self.next_id += 1
-
-        for obj_id, data in self.tracks.items():
-            if obj_id not in used_ids:
-                data['missed'] += 1
-                if data['missed'] < self.max_missed:
-                    updated_tracks[obj_id] = data
-
-        self.tracks = updated_tracks
-        return counter
+from model_registry import get_model, get_model_lock, resolve_device, auto_batch_size
+from tracking import apply_nms, ObjectTracker
+from counting_zones import ZoneCounter, zones_from_config, draw_zones
+from camera_config import load_camera_config
+from raw_detections import select_detections, run_detector_batch, roi_pixels, CONF_THRESHOLD, NMS_IOU_THRESHOLD
+from event_clips import EventClipWriter
+from event_store import EventSink
+from qos_controller import QosController, FrameClock
+from cascade import CascadeDetector
+from synthetic_source import is_loop_source, LoopingFileCapture
 
 # Video Processor
 class VideoProcessor:
-    def __init__(self, video_path, model_path=r"packmat_i2.pt", camera_id=0):
-        self.cap = cv2.VideoCapture(video_path)
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+    def __init__(self, video_path, model_path=r"packmat_i2.pt", camera_id=0, inference_cache=None,
+                 output_mode=None, batch_size=None, truck_visit_id=None):
+        if is_loop_source(video_path):
+            self.cap = LoopingFileCapture(video_path)  # local file standing in for a camera
+        else:
+            self.cap = cv2.VideoCapture(video_path)
+        self.device = resolve_device()
         print(f"[INFO] Using device: {self.device}")
 
-        self.model = YOLO(model_path).to(self.device)
+        self.model_path = model_path
+        self.model_lock = get_model_lock(model_path, self.device)
+        self._model = None
         self.camera_id = camera_id
 
         self.frame_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         self.frame_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30
 
-        # Set line dynamically at 75% of frame height
-        self.line_y = int(self.frame_height * 0.75)
-        self.line_start = (0, self.line_y)
-        self.line_end = (self.frame_width, self.line_y)
+        # Counting zones come from camera_config.json; without an entry the
+        # line sits at 75% of frame height as before
+        self.camera_config = load_camera_config(camera_id)
+        self.zones = zones_from_config(self.camera_config.get("zones"), self.frame_width, self.frame_height)
+        self.zone_counter = ZoneCounter(self.zones)
 
-        print(f"[INFO] Frame size: {self.frame_width}x{self.frame_height}, Line Y: {self.line_y}")
+        print(f"[INFO] Frame size: {self.frame_width}x{self.frame_height}, Zones: {[z.name for z in self.zones]}")
 
-        self.counter = 0
-        self.tracker = ObjectTracker()
+        # Post-processing / tracker settings, tunable per camera (see sweep_counts.py)
+        self.conf_thresh = self.camera_config.get("conf_thresh", CONF_THRESHOLD)
+        self.nms_iou = self.camera_config.get("nms_iou", NMS_IOU_THRESHOLD)
 
-        # Output video writer
-        os.makedirs("outputs", exist_ok=True)
+        self.counter = 0
+        self.tracker = ObjectTracker(iou_threshold=self.camera_config.get("tracker_iou", 0.3),
+                                     max_missed=self.camera_config.get("max_missed", 5))
+
+        # Model input size (None: model default) and conveyor ROI, tunable per
+        # camera (see resolution_tuner.py)
+        self.imgsz = self.camera_config.get("imgsz")
+        self.roi_px = roi_pixels(self.camera_config.get("roi"), self.frame_width, self.frame_height)
+
+        # Frames per model call: 1 (default) keeps per-frame latency, more
+        # trades it for throughput on recorded files; "auto" sizes it to memory.
+        # Live sources go frame by frame and batch only to catch up (default 4)
+        self.live = not os.path.isfile(str(video_path))
+        batch_size = batch_size or self.camera_config.get("batch_size", 4 if self.live else 1)
+        if batch_size == "auto":
+            batch_size = auto_batch_size(self.imgsz or 640, self.device)
+            print(f"[INFO] Batch size {batch_size} (auto)")
+        self.batch_size = max(1, int(batch_size))
+
+        # Light detector on every frame, this model only near the zones or on
+        # ambiguous boxes; it needs the tracks of the previous frame, so frames
+        # go one at a time and bypass the inference cache
+        self.cascade = CascadeDetector.from_config(self.camera_config.get("cascade"), self.zones,
+                                                   (self.frame_width, self.frame_height), self.device)
+        self.cascade_report = None
+        if self.cascade:
+            self.batch_size = 1
+
+        # Recorded files can take raw detections from the inference cache; the
+        # model is then only loaded if some frame misses
+        self.frame_cache = None
+        self.cache_report = None
+        self.names = None
+        if inference_cache is not None and not self.cascade and os.path.isfile(str(video_path)):
+            self.frame_cache = inference_cache.for_video(video_path, model_path, imgsz=self.imgsz,
+                                                         roi=self.roi_px)
+            self.names = self.frame_cache.names()
+        if self.names is None:
+            self.names = self.model.names
+            if self.frame_cache:
+                self.frame_cache.put_names(self.names)
+
+        # Output: full annotated video ("video") or per-crossing clips ("clips")
+        self.output_mode = output_mode or self.camera_config.get("output_mode", "video")
         timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        output_filename = f"cam_{self.camera_id}_{timestamp}_output.mp4"
-        self.output_path = os.path.join("outputs", output_filename)
-        fourcc = cv2.VideoWriter_fourcc(*"mp4v")
-        self.out = cv2.VideoWriter(self.output_path, fourcc, self.fps, (self.frame_width, self.frame_height))
+        self.out = None
+        self.clip_writer = None
+        if self.output_mode == "clips":
+            self.clip_writer = EventClipWriter(
+                self.camera_id, truck_visit_id if truck_visit_id is not None else timestamp, self.fps,
+                (self.frame_width, self.frame_height),
+                pre_seconds=self.camera_config.get("clip_pre_seconds", 3.0),
+                post_seconds=self.camera_config.get("clip_post_seconds", 3.0))
+            self.output_path = self.clip_writer.dir
+        else:
+            os.makedirs("outputs", exist_ok=True)
+            output_filename = f"cam_{self.camera_id}_{timestamp}_output.mp4"
+            self.output_path = os.path.join("outputs", output_filename)
+            fourcc = cv2.VideoWriter_fourcc(*"mp4v")
+            self.out = cv2.VideoWriter(self.output_path, fourcc, self.fps, (self.frame_width, self.frame_height))
+        # Crossings of a truck visit go to the local event store
+        self.event_sink = EventSink(self.camera_id, truck_visit_id) if truck_visit_id is not None else None
+
+        # Live sources hold a lag budget by degrading stride / input size /
+        # overlay / model (see qos_controller.py); recorded files run in full
+        self.frame_skip = 1
+        self.annotate = True
+        self.qos = None
+        if self.live:
+            self.qos = QosController.from_config(self.camera_id, self.camera_config.get("qos"))
+        self.qos_base = {"frame_skip": self.frame_skip, "imgsz": self.imgsz, "annotate": True, "model": model_path}
+        self.clock = FrameClock(self.cap, self.fps)
+        self.frames_read = 0
+        self._released = False
+
+    @property
+    def model(self):
+        # Shared, already warmed instance when the service warm-up has run
+        if self._model is None:
+            self._model = get_model(self.model_path, self.device)
+        return self._model
+
+    def stream_health(self):
+        health = self.cap.health() if hasattr(self.cap, "health") else {"state": "streaming"}
+        health["frames_read"] = self.frames_read
+        if self.qos:
+            health["qos"] = self.qos.status()
+        return health
 
     def process_video(self, stop_flag=None):
         if not self.cap.isOpened():
             raise ValueError("Error: Could not open video stream.")
 
-        while True:
+        # Capture, writer and model references are released even if a frame fails
+        try:
+            self._process_frames(stop_flag)
+        finally:
+            self.cleanup()
+        return self.counter
+
+    def _process_frames(self, stop_flag):
+        frame_idx = -1
+        ended = False
+        while not ended:
             
             if stop_flag and stop_flag():
                 print("processing stopped by the user")
                 break
             
-            ret, frame = self.cap.read()
-            if not ret:
-                print("Stream ended or interrupted.")
-                break
-
-            #results = self.model(frame, conf=0.25)[0]
-            
-            start_time = time.time()
-            results = self.model(frame, conf=0.25, verbose=False, device=self.device)[0]
-            detections = []
-            inference_time = (time.time() - start_time) * 1000
+            # Up to batch_size consecutive frames per model call (1: frame by
+            # frame). A live frame that is already several frame intervals old
+            # means the next ones are waiting in the capture buffer: take them
+            # too, up to batch_size inference frames, to catch up
+            batch = []
+            target = 1 if self.live else self.batch_size
+            while len(batch) < target:
+                ret, frame = self.cap.read()
+                if not ret:
+                    print("Stream ended or interrupted.")
+                    ended = True
+                    break
+                frame_idx += 1
+                self.frames_read += 1
+                batch.append((frame_idx, frame) + (self.clock.on_read() if self.live else (None, 0)))
+                if self.live and len(batch) == 1 and self.batch_size > 1:
+                    behind = int((time.time() - batch[0][2]) / self.clock.frame_interval)
+                    target = 1 + min(behind, self.batch_size * self.frame_skip - 1)
+
+            # Results go to the tracker strictly in frame order; frames off the
+            # inference stride only advance the tracker
+            infer = [(idx, frame) for idx, frame, _, _ in batch if idx % self.frame_skip == 0]
+            raws = dict(zip([idx for idx, _ in infer], self._detect(infer))) if infer and not self.cascade else {}
+            for idx, frame, captured_at, dropped in batch:
+                if self.cascade and idx % self.frame_skip == 0:
+                    detections = self.cascade.detect(frame, self.tracker.tracks, self.model, self.names,
+                                                     self.conf_thresh, self.imgsz, self.roi_px,
+                                                     full_lock=self.model_lock, conf=0.25, verbose=False,
+                                                     device=self.device)
+                else:
+                    detections = self._select(raws.get(idx))
+                self._handle_frame(idx, frame, detections)
+                if self.qos and self.qos.observe((time.time() - captured_at) * 1000, dropped):
+                    self._apply_qos_level()
+
+    def _detect(self, batch):
+        """Raw detections for [(frame_idx, frame)]: cached ones, the rest in one model call."""
+        raws = [self.frame_cache.get(idx) if self.frame_cache else None for idx, _ in batch]
+        missing = [i for i, raw in enumerate(raws) if raw is None]
+        if not missing:
+            return raws
+
+        #results = self.model(frame, conf=0.25)[0]
+
+        start_time = time.time()
+        outputs = run_detector_batch(self.model, [batch[i][1] for i in missing], self.imgsz, self.roi_px,
+                                     lock=self.model_lock, conf=0.25, verbose=False, device=self.device)
+        inference_time = (time.time() - start_time) * 1000
+        if len(missing) == 1:
             print(f"[GPU] Inference time: {inference_time:.2f} ms | Updated Counter: {self.counter}")
-
-
-            for box in results.boxes:
-                cls_id = int(box.cls[0])
-                label = self.model.names[cls_id]
-                conf = float(box.conf[0])
-                if label.lower() in ["jerrycan_bundle", "carton", "carton_brown"] and conf > 0.6:
-                    x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    detections.append(((x1, y1, x2, y2), label, conf))
-
-            detections = apply_nms(detections, iou_thresh=0.5)
-
-            #Draw counting line
-            cv2.line(frame, self.line_start, self.line_end, (0, 0, 255), 2)
-            #cv2.putText(frame, "COUNTING LINE", (self.line_start[0] + 10, self.line_y - 10),
-                        #cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 255), 2)
-
-            self.counter = self.tracker.update_tracks(detections, self.line_y, self.counter)
-
-            for obj_id, data in self.tracker.tracks.items():
-                x1, y1, x2, y2 = data['bbox']
-                label = data['label']
-                conf = data['conf']
-                color = (0, 255, 0) if label == "jerrycan_bundle" else (255, 255, 0)
-                label_text = f"{label} {conf:.2f}"
-
-                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 3)
-                cv2.putText(frame, label_text, (x1, y1 - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
-
-            # Smaller counter display
-            cv2.putText(frame, f"Counter: {self.counter}", (20, 40),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 255), 2)
-
+        else:
+            print(f"[GPU] Batch of {len(missing)}: {inference_time:.2f} ms "
+                  f"({inference_time / len(missing):.2f} ms/frame) | Updated Counter: {self.counter}")
+        for i, (raw, _, _) in zip(missing, outputs):
+            raws[i] = raw
+            if self.frame_cache:
+                self.frame_cache.put(batch[i][0], raw, inference_time / 1000 / len(missing))
+        return raws
+
+    def _select(self, raw):
+        if raw is None:
+            return []
+        offset = self.roi_px[:2] if self.roi_px else None
+        return select_detections(raw, self.names, self.conf_thresh, offset=offset)
+
+    def _handle_frame(self, frame_idx, frame, detections):
+        detections = apply_nms(detections, iou_thresh=self.nms_iou)
+
+        self.tracker.update_tracks(detections)
+        events = self.zone_counter.update(self.tracker.tracks)
+        self.counter = self.zone_counter.total
+        if self.event_sink:
+            self.event_sink.record(events)
+
+        if self.annotate:
+            self._draw(frame)
+
+        if self.clip_writer:
+            self.clip_writer.push(frame, frame_idx, events)
+        else:
             self.out.write(frame)
 
-        self.cleanup()
-        return self.counter
+    def _draw(self, frame):
+        #Draw counting zones
+        draw_zones(frame, self.zones, self.zone_counter)
+
+        for obj_id, data in self.tracker.tracks.items():
+            x1, y1, x2, y2 = data['bbox']
+            label = data['label']
+            conf = data['conf']
+            color = (0, 255, 0) if label == "jerrycan_bundle" else (255, 255, 0)
+            label_text = f"{label} {conf:.2f}"
+
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 3)
+            cv2.putText(frame, label_text, (x1, y1 - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+
+        # Smaller counter display
+        cv2.putText(frame, f"Counter: {self.counter}", (20, 40),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 255), 2)
+
+    def _apply_qos_level(self):
+        settings = self.qos.settings(self.qos_base)
+        self.frame_skip = max(1, int(settings["frame_skip"]))
+        self.imgsz = settings["imgsz"]
+        self.annotate = settings["annotate"]
+        if settings["model"] != self.model_path:
+            try:
+                model = get_model(settings["model"], self.device)
+            except Exception as e:
+                print(f"[QOS] Camera {self.camera_id}: could not load {settings['model']}, keeping "
+                      f"{self.model_path}: {e}")
+                return
+            self._model = model
+            self.model_lock = get_model_lock(settings["model"], self.device)
+            self.model_path = settings["model"]
+            self.names = model.names
 
     def cleanup(self):
+        if self._released:
+            return
+        self._released = True
+        if self.frame_cache:
+            self.cache_report = self.frame_cache.write_report(os.path.splitext(self.output_path)[0] + "_cache.json")
+            self.frame_cache = None
+        if self.event_sink:
+            self.event_sink.close()
+        if self.cascade:
+            self.cascade_report = self.cascade.report()
+            print(f"[CASCADE] Camera {self.camera_id}: {self.cascade_report}")
+            self.cascade.light_model = None
         self.cap.release()
-        self.out.release()
-        cv2.destroyAllWindows()
+        if self.clip_writer:
+            self.clip_writer.close()
+        else:
+            self.out.release()
+        self.out = None
+        self._model = None  # the registry keeps the shared instance
         print("video closed successfully")
 
 # # Main runner
@@ -2,205 +2,271 @@ import cv2
 import numpy as np
 import os
 import time
-from ultralytics import YOLO
+from model_registry import get_model, get_model_lock
 from datetime import datetime
 from gStreamer import get_gst_pipeline
-
-# -------------------------------
-# IOU Calculation
-# -------------------------------
-def iou(b1, b2):
-    x1, y1, x2, y2 = b1
-    x1p, y1p, x2p, y2p = b2
-    xi1, yi1 = max(x1, x1p), max(y1, y1p)
-    xi2, yi2 = min(x2, x2p), min(y2, y2p)
-    inter_area = max(0, xi2 - xi1) * max(0, yi2 - yi1)
-    b1_area = (x2 - x1) * (y2 - y1)
-    b2_area = (x2p - x1p) * (y2p - y1p)
-    union_area = b1_area + b2_area - inter_area
-    return inter_area / union_area if union_area > 0 else 0
-
-# -------------------------------
-# NMS
-# -------------------------------
-def apply_nms(detections, iou_thresh=0.5):
-    filtered = []
-    detections.sort(key=lambda x: x[2], reverse=True)
-    while detections:
-        best = detections.pop(0)
-        filtered.append(best)
-        detections = [
-            d for d in detections
-            if d[1] != best[1] or iou(d[0], best[0]) < iou_thresh
-        ]
-    return filtered
-
-# -------------------------------
-# Simple Tracker
-# -------------------------------
-class ObjectTracker:
-    def __init__(self, iou_threshold=0.3, max_missed=5):
-        self.tracks = {}
-        self.iou_threshold = iou_threshold
-        self.max_missed = max_missed
-        self.next_id = 0
-        self.counted_ids = set()
-
-    def update_tracks(self, detections, line_y, counter):
-        updated_tracks = {}
-        used_ids = set()
-
-        for bbox, label, conf in detections:
-            best_iou = 0
-            best_id = None
-            for obj_id, data in self.tracks.items():
-                current_iou = iou(bbox, data['bbox'])
-                if (current_iou > best_iou and current_iou > self.iou_threshold and obj_id not in used_ids):
-                    best_iou = current_iou
-                    best_id = obj_id
-
-            cy = (bbox[1] + bbox[3]) // 2
-
-            if best_id is not None:
-                updated_tracks[best_id] = {
-                    'bbox': bbox, 'label': label, 'conf': conf,
-                    'last_y': cy, 'missed': 0
-                }
-                if best_id not in self.counted_ids:
-                    last_y = self.tracks[best_id]['last_y']
-                    if last_y < line_y and cy >= line_y:
-                        counter += 1
-                        self.counted_ids.add(best_id)
-                        print(f"[COUNTED] ID {best_id} crossed. Count={counter}")
-                used_ids.add(best_id)
-            else:
-                updated_tracks[self.next_id] = {
-                    'bbox': bbox, 'label': label, 'conf': conf,
-                    'last_y': cy, 'missed': 0
-                }
-                self.next_id += 1
-
-        for obj_id, data in self.tracks.items():
-            if obj_id not in used_ids:
-                data['missed'] += 1
-                if data['missed'] < self.max_missed:
-                    updated_tracks[obj_id] = data
-
-        self.tracks = updated_tracks
-        return counter
+from tracking import apply_nms, ObjectTracker
+from counting_zones import ZoneCounter, zones_from_config, draw_zones
+from camera_config import load_camera_config
+from stream_supervisor import StreamSupervisor
+from session_checkpoint import SessionCheckpointer
+from raw_detections import select_detections, run_detector_batch, roi_pixels, CONF_THRESHOLD, NMS_IOU_THRESHOLD
+from event_clips import EventClipWriter
+from event_store import EventSink
+from qos_controller import QosController, FrameClock
+from cascade import CascadeDetector
+from synthetic_source import is_loop_source, LoopingFileCapture
 
 # -------------------------------
 # Main Processor
 # -------------------------------
 class VideoProcessor:
-    def __init__(self, rtsp_url, model_path="packmat_i2.pt", camera_id=0):
-        self.gst_pipeline = get_gst_pipeline(
-            rtsp_url=rtsp_url, drop_frames=True, latency=0
-        )
-        self.cap = cv2.VideoCapture(self.gst_pipeline, cv2.CAP_GSTREAMER)
-        if not self.cap.isOpened():
-            raise RuntimeError("[ERROR] Could not open RTSP stream")
-
-        self.model = YOLO(model_path).to("cuda")
+    def __init__(self, rtsp_url, model_path="packmat_i2.pt", camera_id=0, session_id=None, capture=None,
+                 output_mode=None):
+        if capture is not None:
+            # Frames come from elsewhere, e.g. a RingCapture fed by a capture process
+            self.gst_pipeline = None
+            self.cap = capture
+        else:
+            # The pipeline string is built once; the supervisor only reopens
+            # the capture from it on reconnect
+            self.gst_pipeline = get_gst_pipeline(
+                rtsp_url=rtsp_url, drop_frames=True, latency=0
+            )
+            if is_loop_source(rtsp_url):
+                # Local file standing in for a camera (load tests)
+                open_capture = lambda: LoopingFileCapture(rtsp_url)
+            else:
+                open_capture = lambda: cv2.VideoCapture(self.gst_pipeline, cv2.CAP_GSTREAMER)
+            self.cap = StreamSupervisor(open_capture, camera_id=camera_id)
+            if not self.cap.open():
+                raise RuntimeError("[ERROR] Could not open RTSP stream")
+
+        self.model_path = model_path
+        self.model = get_model(model_path, "cuda")
+        self.model_lock = get_model_lock(model_path, "cuda")
         self.camera_id = camera_id
         self.frame_width = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         self.frame_height = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30
 
-        self.line_y = int(self.frame_height * 0.75)
-        self.line_start = (0, self.line_y)
-        self.line_end = (self.frame_width, self.line_y)
+        self.camera_config = load_camera_config(camera_id)
+        self.zones = zones_from_config(self.camera_config.get("zones"), self.frame_width, self.frame_height)
+        self.zone_counter = ZoneCounter(self.zones)
 
         print(f"[INFO] Camera {camera_id} - {self.frame_width}x{self.frame_height} @ {self.fps}fps")
 
+        # Post-processing / tracker settings, tunable per camera (see sweep_counts.py)
+        self.conf_thresh = self.camera_config.get("conf_thresh", CONF_THRESHOLD)
+        self.nms_iou = self.camera_config.get("nms_iou", NMS_IOU_THRESHOLD)
+
+        # Model input size and conveyor ROI, tunable per camera (see resolution_tuner.py)
+        self.imgsz = self.camera_config.get("imgsz") or 640
+        self.roi_px = roi_pixels(self.camera_config.get("roi"), self.frame_width, self.frame_height)
+
+        # Most frames per catch-up batch when a buffered source falls behind
+        self.batch_size = max(1, int(self.camera_config.get("batch_size", 4)))
+
         self.counter = 0
-        self.tracker = ObjectTracker()
+        self.tracker = ObjectTracker(iou_threshold=self.camera_config.get("tracker_iou", 0.3),
+                                     max_missed=self.camera_config.get("max_missed", 5))
+
+        # With a session id (truck visit) the count survives worker restarts
+        self.checkpointer = None
+        if session_id is not None:
+            self.checkpointer = SessionCheckpointer(camera_id, session_id)
+            self.checkpointer.restore(self)
 
-        os.makedirs("outputs", exist_ok=True)
+        # Every crossing of a truck visit goes to the local event store
+        self.event_sink = EventSink(camera_id, session_id) if session_id is not None else None
+
+        # Output: full annotated video ("video") or per-crossing clips ("clips")
+        self.output_mode = output_mode or self.camera_config.get("output_mode", "video")
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_filename = f"cam_{camera_id}_{timestamp}_annotated.avi"
-        self.output_path = os.path.join("outputs", output_filename)
-        fourcc = cv2.VideoWriter_fourcc(*"XVID")
-        self.out = cv2.VideoWriter(self.output_path, fourcc, self.fps,
-                                   (self.frame_width, self.frame_height))
+        self.out = None
+        self.clip_writer = None
+        if self.output_mode == "clips":
+            self.clip_writer = EventClipWriter(
+                camera_id, session_id if session_id is not None else timestamp, self.fps,
+                (self.frame_width, self.frame_height),
+                pre_seconds=self.camera_config.get("clip_pre_seconds", 3.0),
+                post_seconds=self.camera_config.get("clip_post_seconds", 3.0))
+            self.output_path = self.clip_writer.dir
+        else:
+            os.makedirs("outputs", exist_ok=True)
+            output_filename = f"cam_{camera_id}_{timestamp}_annotated.avi"
+            self.output_path = os.path.join("outputs", output_filename)
+            fourcc = cv2.VideoWriter_fourcc(*"XVID")
+            self.out = cv2.VideoWriter(self.output_path, fourcc, self.fps,
+                                       (self.frame_width, self.frame_height))
+        self._released = False
+
+        # Lag budget: degrade stride / input size / overlay / model under
+        # overload, recover when load drops (see qos_controller.py)
+        self.frame_skip = 2
+        self.annotate = True
+        self.qos = QosController.from_config(camera_id, self.camera_config.get("qos"))
+        self.qos_base = {"frame_skip": self.frame_skip, "imgsz": self.imgsz, "annotate": True, "model": model_path}
+        self.clock = FrameClock(self.cap, self.fps)
+
+        # Light detector on every inference frame, this model only near the
+        # zones or on ambiguous boxes; it needs the previous frame's tracks, so
+        # there is no catch-up batching
+        self.cascade = CascadeDetector.from_config(self.camera_config.get("cascade"), self.zones,
+                                                   (self.frame_width, self.frame_height), "cuda")
+        self.cascade_report = None
+        if self.cascade:
+            self.batch_size = 1
 
         self._stop_flag = False
+        self._ended = False  # the source ended (file / closed ring) without a failure
 
     def stop(self):
         self._stop_flag = True
+        self.cap.stop()
 
-    def _reconnect(self):
-        print(f"[WARN] Reconnecting to camera {self.camera_id}...")
-        self.cap.release()
-        time.sleep(1)
-        self.cap = cv2.VideoCapture(self.gst_pipeline, cv2.CAP_GSTREAMER)
-        if self.cap.isOpened():
-            print(f"[INFO] Reconnected to camera {self.camera_id}")
-        else:
-            print(f"[ERROR] Failed to reconnect to camera {self.camera_id}")
+    def stream_health(self):
+        health = self.cap.health()
+        if self.qos:
+            health["qos"] = self.qos.status()
+        return health
 
     def process_video(self):
-        frame_skip = 2
-        frame_count = 0
+        # Capture, writer and model references are released even if a frame
+        # fails; the checkpoint is kept then so a restart can resume
+        try:
+            self._process_frames()
+            self._ended = True
+        finally:
+            self.cleanup()
+        return self.counter
+
+    def _process_frames(self):
+        self.frame_count = 0
 
         while not self._stop_flag:
+            # Blocks through reconnects; only fails once stopped
             ret, frame = self.cap.read()
             if not ret:
-                self._reconnect()
-                continue
-
-            detections = []
-
-            if frame_count % frame_skip == 0:
-                orig_h, orig_w = frame.shape[:2]
-                resized_frame = cv2.resize(frame, (640, 640))
-
+                break
+            frames = [(frame,) + self.clock.on_read()]
+
+            # Behind a buffered source (ring): take the frames already waiting
+            # too and run their inference frames as one batch to catch up
+            backlog = self.cap.backlog() if self.batch_size > 1 and hasattr(self.cap, "backlog") else 0
+            for _ in range(min(backlog, self.batch_size * self.frame_skip - 1)):
+                ret, frame = self.cap.read()
+                if not ret:
+                    break
+                frames.append((frame,) + self.clock.on_read())
+
+            infer = [i for i in range(len(frames)) if (self.frame_count + i) % self.frame_skip == 0]
+            outputs = {}
+            if infer and not self.cascade:
                 # Debug timing start
                 start_time = time.time()
-                results = self.model(resized_frame, conf=0.25, imgsz=640, device=0)[0]
+                results = run_detector_batch(self.model, [frames[i][0] for i in infer], self.imgsz, self.roi_px,
+                                             resize=True, lock=self.model_lock, conf=0.25, device=0)
                 inf_time_ms = (time.time() - start_time) * 1000
-                print(f"[{self.camera_id}] Inference time: {inf_time_ms:.2f} ms, "
-                      f"Detections: {len(results.boxes)}")
-
-                for box in results.boxes:
-                    cls_id = int(box.cls[0])
-                    label = self.model.names[cls_id]
-                    conf = float(box.conf[0])
-
-                    if label.lower() in ["jerrycan_bundle", "carton", "carton_brown"] and conf > 0.6:
-                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-                        scale_x, scale_y = orig_w / 640, orig_h / 640
-                        x1, x2 = int(x1 * scale_x), int(x2 * scale_x)
-                        y1, y2 = int(y1 * scale_y), int(y2 * scale_y)
-                        detections.append(((x1, y1, x2, y2), label, conf))
-
-                detections = apply_nms(detections, iou_thresh=0.5)
-
-            # Draw counting line
-            cv2.line(frame, self.line_start, self.line_end, (0, 0, 255), 2)
-
-            # Update tracks & counter
-            self.counter = self.tracker.update_tracks(detections, self.line_y, self.counter)
-
-            # Draw tracked objects
-            for obj_id, data in self.tracker.tracks.items():
-                x1, y1, x2, y2 = data['bbox']
-                label, conf = data['label'], data['conf']
-                color = (0, 255, 0) if label == "jerrycan_bundle" else (255, 255, 0)
-                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 3)
-                cv2.putText(frame, f"{label} {conf:.2f}", (x1, y1 - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
-
-            cv2.putText(frame, f"Counter: {self.counter}", (20, 40),
-                        cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 255), 2)
-
+                if len(infer) == 1:
+                    print(f"[{self.camera_id}] Inference time: {inf_time_ms:.2f} ms, "
+                          f"Detections: {len(results[0][0])}")
+                else:
+                    print(f"[{self.camera_id}] Catch-up batch of {len(infer)}: {inf_time_ms:.2f} ms "
+                          f"({backlog} frames behind)")
+                outputs = dict(zip(infer, results))
+
+            # Tracker and zones see every frame in order
+            for i, (frame, captured_at, dropped) in enumerate(frames):
+                if self.cascade and i in infer:
+                    detections = self.cascade.detect(frame, self.tracker.tracks, self.model, self.model.names,
+                                                     self.conf_thresh, self.imgsz, self.roi_px, resize=True,
+                                                     full_lock=self.model_lock, conf=0.25, device=0)
+                else:
+                    detections = self._select(outputs.get(i))
+                self._handle_frame(frame, detections)
+                if self.qos and self.qos.observe((time.time() - captured_at) * 1000, dropped):
+                    self._apply_qos_level()
+                if self.checkpointer:
+                    self.checkpointer.maybe_save(self)
+
+    def _select(self, output):
+        if output is None:
+            return []
+        raw, scale, offset = output
+        return select_detections(raw, self.model.names, self.conf_thresh, scale=scale, offset=offset)
+
+    def _handle_frame(self, frame, detections):
+        detections = apply_nms(detections, iou_thresh=self.nms_iou)
+
+        # Update tracks & per-zone counters
+        self.tracker.update_tracks(detections)
+        events = self.zone_counter.update(self.tracker.tracks)
+        self.counter = self.zone_counter.total
+        if self.event_sink:
+            self.event_sink.record(events)
+
+        if self.annotate:
+            self._draw(frame)
+
+        if self.clip_writer:
+            self.clip_writer.push(frame, self.frame_count, events)
+        else:
             self.out.write(frame)
-            frame_count += 1
-
-        self.cleanup()
-        return self.counter
+        self.frame_count += 1
+
+    def _draw(self, frame):
+        # Draw counting zones
+        draw_zones(frame, self.zones, self.zone_counter)
+
+        # Draw tracked objects
+        for obj_id, data in self.tracker.tracks.items():
+            x1, y1, x2, y2 = data['bbox']
+            label, conf = data['label'], data['conf']
+            color = (0, 255, 0) if label == "jerrycan_bundle" else (255, 255, 0)
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 3)
+            cv2.putText(frame, f"{label} {conf:.2f}", (x1, y1 - 10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.8, color, 2)
+
+        cv2.putText(frame, f"Counter: {self.counter}", (20, 40),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0, 0, 255), 2)
+
+    def _apply_qos_level(self):
+        settings = self.qos.settings(self.qos_base)
+        self.frame_skip = max(1, int(settings["frame_skip"]))
+        self.imgsz = settings["imgsz"]
+        self.annotate = settings["annotate"]
+        if settings["model"] != self.model_path:
+            try:
+                model = get_model(settings["model"], "cuda")
+            except Exception as e:
+                print(f"[QOS] Camera {self.camera_id}: could not load {settings['model']}, keeping "
+                      f"{self.model_path}: {e}")
+                return
+            self.model = model
+            self.model_lock = get_model_lock(settings["model"], "cuda")
+            self.model_path = settings["model"]
 
     def cleanup(self):
+        if self._released:
+            return
+        self._released = True
+        if self.checkpointer:
+            # A stopped or ended session is final; a failed one keeps its checkpoint
+            if self._stop_flag or self._ended:
+                self.checkpointer.discard()
+            else:
+                self.checkpointer.save(self)
+        if self.event_sink:
+            self.event_sink.close()
+        if self.cascade:
+            self.cascade_report = self.cascade.report()
+            print(f"[CASCADE] Camera {self.camera_id}: {self.cascade_report}")
+            self.cascade.light_model = None
         self.cap.release()
-        self.out.release()
-        cv2.destroyAllWindows()
+        if self.clip_writer:
+            self.clip_writer.close()
+        else:
+            self.out.release()
+        self.out = None
+        self.model = None  # the registry keeps the shared instance
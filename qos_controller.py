@@ -0,0 +1,166 @@
+import time
+from collections import deque
+
+# -------------------------------
+# Real-time QoS controller
+# -------------------------------
+# Live sessions measure, per processed frame, the lag from capture to the
+# count decision (zone update) and the frames the source dropped meanwhile.
+# When the p95 lag of a window exceeds the budget, or too many frames were
+# dropped, the controller steps to the next degradation level; when the lag
+# stays well under budget for hold_seconds it steps back. A level lists the
+# settings it overrides on the processor's own ones:
+#
+#   frame_skip  run the detector on every n-th frame (tracker coasts between)
+#   imgsz       detector input size
+#   annotate    false: write frames without boxes / zones / counter overlay
+#   model       path of a lighter detector
+#
+# Configured per camera in camera_config.json, e.g.
+#   "qos": {"budget_ms": 800, "light_model": "packmat_n.pt"}
+#   "qos": {"budget_ms": 800, "levels": [{"name": "stride3", "frame_skip": 3}, ...]}
+
+DEFAULT_BUDGET_MS = 1000
+DEFAULT_LEVELS = (
+    {"name": "stride3", "frame_skip": 3},
+    {"name": "stride3_imgsz480", "frame_skip": 3, "imgsz": 480},
+    {"name": "stride4_imgsz416_plain", "frame_skip": 4, "imgsz": 416, "annotate": False},
+)
+MAX_HISTORY = 50
+
+
+class QosController:
+    def __init__(self, camera_id, budget_ms=DEFAULT_BUDGET_MS, levels=DEFAULT_LEVELS, window=50,
+                 min_samples=20, recover_fraction=0.5, hold_seconds=10.0, drop_ratio=0.1):
+        self.camera_id = camera_id
+        self.budget_ms = budget_ms
+        # Level 0 is the processor's own configuration
+        self.levels = [{"name": "full"}] + [dict(level) for level in levels]
+        self.min_samples = min_samples
+        self.recover_fraction = recover_fraction
+        self.hold_seconds = hold_seconds
+        self.drop_ratio = drop_ratio
+        self.level = 0
+        self.changed_at = time.time()
+        self.history = deque(maxlen=MAX_HISTORY)
+        self.time_at_level = [0.0] * len(self.levels)
+        self._lags = deque(maxlen=window)
+        self._drops = deque(maxlen=window)  # frames dropped before each processed frame
+        self.last_lag_ms = None
+
+    @classmethod
+    def from_config(cls, camera_id, qos_cfg):
+        """None when disabled ("qos": false or {"enabled": false})."""
+        if qos_cfg is False or (isinstance(qos_cfg, dict) and not qos_cfg.get("enabled", True)):
+            return None
+        qos_cfg = qos_cfg if isinstance(qos_cfg, dict) else {}
+        levels = list(qos_cfg.get("levels", DEFAULT_LEVELS))
+        if qos_cfg.get("light_model"):
+            last = dict(levels[-1]) if levels else {}
+            last.update(name="light_model", model=qos_cfg["light_model"])
+            levels.append(last)
+        return cls(camera_id, budget_ms=qos_cfg.get("budget_ms", DEFAULT_BUDGET_MS), levels=levels,
+                   hold_seconds=qos_cfg.get("hold_seconds", 10.0), drop_ratio=qos_cfg.get("drop_ratio", 0.1))
+
+    def settings(self, base):
+        """base settings with the current level's overrides applied."""
+        merged = dict(base)
+        merged.update({k: v for k, v in self.levels[self.level].items() if k != "name"})
+        return merged
+
+    def observe(self, lag_ms, dropped=0):
+        """One processed frame. Returns True when the level changed."""
+        self._lags.append(lag_ms)
+        self._drops.append(dropped)
+        self.last_lag_ms = lag_ms
+        if len(self._lags) < self.min_samples:
+            return False
+
+        p95 = sorted(self._lags)[int(0.95 * (len(self._lags) - 1))]
+        dropped = sum(self._drops)
+        drop_share = dropped / float(len(self._drops) + dropped)
+        if p95 > self.budget_ms or drop_share > self.drop_ratio:
+            if self.level + 1 < len(self.levels):
+                reason = f"p95 lag {p95:.0f} ms > budget {self.budget_ms} ms" if p95 > self.budget_ms \
+                    else f"{drop_share:.0%} of frames dropped"
+                self._set_level(self.level + 1, reason)
+                return True
+        elif self.level > 0 and p95 < self.recover_fraction * self.budget_ms and dropped == 0 \
+                and time.time() - self.changed_at >= self.hold_seconds:
+            self._set_level(self.level - 1, f"p95 lag {p95:.0f} ms for {self.hold_seconds:.0f}s")
+            return True
+        return False
+
+    def _set_level(self, level, reason):
+        now = time.time()
+        self.time_at_level[self.level] += now - self.changed_at
+        change = {
+            "time": now,
+            "from": self.levels[self.level]["name"],
+            "to": self.levels[level]["name"],
+            "level": level,
+            "reason": reason
+        }
+        self.history.append(change)
+        print(f"[QOS] Camera {self.camera_id}: level {self.level} ({change['from']}) -> "
+              f"{level} ({change['to']}): {reason}")
+        self.level = level
+        self.changed_at = now
+        # The next decision only looks at frames processed at the new level
+        self._lags.clear()
+        self._drops.clear()
+
+    def status(self):
+        seconds = list(self.time_at_level)
+        seconds[self.level] += time.time() - self.changed_at
+        return {
+            "level": self.level,
+            "level_name": self.levels[self.level]["name"],
+            "budget_ms": self.budget_ms,
+            "last_lag_ms": None if self.last_lag_ms is None else round(self.last_lag_ms, 1),
+            "seconds_at_level": {l["name"]: round(s, 1) for l, s in zip(self.levels, seconds)},
+            "changes": list(self.history)
+        }
+
+
+class FrameClock:
+    """
+    Capture time and dropped-frame count of each frame read from a source:
+    the source's own capture timestamp when it has one (RingCapture,
+    LoopingFileCapture), else the stream position anchored to the wall clock
+    (FFmpeg / GStreamer captures), else the time the read returned.
+    """
+
+    def __init__(self, cap, fps):
+        self.cap = cap
+        self.frame_interval = 1.0 / (fps or 25)
+        self._anchor = None
+        self._last_pos = None
+        self._last_dropped = getattr(cap, "frames_dropped", 0)
+
+    def on_read(self):
+        """Call right after a successful read; returns (capture time, frames dropped before it)."""
+        import cv2
+        now = time.time()
+        capture_ns = getattr(self.cap, "last_capture_ns", None)
+        if capture_ns is not None:
+            dropped = getattr(self.cap, "frames_dropped", 0)
+            new_drops, self._last_dropped = dropped - self._last_dropped, dropped
+            return capture_ns / 1e9, max(0, new_drops)
+
+        pos = (self.cap.get(cv2.CAP_PROP_POS_MSEC) or 0) / 1000.0
+        if pos <= 0:
+            return now, 0
+        dropped = 0
+        if self._last_pos is None or pos < self._last_pos:
+            self._anchor = None  # first frame, or the stream restarted after a reconnect
+        else:
+            gap = pos - self._last_pos
+            if gap > 1.5 * self.frame_interval:
+                dropped = int(round(gap / self.frame_interval)) - 1
+        self._last_pos = pos
+        # The earliest wall time the stream could have started: the frame read
+        # with the least delay defines zero lag
+        anchor = now - pos
+        self._anchor = anchor if self._anchor is None else min(self._anchor, anchor)
+        return self._anchor + pos, dropped
@@ -0,0 +1,149 @@
+import numpy as np
+
+# -------------------------------
+# Raw model outputs
+# -------------------------------
+# What the detector returned for one frame before the class/confidence filter
+# and NMS: boxes in model input coordinates, confidences and class ids. Both
+# VideoProcessors go through select_detections(), so replayed, cached or live
+# outputs are post-processed identically.
+
+TARGET_CLASSES = ("jerrycan_bundle", "carton", "carton_brown")
+CONF_THRESHOLD = 0.6
+NMS_IOU_THRESHOLD = 0.5
+
+# On-disk record of one detection: 4 x float32 box, float32 conf, uint16 class
+DETECTION_DTYPE = np.dtype([("box", "<f4", (4,)), ("conf", "<f4"), ("cls", "<u2")])
+
+
+class RawDetections:
+    __slots__ = ("boxes", "conf", "cls")
+
+    def __init__(self, boxes, conf, cls):
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.conf = np.asarray(conf, dtype=np.float32).reshape(-1)
+        self.cls = np.asarray(cls, dtype=np.int64).reshape(-1)
+
+    def __len__(self):
+        return len(self.conf)
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, 4)), np.zeros(0), np.zeros(0))
+
+    @classmethod
+    def from_results(cls, results):
+        """From one ultralytics Results object."""
+        boxes = results.boxes
+        return cls(boxes.xyxy.cpu().numpy(), boxes.conf.cpu().numpy(), boxes.cls.cpu().numpy())
+
+    def to_bytes(self):
+        records = np.empty(len(self), dtype=DETECTION_DTYPE)
+        records["box"] = self.boxes
+        records["conf"] = self.conf
+        records["cls"] = self.cls
+        return records.tobytes()
+
+    @classmethod
+    def from_bytes(cls, buf):
+        records = np.frombuffer(buf, dtype=DETECTION_DTYPE)
+        return cls(records["box"], records["conf"], records["cls"])
+
+
+def select_detections(raw, names, conf_thresh=CONF_THRESHOLD, classes=TARGET_CLASSES, scale=None, offset=None):
+    """
+    Class/confidence filter of the raw outputs into the tracker's
+    ((x1, y1, x2, y2), label, conf) tuples. With scale=(sx, sy) the integer
+    model-space box is scaled back to the original frame, as for the
+    640x640-resized GStreamer path; offset=(ox, oy) then moves boxes of a
+    cropped ROI back into frame coordinates.
+    """
+    detections = []
+    if not len(raw):
+        return detections
+    keep = raw.conf.astype(np.float64) > conf_thresh  # compare as the old float(conf) did
+    for box, conf, cls_id in zip(raw.boxes[keep], raw.conf[keep], raw.cls[keep]):
+        label = names[int(cls_id)]
+        if label.lower() not in classes:
+            continue
+        x1, y1, x2, y2 = (int(v) for v in box)
+        if scale is not None:
+            scale_x, scale_y = scale
+            x1, x2 = int(x1 * scale_x), int(x2 * scale_x)
+            y1, y2 = int(y1 * scale_y), int(y2 * scale_y)
+        if offset is not None:
+            ox, oy = offset
+            x1, y1, x2, y2 = x1 + ox, y1 + oy, x2 + ox, y2 + oy
+        detections.append(((x1, y1, x2, y2), label, float(conf)))
+    return detections
+
+
+# -------------------------------
+# Detector input: ROI crop and input size
+# -------------------------------
+# Per camera, "roi" ([x1, y1, x2, y2] as fractions of the frame) restricts
+# inference to the conveyor area and "imgsz" sets the model input size (see
+# resolution_tuner.py). Without either, both processors behave as before.
+
+def roi_pixels(roi, width, height):
+    """ROI fractions -> integer pixel box, or None for the full frame."""
+    if not roi:
+        return None
+    x1, y1, x2, y2 = roi
+    box = (int(x1 * width), int(y1 * height), int(x2 * width), int(y2 * height))
+    if box == (0, 0, width, height):
+        return None
+    return box
+
+
+def _prepare_input(frame, imgsz, roi_px, resize):
+    offset = None
+    if roi_px is not None:
+        x1, y1, x2, y2 = roi_px
+        frame = frame[y1:y2, x1:x2]
+        offset = (x1, y1)
+    scale = None
+    if resize:
+        import cv2
+        h, w = frame.shape[:2]
+        frame = cv2.resize(frame, (imgsz, imgsz))
+        scale = (w / imgsz, h / imgsz)
+    return frame, scale, offset
+
+
+def run_detector(model, frame, imgsz=None, roi_px=None, resize=False, lock=None, **kwargs):
+    """
+    One model call on the frame, or on its roi_px crop. resize=True squashes
+    the input to imgsz x imgsz first (GStreamer path); otherwise the model
+    letterboxes it itself, at imgsz when given. Returns (RawDetections,
+    scale, offset) for select_detections. Only the model call itself runs
+    under `lock`.
+    """
+    frame, scale, offset = _prepare_input(frame, imgsz, roi_px, resize)
+    if imgsz:
+        kwargs["imgsz"] = imgsz
+    if lock is not None:
+        with lock:
+            results = model(frame, **kwargs)[0]
+    else:
+        results = model(frame, **kwargs)[0]
+    return RawDetections.from_results(results), scale, offset
+
+
+def run_detector_batch(model, frames, imgsz=None, roi_px=None, resize=False, lock=None, **kwargs):
+    """
+    run_detector over several frames in one batched model call; returns one
+    (RawDetections, scale, offset) per frame, in order.
+    """
+    if len(frames) == 1:
+        return [run_detector(model, frames[0], imgsz, roi_px, resize, lock, **kwargs)]
+    prepared = [_prepare_input(frame, imgsz, roi_px, resize) for frame in frames]
+    if imgsz:
+        kwargs["imgsz"] = imgsz
+    inputs = [p[0] for p in prepared]
+    if lock is not None:
+        with lock:
+            results = model(inputs, **kwargs)
+    else:
+        results = model(inputs, **kwargs)
+    return [(RawDetections.from_results(r), scale, offset) for r, (_, scale, offset) in zip(results, prepared)]
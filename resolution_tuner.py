@@ -0,0 +1,217 @@
+import argparse
+import json
+import os
+import statistics
+import time
+
+from raw_detections import select_detections, run_detector, roi_pixels, CONF_THRESHOLD, NMS_IOU_THRESHOLD
+from tracking import apply_nms, ObjectTracker
+from counting_zones import ZoneCounter, zones_from_config
+from camera_config import load_camera_config, save_camera_config
+
+# -------------------------------
+# Per-camera input size / ROI tuner
+# -------------------------------
+# Runs the detector over recorded clips of one camera for every candidate
+# (imgsz, roi) pair, measures inference latency and the count it produces,
+# and picks the cheapest candidate whose counts stay within --tolerance of the
+# reference: ground truth when given, else the largest input size on the full
+# frame. The choice is written to camera_config.json as "imgsz" and "roi",
+# which both VideoProcessors load at start.
+#
+#   python resolution_tuner.py 3 videos/cam_3_a.mp4 videos/cam_3_b.mp4 \
+#       --imgsz 320 416 512 640 --roi full zones --truth truth.json
+#
+# --path live (default) resizes to imgsz x imgsz like packmat_counter_g.py;
+# --path file lets the model letterbox like packmat_counter.py.
+
+
+def zones_roi(zone_cfgs, margin):
+    """Bounding box of all configured zone points, grown by `margin` (fractions)."""
+    points = [p for z in (zone_cfgs or []) for p in z.get("points", [])]
+    if not points:
+        return None
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    return [round(max(0.0, min(xs) - margin), 3), round(max(0.0, min(ys) - margin), 3),
+            round(min(1.0, max(xs) + margin), 3), round(min(1.0, max(ys) + margin), 3)]
+
+
+def parse_rois(specs, camera_config, margin):
+    rois = []
+    for spec in specs:
+        if spec == "full":
+            rois.append(("full", None))
+        elif spec == "zones":
+            roi = zones_roi(camera_config.get("zones"), margin)
+            if roi is None:
+                # The default counting line spans the width at 0.75 of the height
+                roi = [0.0, round(max(0.0, 0.75 - 2 * margin), 3), 1.0, 1.0]
+            rois.append(("zones", roi))
+        else:
+            roi = [float(v) for v in spec.split(",")]
+            if len(roi) != 4:
+                raise ValueError(f"ROI must be x1,y1,x2,y2 fractions, got {spec}")
+            rois.append((spec, roi))
+    return rois
+
+
+def count_clip(model, clip_path, camera_config, imgsz, roi, resize=True, frame_skip=2, device=None):
+    """Detector + tracker + zones over one clip; returns count, per-class counts and latencies."""
+    import cv2
+    cap = cv2.VideoCapture(clip_path)
+    if not cap.isOpened():
+        raise ValueError(f"Could not open clip {clip_path}")
+    width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    roi_px = roi_pixels(roi, width, height)
+    zones = zones_from_config(camera_config.get("zones"), width, height)
+    zone_counter = ZoneCounter(zones, verbose=False)
+    tracker = ObjectTracker(iou_threshold=camera_config.get("tracker_iou", 0.3),
+                            max_missed=camera_config.get("max_missed", 5))
+    conf_thresh = camera_config.get("conf_thresh", CONF_THRESHOLD)
+    nms_iou = camera_config.get("nms_iou", NMS_IOU_THRESHOLD)
+    kwargs = {"conf": 0.25, "verbose": False}
+    if device is not None:
+        kwargs["device"] = device
+
+    latencies = []
+    frame_idx = 0
+    while True:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        detections = []
+        if frame_idx % frame_skip == 0:
+            start = time.perf_counter()
+            raw, scale, offset = run_detector(model, frame, imgsz, roi_px, resize=resize, **kwargs)
+            latencies.append((time.perf_counter() - start) * 1000)
+            detections = select_detections(raw, model.names, conf_thresh, scale=scale, offset=offset)
+            detections = apply_nms(detections, iou_thresh=nms_iou)
+        tracker.update_tracks(detections)
+        zone_counter.update(tracker.tracks)
+        frame_idx += 1
+    cap.release()
+    return {"count": zone_counter.total, "by_class": zone_counter.counts_by_class(), "latencies": latencies}
+
+
+def count_error(result, reference):
+    """Per-class absolute miscounts relative to the reference total."""
+    ref_classes = reference.get("by_class") or {}
+    if ref_classes:
+        labels = set(ref_classes) | set(result["by_class"])
+        miss = sum(abs(result["by_class"].get(l, 0) - ref_classes.get(l, 0)) for l in labels)
+    else:
+        miss = abs(result["count"] - reference["count"])
+    return miss / max(reference["count"], 1)
+
+
+def tune(model, clips, camera_config, sizes, rois, tolerance, truth=None, resize=True, frame_skip=2, device=None):
+    # Warm the model once per input size so first-call setup is not timed
+    import numpy as np
+    warm = np.zeros((480, 640, 3), dtype=np.uint8)
+    for imgsz in sizes:
+        run_detector(model, warm, imgsz, None, resize=resize, conf=0.25, verbose=False)
+
+    candidates = []
+    for imgsz in sizes:
+        for roi_name, roi in rois:
+            print(f"[TUNE] imgsz={imgsz} roi={roi_name} ...")
+            per_clip = {clip: count_clip(model, clip, camera_config, imgsz, roi, resize, frame_skip, device)
+                        for clip in clips}
+            latencies = [ms for r in per_clip.values() for ms in r["latencies"]]
+            candidates.append({
+                "imgsz": imgsz,
+                "roi_name": roi_name,
+                "roi": roi,
+                "latency_ms": round(statistics.mean(latencies), 2) if latencies else None,
+                "latency_p95_ms": round(sorted(latencies)[int(0.95 * (len(latencies) - 1))], 2) if latencies else None,
+                "clips": {c: {"count": r["count"], "by_class": r["by_class"]} for c, r in per_clip.items()}
+            })
+
+    if truth is None:
+        # Largest input on the full frame is the reference
+        ref = max((c for c in candidates if c["roi"] is None), key=lambda c: c["imgsz"], default=candidates[-1])
+        truth = ref["clips"]
+        print(f"[TUNE] No ground truth; reference is imgsz={ref['imgsz']} roi={ref['roi_name']}")
+
+    for c in candidates:
+        errors = [count_error(c["clips"][clip], _as_reference(truth[clip])) for clip in clips]
+        c["max_error"] = round(max(errors), 4)
+        c["passes"] = c["max_error"] <= tolerance
+
+    passing = [c for c in candidates if c["passes"]]
+    best = min(passing, key=lambda c: c["latency_ms"]) if passing else None
+    return best, candidates
+
+
+def _as_reference(entry):
+    if isinstance(entry, dict):
+        return {"count": entry.get("count", sum((entry.get("by_class") or {}).values())),
+                "by_class": entry.get("by_class")}
+    return {"count": int(entry), "by_class": None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pick the cheapest detector input size / ROI per camera")
+    parser.add_argument("camera_id")
+    parser.add_argument("clips", nargs="+", help="recorded clips of this camera")
+    parser.add_argument("--model", default="packmat_i2.pt")
+    parser.add_argument("--imgsz", type=int, nargs="+", default=[320, 416, 512, 640, 800])
+    parser.add_argument("--roi", nargs="+", default=["full", "zones"],
+                        help="full, zones (zone bounding box + margin) or x1,y1,x2,y2 fractions")
+    parser.add_argument("--roi-margin", type=float, default=0.15)
+    parser.add_argument("--tolerance", type=float, default=0.05,
+                        help="max per-clip miscount as a share of the reference count")
+    parser.add_argument("--truth", default=None, help="JSON mapping clip -> count or {count, by_class}")
+    parser.add_argument("--path", choices=("live", "file"), default="live")
+    parser.add_argument("--frame-skip", type=int, default=None, help="default: 2 live, 1 file")
+    parser.add_argument("--dry-run", action="store_true", help="report only, do not write camera_config.json")
+    parser.add_argument("--out", default=None, help="report path (default tuning_cam_<id>.json)")
+    args = parser.parse_args()
+
+    from model_registry import get_model, resolve_device
+    device = resolve_device()
+    model = get_model(args.model, device)
+    camera_config = load_camera_config(args.camera_id)
+    rois = parse_rois(args.roi, camera_config, args.roi_margin)
+    resize = args.path == "live"
+    frame_skip = args.frame_skip or (2 if resize else 1)
+
+    truth = None
+    if args.truth:
+        with open(args.truth, "r") as f:
+            truth = json.load(f)
+        base_dir = os.path.dirname(os.path.abspath(args.truth))
+        truth = {c: truth.get(c, truth.get(os.path.relpath(os.path.abspath(c), base_dir))) for c in args.clips}
+        missing = [c for c, v in truth.items() if v is None]
+        if missing:
+            raise SystemExit(f"[TUNE] No ground truth for {missing}")
+
+    best, candidates = tune(model, args.clips, camera_config, sorted(args.imgsz), rois, args.tolerance,
+                            truth, resize, frame_skip, device)
+
+    print(f"{'imgsz':>5} {'roi':>8} {'ms':>7} {'p95 ms':>7} {'max err':>8}")
+    for c in sorted(candidates, key=lambda c: c["latency_ms"] or 0):
+        mark = "  <- chosen" if c is best else ("" if c["passes"] else "  x")
+        print(f"{c['imgsz']:>5} {c['roi_name']:>8} {c['latency_ms']:>7.1f} {c['latency_p95_ms']:>7.1f} "
+              f"{c['max_error']:>8.3f}{mark}")
+
+    out = args.out or f"tuning_cam_{args.camera_id}.json"
+    with open(out, "w") as f:
+        json.dump({"camera_id": args.camera_id, "path": args.path, "tolerance": args.tolerance,
+                   "chosen": best, "candidates": candidates}, f, indent=2)
+
+    if best is None:
+        print(f"[TUNE] No candidate within tolerance {args.tolerance}; camera config unchanged. Report: {out}")
+        return
+    settings = {"imgsz": best["imgsz"], "roi": best["roi"]}
+    if args.dry_run:
+        print(f"[TUNE] Would set camera {args.camera_id}: {settings}. Report: {out}")
+    else:
+        save_camera_config(args.camera_id, settings)
+        print(f"[TUNE] Camera {args.camera_id} set to {settings}. Report: {out}")
+
+
+if __name__ == "__main__":
+    main()
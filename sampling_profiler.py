@@ -0,0 +1,85 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+# -------------------------------
+# On-demand sampling profiler
+# -------------------------------
+# Session threads (recorder, inference, clip writer) register themselves with
+# their camera id and role; that is the only cost while nothing is being
+# profiled. A profile run samples sys._current_frames() of the selected
+# threads every `interval` seconds for `seconds` and aggregates the stacks in
+# collapsed format ("root;caller;callee count" per line), which flamegraph.pl,
+# speedscope and inferno read directly.
+
+DEFAULT_INTERVAL = 0.005
+MAX_SECONDS = 120
+
+_session_threads = {}  # thread ident -> "cam_<id>/<role>"
+_registry_lock = threading.Lock()
+_profile_lock = threading.Lock()  # one profile run per process at a time
+
+
+def register_thread(camera_id, role, thread=None):
+    ident = (thread or threading.current_thread()).ident
+    with _registry_lock:
+        _session_threads[ident] = f"cam_{camera_id}/{role}"
+
+
+def unregister_thread(thread=None):
+    ident = (thread or threading.current_thread()).ident
+    with _registry_lock:
+        _session_threads.pop(ident, None)
+
+
+def session_threads(camera_id=None):
+    """{thread ident: label} of the registered threads, optionally of one camera."""
+    prefix = None if camera_id is None else f"cam_{camera_id}/"
+    with _registry_lock:
+        return {ident: label for ident, label in _session_threads.items()
+                if prefix is None or label.startswith(prefix)}
+
+
+def process_threads(prefix):
+    """Every other thread of this process, labelled prefix/<thread name> (worker processes)."""
+    me = threading.get_ident()
+    return {t.ident: f"{prefix}/{t.name}" for t in threading.enumerate() if t.ident != me}
+
+
+def _collapse(frame):
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        parts.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    parts.reverse()
+    return ";".join(parts)
+
+
+def sample_stacks(threads, seconds, interval=DEFAULT_INTERVAL):
+    """
+    Sample the given {ident: label} threads; returns (Counter of collapsed
+    stacks, number of sampling rounds). Threads that exit meanwhile simply
+    stop contributing.
+    """
+    seconds = max(0.0, min(float(seconds), MAX_SECONDS))
+    counts = Counter()
+    rounds = 0
+    with _profile_lock:
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            frames = sys._current_frames()
+            for ident, label in threads.items():
+                frame = frames.get(ident)
+                if frame is not None:
+                    counts[f"{label};{_collapse(frame)}"] += 1
+            del frames
+            rounds += 1
+            time.sleep(interval)
+    return counts, rounds
+
+
+def to_collapsed(counts):
+    return "\n".join(f"{stack} {n}" for stack, n in counts.most_common()) + ("\n" if counts else "")
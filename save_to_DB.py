@@ -1,7 +1,7 @@
-import mysql.connector
-
 # Save truck_visit_id, output_path, and object count to the database
 def save_video_log(truck_visit_id, output_path, counter):
+    import mysql.connector
+
     try:
         conn = mysql.connector.connect(
             host="192.168.5.82",
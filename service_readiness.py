@@ -0,0 +1,85 @@
+import os
+import threading
+import time
+import traceback
+
+# -------------------------------
+# Background warm-up / readiness
+# -------------------------------
+# The Flask apps start serving immediately; heavy subsystems (cv2, torch,
+# ultralytics, mysql, the model itself) are loaded here on a background thread
+# and /readyz reports 200 only once every step has finished.
+
+
+def warmup_disabled():
+    return os.environ.get("PACKMAT_WARMUP", "1") == "0"
+
+
+def warmup_enabled(main=False):
+    """
+    False when PACKMAT_WARMUP=0. An app run as a script (main=True) uses
+    Flask's debug reloader, which executes the module in a file-watching
+    parent and in the serving child; only the child (WERKZEUG_RUN_MAIN)
+    warms up, so the model is not loaded onto the GPU twice.
+    """
+    if warmup_disabled():
+        return False
+    return not main or os.environ.get("WERKZEUG_RUN_MAIN") == "true"
+
+
+class ServiceReadiness:
+    def __init__(self, steps):
+        """steps: list of (name, zero-argument callable) run in order."""
+        self.steps = list(steps)
+        self.started_at = time.time()
+        self.state = "starting"
+        self.completed = {}
+        self.current = None
+        self.error = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="warmup", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        for name, step in self.steps:
+            self.current = name
+            start = time.time()
+            try:
+                step()
+            except Exception as e:
+                self.state = "failed"
+                self.error = f"{name}: {e}"
+                print(f"[ERROR] Warm-up step '{name}' failed: {e}")
+                traceback.print_exc()
+                return
+            self.completed[name] = round(time.time() - start, 3)
+        self.current = None
+        self.state = "ready"
+        self._ready.set()
+        print(f"[INFO] Service ready in {time.time() - self.started_at:.2f}s")
+
+    def skip(self):
+        """Warm-up disabled: report ready at once, subsystems load on first use."""
+        self.state = "skipped"
+        self._ready.set()
+        return self
+
+    def is_ready(self):
+        return self._ready.is_set()
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def status(self):
+        return {
+            "state": self.state,
+            "uptime_s": round(time.time() - self.started_at, 3),
+            "loading": self.current,
+            "completed_s": dict(self.completed),
+            "error": self.error
+        }
@@ -0,0 +1,165 @@
+import os
+import json
+import time
+
+# -------------------------------
+# Session checkpoints
+# -------------------------------
+# Small JSON snapshots of tracker + counter state per (camera, truck visit) so
+# a restarted worker continues the count instead of starting from zero.
+
+CHECKPOINT_DIR = "checkpoints"
+
+
+def checkpoint_path(camera_id, session_id, checkpoint_dir=CHECKPOINT_DIR):
+    return os.path.join(checkpoint_dir, f"cam_{camera_id}_{session_id}.json")
+
+
+def save_checkpoint(path, state):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)  # atomic, a crash never leaves half a file
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[WARN] Ignoring unreadable checkpoint {path}: {e}")
+        return None
+
+
+def remove_checkpoint(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def tracker_state(tracker):
+    return {
+        "next_id": tracker.next_id,
+        "counted_ids": sorted(tracker.counted_ids),
+        "tracks": {
+            str(obj_id): {
+                "bbox": list(data["bbox"]), "label": data["label"], "conf": data["conf"],
+                "last_y": data["last_y"], "missed": data["missed"],
+                "center": list(data["center"]),
+                "prev_center": None if data.get("prev_center") is None else list(data["prev_center"])
+            }
+            for obj_id, data in tracker.tracks.items()
+        }
+    }
+
+
+def restore_tracker(tracker, state):
+    # parse everything before touching the tracker so a bad checkpoint leaves it fresh
+    next_id = int(state["next_id"])
+    counted_ids = set(state["counted_ids"])
+    tracks = {
+        int(obj_id): {
+            "bbox": tuple(data["bbox"]), "label": data["label"], "conf": data["conf"],
+            "last_y": data["last_y"], "missed": data["missed"],
+            "center": tuple(data["center"]),
+            "prev_center": None if data["prev_center"] is None else tuple(data["prev_center"])
+        }
+        for obj_id, data in state["tracks"].items()
+    }
+    tracker.next_id, tracker.counted_ids, tracker.tracks = next_id, counted_ids, tracks
+
+
+def zone_counter_state(zone_counter):
+    return {
+        "zones": zone_counter.zone_names,
+        "labels": list(zone_counter.labels),
+        "counts": zone_counter.counts.tolist(),
+        "counted": {str(obj_id): bits for obj_id, bits in zone_counter.counted.items()}
+    }
+
+
+def check_zone_counter_state(zone_counter, state):
+    """
+    Raise ValueError unless the checkpointed counter fits `zone_counter`:
+    same zones, and a counts matrix of one row per zone and one column per label.
+    Returns the parsed (labels, counts, counted).
+    """
+    if state["zones"] != zone_counter.zone_names:
+        raise ValueError(f"Checkpoint zones {state['zones']} do not match {zone_counter.zone_names}")
+    labels = list(state["labels"])
+    if len(set(labels)) != len(labels):
+        raise ValueError(f"Checkpoint labels {labels} are not unique")
+    counts = state["counts"]
+    if len(counts) != len(zone_counter.zone_names) or any(len(row) != len(labels) for row in counts):
+        shape = [len(row) for row in counts]
+        raise ValueError(f"Checkpoint counts (row lengths {shape}) do not match "
+                         f"{len(zone_counter.zone_names)} zones x {len(labels)} labels")
+    counts = [[int(value) for value in row] for row in counts]
+    counted = {int(obj_id): int(bits) for obj_id, bits in state["counted"].items()}
+    return labels, counts, counted
+
+
+def restore_zone_counter(zone_counter, state):
+    labels, counts, counted = check_zone_counter_state(zone_counter, state)
+    columns = [zone_counter._label_id(label) for label in labels]
+    for z, row in enumerate(counts):
+        for c, value in zip(columns, row):
+            zone_counter.counts[z, c] = value
+    zone_counter.counted = counted
+
+
+class SessionCheckpointer:
+    """
+    Writes a checkpoint whenever the count changes and otherwise at most
+    every `interval` seconds; restore() loads the last one into a processor.
+    """
+
+    def __init__(self, camera_id, session_id, interval=2.0, checkpoint_dir=CHECKPOINT_DIR):
+        self.path = checkpoint_path(camera_id, session_id, checkpoint_dir)
+        self.camera_id = camera_id
+        self.session_id = session_id
+        self.interval = interval
+        self._last_save = 0.0
+        self._last_counter = None
+
+    def restore(self, processor):
+        start = time.perf_counter()
+        state = load_checkpoint(self.path)
+        if state is None:
+            return False
+        try:
+            # validate the counter first: nothing is restored unless both parts fit
+            check_zone_counter_state(processor.zone_counter, state["zone_counter"])
+            restore_tracker(processor.tracker, state["tracker"])
+            restore_zone_counter(processor.zone_counter, state["zone_counter"])
+        except (KeyError, ValueError, IndexError, TypeError) as e:
+            print(f"[WARN] Checkpoint {self.path} does not fit this session, starting fresh: {e}")
+            return False
+        processor.counter = processor.zone_counter.total
+        self._last_counter = processor.counter
+        print(f"[INFO] Camera {self.camera_id} resumed session {self.session_id} at count "
+              f"{processor.counter} ({(time.perf_counter() - start) * 1000:.1f} ms)")
+        return True
+
+    def maybe_save(self, processor):
+        now = time.time()
+        if processor.counter == self._last_counter and now - self._last_save < self.interval:
+            return
+        self.save(processor)
+
+    def save(self, processor):
+        save_checkpoint(self.path, {
+            "camera_id": str(self.camera_id),
+            "session_id": str(self.session_id),
+            "saved_at": time.time(),
+            "counter": processor.counter,
+            "tracker": tracker_state(processor.tracker),
+            "zone_counter": zone_counter_state(processor.zone_counter)
+        })
+        self._last_save = time.time()
+        self._last_counter = processor.counter
+
+    def discard(self):
+        remove_checkpoint(self.path)
@@ -0,0 +1,156 @@
+import random
+import threading
+import time
+
+# -------------------------------
+# Stream supervisor
+# -------------------------------
+# Owns the capture of one camera. A failed read marks the stream unhealthy and
+# reopens it with exponential backoff plus jitter instead of a fixed 1s retry,
+# and the wait is cut short as soon as the session is stopped.
+
+STATE_CONNECTING = "connecting"
+STATE_HEALTHY = "healthy"
+STATE_RECONNECTING = "reconnecting"
+STATE_FAILED = "failed"
+STATE_STOPPED = "stopped"
+
+
+class StreamSupervisor:
+    def __init__(self, open_capture, camera_id=0, base_delay=0.5, max_delay=30.0,
+                 jitter=0.3, max_retries=None):
+        """
+        open_capture: zero-argument callable returning a cv2.VideoCapture-like
+        object; it is called again on every reconnect attempt.
+        max_retries: give up after this many consecutive failed attempts
+        (None retries until stopped).
+        """
+        self.open_capture = open_capture
+        self.camera_id = camera_id
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.max_retries = max_retries
+
+        self.cap = None
+        self.state = STATE_CONNECTING
+        self.consecutive_failures = 0
+        self.reconnects = 0
+        self.frames_read = 0
+        self.last_frame_time = None
+        self.last_error = None
+        self.next_retry_at = None
+        self._stop_event = threading.Event()
+
+    def open(self):
+        self.cap = self.open_capture()
+        if self.cap is not None and self.cap.isOpened():
+            self.state = STATE_HEALTHY
+            return True
+        self.state = STATE_RECONNECTING
+        self.last_error = "open failed"
+        return False
+
+    def stop(self):
+        self._stop_event.set()
+
+    def backoff_delay(self):
+        delay = min(self.max_delay, self.base_delay * (2 ** max(0, self.consecutive_failures - 1)))
+        return delay * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def read(self):
+        """
+        Read the next frame, reconnecting with backoff while the stream is
+        down. Returns (False, None) only once the supervisor is stopped or
+        max_retries is exhausted.
+        """
+        while not self._stop_event.is_set():
+            if self.cap is not None:
+                ret, frame = self.cap.read()
+                if ret:
+                    if self.state != STATE_HEALTHY:
+                        print(f"[INFO] Camera {self.camera_id} stream healthy again")
+                    self.state = STATE_HEALTHY
+                    self.consecutive_failures = 0
+                    self.frames_read += 1
+                    self.last_frame_time = time.time()
+                    return True, frame
+                self.last_error = "read failed"
+
+            if not self._reconnect():
+                break
+
+        if self.state != STATE_FAILED:
+            self.state = STATE_STOPPED
+        return False, None
+
+    def _reconnect(self):
+        self.consecutive_failures += 1
+        if self.max_retries is not None and self.consecutive_failures > self.max_retries:
+            if self.max_retries == 0:
+                print(f"[INFO] Camera {self.camera_id} stream ended")
+            else:
+                print(f"[ERROR] Camera {self.camera_id} failed {self.max_retries} reconnects, giving up")
+            self.state = STATE_FAILED
+            return False
+
+        self.state = STATE_RECONNECTING
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+        delay = self.backoff_delay()
+        self.next_retry_at = time.time() + delay
+        print(f"[WARN] Reconnecting to camera {self.camera_id} in {delay:.2f}s "
+              f"(attempt {self.consecutive_failures})...")
+        if self._stop_event.wait(delay):
+            return False
+        self.next_retry_at = None
+
+        try:
+            self.cap = self.open_capture()
+        except Exception as e:
+            self.cap = None
+            self.last_error = str(e)
+            return True
+
+        if self.cap is not None and self.cap.isOpened():
+            self.reconnects += 1
+            print(f"[INFO] Reconnected to camera {self.camera_id}")
+        else:
+            self.last_error = "open failed"
+            print(f"[ERROR] Failed to reconnect to camera {self.camera_id}")
+        return True
+
+    def get(self, prop):
+        return self.cap.get(prop) if self.cap is not None else 0
+
+    @property
+    def last_capture_ns(self):
+        # Sources that timestamp their frames (LoopingFileCapture); None for cv2 captures
+        return getattr(self.cap, "last_capture_ns", None)
+
+    @property
+    def frames_dropped(self):
+        return getattr(self.cap, "frames_dropped", 0)
+
+    def isOpened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+    def health(self):
+        now = time.time()
+        return {
+            "camera_id": self.camera_id,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "reconnects": self.reconnects,
+            "frames_read": self.frames_read,
+            "seconds_since_last_frame": None if self.last_frame_time is None else round(now - self.last_frame_time, 3),
+            "next_retry_in": None if self.next_retry_at is None else round(max(0.0, self.next_retry_at - now), 3),
+            "last_error": self.last_error
+        }
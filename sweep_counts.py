@@ -0,0 +1,103 @@
+import argparse
+import itertools
+import json
+import os
+import time
+from multiprocessing import Pool
+
+from detection_replay import load_replay, replay_counts
+from raw_detections import CONF_THRESHOLD, NMS_IOU_THRESHOLD
+
+# -------------------------------
+# Parameter sweep over recorded detections
+# -------------------------------
+# Evaluates every combination of post-processing / tracker settings against
+# ground-truth counts, in parallel across cores, using replay files from
+# detection_replay.py. Ground truth is a JSON object mapping replay file to
+# the expected count (an int, or {"count": n, "by_class": {...}}).
+#
+#   python sweep_counts.py truth.json --conf 0.5 0.6 0.7 --nms 0.4 0.5 \
+#       --tracker-iou 0.2 0.3 --max-missed 3 5 8 --frame-skip 1 2 --out sweep_results.json
+
+PARAM_NAMES = ("conf_thresh", "nms_iou", "tracker_iou", "max_missed", "frame_skip")
+
+_replays = {}
+_truth = {}
+
+
+def _init_worker(truth):
+    # Each worker loads every replay once and keeps it for all its combinations
+    _truth.update(truth)
+    for path in truth:
+        _replays[path] = load_replay(path)
+
+
+def _expected(entry):
+    return entry["count"] if isinstance(entry, dict) else int(entry)
+
+
+def evaluate(params):
+    settings = dict(zip(PARAM_NAMES, params))
+    per_file = {}
+    abs_error = 0
+    frames = 0
+    seconds = 0.0
+    for path, replay in _replays.items():
+        result = replay_counts(replay, **settings)
+        expected = _expected(_truth[path])
+        error = result["count"] - expected
+        abs_error += abs(error)
+        frames += result["frames"]
+        seconds += result["seconds"]
+        per_file[path] = {"count": result["count"], "expected": expected, "error": error}
+    return {
+        "params": settings,
+        "total_abs_error": abs_error,
+        "exact_files": sum(1 for r in per_file.values() if r["error"] == 0),
+        "replay_fps": frames / seconds if seconds > 0 else 0.0,
+        "files": per_file
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep tracker / NMS / threshold settings over replay files")
+    parser.add_argument("truth", help="JSON mapping replay file -> expected count")
+    parser.add_argument("--conf", type=float, nargs="+", default=[CONF_THRESHOLD])
+    parser.add_argument("--nms", type=float, nargs="+", default=[NMS_IOU_THRESHOLD])
+    parser.add_argument("--tracker-iou", type=float, nargs="+", default=[0.3])
+    parser.add_argument("--max-missed", type=int, nargs="+", default=[5])
+    parser.add_argument("--frame-skip", type=int, nargs="+", default=[None],
+                        help="default: each replay's recorded stride")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--out", default="sweep_results.json")
+    args = parser.parse_args()
+
+    with open(args.truth, "r") as f:
+        truth = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(args.truth))
+    truth = {p if os.path.isabs(p) else os.path.join(base_dir, p): v for p, v in truth.items()}
+
+    grid = list(itertools.product(args.conf, args.nms, args.tracker_iou, args.max_missed, args.frame_skip))
+    print(f"[SWEEP] {len(grid)} combinations x {len(truth)} files on {args.workers} workers")
+
+    start = time.time()
+    with Pool(args.workers, initializer=_init_worker, initargs=(truth,)) as pool:
+        results = pool.map(evaluate, grid, chunksize=max(1, len(grid) // (args.workers * 4)))
+    elapsed = time.time() - start
+
+    results.sort(key=lambda r: (r["total_abs_error"], -r["exact_files"]))
+    print(f"[SWEEP] done in {elapsed:.1f}s")
+    print(f"{'abs err':>7} {'exact':>5}  {'conf':>5} {'nms':>5} {'t_iou':>5} {'missed':>6} {'skip':>4} {'replay fps':>10}")
+    for r in results[:args.top]:
+        p = r["params"]
+        print(f"{r['total_abs_error']:>7} {r['exact_files']:>5}  {p['conf_thresh']:>5.2f} {p['nms_iou']:>5.2f} "
+              f"{p['tracker_iou']:>5.2f} {p['max_missed']:>6} {p['frame_skip'] or 'rec':>4} {r['replay_fps']:>10.0f}")
+
+    with open(args.out, "w") as f:
+        json.dump({"seconds": elapsed, "results": results}, f, indent=2)
+    print(f"[SWEEP] full results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
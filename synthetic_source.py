@@ -0,0 +1,289 @@
+import time
+
+import numpy as np
+
+# -------------------------------
+# Synthetic streams and stub detector
+# -------------------------------
+# For benchmarks and soak / load runs without cameras or a model. A scene is
+# a conveyor view with solid coloured boxes moving top to bottom, one colour
+# per class; StubDetector finds those boxes again by colour, so the whole
+# processor path (resize, select_detections, NMS, tracker, zones, overlay,
+# writer) runs as in production with a cheap, deterministic "model".
+
+NAMES = {0: "jerrycan_bundle", 1: "carton", 2: "carton_brown"}
+CLASS_COLORS = {0: (0, 255, 0), 1: (0, 0, 255), 2: (255, 0, 0)}  # BGR
+_COLOR_TOLERANCE = 80
+
+
+class SyntheticScene:
+    """
+    Boxes of box_w x box_h spawn every `spacing` frames above the frame and
+    move down `speed` px per frame in `lanes` columns; classes cycle through
+    `classes`.
+    """
+
+    def __init__(self, width=960, height=540, speed=6, spacing=15, box_w=120, box_h=80,
+                 lanes=4, classes=(0, 1, 2)):
+        self.width = width
+        self.height = height
+        self.speed = speed
+        self.spacing = spacing
+        self.box_w = box_w
+        self.box_h = box_h
+        self.lanes = lanes
+        self.classes = classes
+        self._background = np.full((height, width, 3), 40, dtype=np.uint8)
+
+    def _object(self, k):
+        lane_w = self.width // self.lanes
+        x1 = (k % self.lanes) * lane_w + (lane_w - self.box_w) // 2
+        return x1, self.classes[k % len(self.classes)]
+
+    def boxes(self, frame_idx):
+        """(x1, y1, x2, y2, class_id) of every box visible on frame_idx."""
+        out = []
+        k = max(0, (frame_idx - (self.height + self.box_h) // self.speed) // self.spacing - 1)
+        while k * self.spacing <= frame_idx:
+            y1 = -self.box_h + (frame_idx - k * self.spacing) * self.speed
+            if y1 < self.height:
+                x1, cls_id = self._object(k)
+                out.append((x1, y1, x1 + self.box_w, y1 + self.box_h, cls_id))
+            k += 1
+        return out
+
+    def frame(self, frame_idx):
+        frame = self._background.copy()
+        for x1, y1, x2, y2, cls_id in self.boxes(frame_idx):
+            frame[max(y1, 0):max(y2, 0), x1:x2] = CLASS_COLORS[cls_id]
+        return frame
+
+    def expected_counts(self, n_frames, line_frac=0.75, margin_frames=6):
+        """
+        Per-class number of boxes whose centre crosses the horizontal line at
+        line_frac of the height before the last `margin_frames` frames.
+        """
+        line_y = int(self.height * line_frac)
+        counts = {}
+        k = 0
+        while k * self.spacing < n_frames:
+            cross = k * self.spacing + (line_y + self.box_h // 2) / self.speed
+            if cross < n_frames - margin_frames:
+                label = NAMES[self._object(k)[1]]
+                counts[label] = counts.get(label, 0) + 1
+            k += 1
+        return counts
+
+
+class SyntheticCapture:
+    """
+    cv2.VideoCapture-like source over a SyntheticScene. realtime=False hands
+    out frames as fast as they are read (accelerated soak / load runs).
+    """
+
+    def __init__(self, scene, n_frames, fps=25, realtime=False):
+        self.scene = scene
+        self.n_frames = n_frames
+        self.fps = fps
+        self.realtime = realtime
+        self.frame_idx = 0
+        self._next_due = time.time()
+        self._stopped = False
+
+    def isOpened(self):
+        return not self._stopped
+
+    def get(self, prop):
+        import cv2
+        if prop == cv2.CAP_PROP_FRAME_WIDTH:
+            return self.scene.width
+        if prop == cv2.CAP_PROP_FRAME_HEIGHT:
+            return self.scene.height
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if prop == cv2.CAP_PROP_FRAME_COUNT:
+            return self.n_frames
+        return 0
+
+    def read(self):
+        if self._stopped or self.frame_idx >= self.n_frames:
+            return False, None
+        if self.realtime:
+            delay = self._next_due - time.time()
+            if delay > 0:
+                time.sleep(delay)
+            self._next_due += 1.0 / self.fps
+        frame = self.scene.frame(self.frame_idx)
+        self.frame_idx += 1
+        return True, frame
+
+    def stop(self):
+        self._stopped = True
+
+    def release(self):
+        self._stopped = True
+
+    def health(self):
+        return {"state": "synthetic", "frames": self.frame_idx}
+
+
+def write_clip(path, scene, n_frames, fps=25):
+    """Render a scene to a video file (mp4v) for file-based runs."""
+    import cv2
+    out = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), fps, (scene.width, scene.height))
+    for i in range(n_frames):
+        out.write(scene.frame(i))
+    out.release()
+    return path
+
+
+# -------------------------------
+# Stub detector
+# -------------------------------
+
+class _Array:
+    # Stands in for a torch tensor: .cpu().numpy()
+    def __init__(self, values):
+        self.values = values
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.values
+
+    def __len__(self):
+        return len(self.values)
+
+
+class _Boxes:
+    def __init__(self, xyxy, conf, cls):
+        self.xyxy = _Array(xyxy)
+        self.conf = _Array(conf)
+        self.cls = _Array(cls)
+
+    def __len__(self):
+        return len(self.conf)
+
+
+class _Result:
+    def __init__(self, boxes):
+        self.boxes = boxes
+
+
+class StubDetector:
+    """
+    Callable like an ultralytics YOLO model on one BGR frame: finds the
+    scene's coloured boxes and returns [result] with .boxes.xyxy/conf/cls.
+    Like YOLO it sees the frame scaled to imgsz (long side, default 640) and
+    misses objects smaller than `min_area` px there. `work_ms` adds a fixed
+    busy delay per call to stand in for GPU latency.
+    """
+
+    def __init__(self, names=None, conf=0.9, work_ms=0.0, min_area=50):
+        self.names = dict(names or NAMES)
+        self.conf = conf
+        self.work_ms = work_ms
+        self.min_area = min_area
+        self.calls = 0
+
+    def __call__(self, frame, imgsz=640, **kwargs):
+        if isinstance(frame, (list, tuple)):
+            # Batched call: one fixed delay for the whole batch, like a GPU
+            results = [self._detect(f, imgsz) for f in frame]
+            self.calls += 1
+            if self.work_ms:
+                time.sleep(self.work_ms / 1000.0)
+            return results
+        self.calls += 1
+        if self.work_ms:
+            time.sleep(self.work_ms / 1000.0)
+        return [self._detect(frame, imgsz)]
+
+    def _detect(self, frame, imgsz):
+        import cv2
+        h, w = frame.shape[:2]
+        scale = (imgsz or 640) / float(max(h, w))
+        if scale != 1.0:
+            frame = cv2.resize(frame, (max(1, int(round(w * scale))), max(1, int(round(h * scale)))))
+        boxes, confs, classes = [], [], []
+        for cls_id, color in CLASS_COLORS.items():
+            lo = np.clip(np.array(color) - _COLOR_TOLERANCE, 0, 255).astype(np.uint8)
+            hi = np.clip(np.array(color) + _COLOR_TOLERANCE, 0, 255).astype(np.uint8)
+            mask = cv2.inRange(frame, lo, hi)
+            n, _, stats, _ = cv2.connectedComponentsWithStats(mask)
+            for x, y, bw, bh, area in stats[1:n]:
+                if area < self.min_area:
+                    continue
+                boxes.append((x / scale, y / scale, (x + bw) / scale, (y + bh) / scale))
+                confs.append(self.conf)
+                classes.append(cls_id)
+        return _Result(_Boxes(np.array(boxes, dtype=np.float32).reshape(-1, 4),
+                              np.array(confs, dtype=np.float32),
+                              np.array(classes, dtype=np.float32)))
+
+
+# -------------------------------
+# Looping file source
+# -------------------------------
+# "loop:<path>" stands in for a camera URL: the file is read at its own frame
+# rate and starts over at the end, so a session runs until it is stopped
+# (load tests without cameras). Like a live camera behind a dropping appsink,
+# frames the reader was too slow for are skipped and counted in frames_dropped.
+
+LOOP_PREFIX = "loop:"
+
+
+def is_loop_source(source):
+    return str(source).startswith(LOOP_PREFIX)
+
+
+class LoopingFileCapture:
+    def __init__(self, source):
+        import cv2
+        self.path = str(source)[len(LOOP_PREFIX):]
+        self.cap = cv2.VideoCapture(self.path)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 25
+        self._next_due = time.time()
+        self.last_capture_ns = None  # when the frame was due, like a camera's capture time
+        self.frames_dropped = 0
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def read(self):
+        delay = self._next_due - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        late = int((time.time() - self._next_due) * self.fps)
+        if late > self.fps:
+            import cv2
+            total = int(self.cap.get(cv2.CAP_PROP_FRAME_COUNT)) or 1
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, (int(self.cap.get(cv2.CAP_PROP_POS_FRAMES)) + late) % total)
+        else:
+            for _ in range(late):
+                self._next_frame(grab_only=True)
+        self.frames_dropped += late
+        self._next_due += late / self.fps
+        self.last_capture_ns = int(self._next_due * 1e9)
+        self._next_due += 1.0 / self.fps
+        return self._next_frame()
+
+    def _next_frame(self, grab_only=False):
+        import cv2
+        for _ in range(2):
+            if grab_only:
+                if self.cap.grab():
+                    return True, None
+            else:
+                ret, frame = self.cap.read()
+                if ret:
+                    return ret, frame
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        return False, None
+
+    def release(self):
+        self.cap.release()
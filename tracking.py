@@ -0,0 +1,100 @@
+# -------------------------------
+# Shared IOU / NMS / tracker used by both VideoProcessor variants
+# -------------------------------
+
+def iou(b1, b2):
+    x1, y1, x2, y2 = b1
+    x1p, y1p, x2p, y2p = b2
+    xi1, yi1 = max(x1, x1p), max(y1, y1p)
+    xi2, yi2 = min(x2, x2p), min(y2, y2p)
+    inter_area = max(0, xi2 - xi1) * max(0, yi2 - yi1)
+    b1_area = (x2 - x1) * (y2 - y1)
+    b2_area = (x2p - x1p) * (y2p - y1p)
+    union_area = b1_area + b2_area - inter_area
+    return inter_area / union_area if union_area > 0 else 0
+
+
+def apply_nms(detections, iou_thresh=0.5):
+    filtered = []
+    detections.sort(key=lambda x: x[2], reverse=True)
+    while detections:
+        best = detections.pop(0)
+        filtered.append(best)
+        detections = [
+            d for d in detections
+            if d[1] != best[1] or iou(d[0], best[0]) < iou_thresh
+        ]
+    return filtered
+
+
+class ObjectTracker:
+    """
+    Greedy IOU tracker.
+
+    Every track keeps its current box centre ('center') and the centre it had
+    on the previous matched frame ('prev_center', None for a new track) so the
+    zone counter can test movement segments against counting lines/polygons.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_missed=5):
+        self.tracks = {}
+        self.iou_threshold = iou_threshold
+        self.max_missed = max_missed
+        self.next_id = 0
+        self.counted_ids = set()
+
+    def update_tracks(self, detections, line_y=None, counter=0):
+        """
+        Match detections to tracks. When line_y is given the legacy
+        top-to-bottom line count is applied and the updated counter returned;
+        zone-based counting is done separately by counting_zones.ZoneCounter.
+        """
+        updated_tracks = {}
+        used_ids = set()
+
+        for bbox, label, conf in detections:
+            best_iou = 0
+            best_id = None
+            for obj_id, data in self.tracks.items():
+                current_iou = iou(bbox, data['bbox'])
+                if (current_iou > best_iou and current_iou > self.iou_threshold and obj_id not in used_ids):
+                    best_iou = current_iou
+                    best_id = obj_id
+
+            cx = (bbox[0] + bbox[2]) // 2
+            cy = (bbox[1] + bbox[3]) // 2
+
+            if best_id is not None:
+                updated_tracks[best_id] = {
+                    'bbox': bbox, 'label': label, 'conf': conf,
+                    'last_y': cy, 'missed': 0,
+                    'center': (cx, cy),
+                    'prev_center': self.tracks[best_id]['center']
+                }
+                if line_y is not None and best_id not in self.counted_ids:
+                    last_y = self.tracks[best_id]['last_y']
+                    if last_y < line_y and cy >= line_y:
+                        counter += 1
+                        self.counted_ids.add(best_id)
+                        print(f"[COUNTED] ID {best_id} crossed. Count={counter}")
+                used_ids.add(best_id)
+            else:
+                updated_tracks[self.next_id] = {
+                    'bbox': bbox, 'label': label, 'conf': conf,
+                    'last_y': cy, 'missed': 0,
+                    'center': (cx, cy),
+                    'prev_center': None
+                }
+                self.next_id += 1
+
+        for obj_id, data in self.tracks.items():
+            if obj_id not in used_ids:
+                data['missed'] += 1
+                if data['missed'] < self.max_missed:
+                    updated_tracks[obj_id] = data
+
+        self.tracks = updated_tracks
+        # Ids are never reused, so a dropped track's counted flag can go too
+        if self.counted_ids:
+            self.counted_ids.intersection_update(updated_tracks)
+        return counter
@@ -1,10 +1,24 @@
 import time
 from video_recorder import record_camera_stream
 from get_rtsp_link import get_rtsp_link
-from packmat_counter_2 import VideoProcessor
+from packmat_counter import VideoProcessor
 from video_tracker import mark_video_as_processed
+from camera_config import load_camera_config
 import os
 
+# Reprocessing a recording with unchanged weights reads detections from here;
+# opened on first use, so importing this module creates no cache file
+_inference_cache = None
+
+
+def _get_inference_cache():
+    global _inference_cache
+    if _inference_cache is None:
+        from inference_cache import InferenceCache
+        _inference_cache = InferenceCache()
+    return _inference_cache
+
+
 def process_camera(camera_id, duration=120):
     print(f"Starting process for camera ID: {camera_id}")
 
@@ -22,7 +36,12 @@ def process_camera(camera_id, duration=120):
 
     # Step 2: Process with inference model
     print(f"[{camera_id}] Starting model inference on: {recorded_path}")
-    processor = VideoProcessor(video_path=recorded_path, model_path=r"packmat_model.pt")
+    # Offline: batch frames for throughput, sized to the free memory. Cascade
+    # cameras run frame by frame without the cache
+    cascade_cfg = load_camera_config(camera_id).get("cascade")
+    cache = None if cascade_cfg and cascade_cfg.get("light_model") else _get_inference_cache()
+    processor = VideoProcessor(video_path=recorded_path, model_path=r"packmat_model.pt",
+                               camera_id=camera_id, inference_cache=cache, batch_size="auto")
     processor.process_video()  # Saves output to /output folder
 
     # Step 3: Mark as processed
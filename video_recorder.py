@@ -2,14 +2,18 @@ import cv2
 import os
 from datetime import datetime
 import time
+from synthetic_source import is_loop_source, LoopingFileCapture
 
-def record_camera_stream(camera_id, rtsp_url, duration=120, output_folder=r"videos"):
+def record_camera_stream(camera_id, rtsp_url, duration=120, output_folder=r"videos", stop_event=None):
     os.makedirs(output_folder, exist_ok=True)
 
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
     output_file = os.path.join(output_folder, f"cam_{camera_id}_{timestamp}.mp4")
 
-    cap = cv2.VideoCapture(rtsp_url)
+    if is_loop_source(rtsp_url):
+        cap = LoopingFileCapture(rtsp_url)  # local file standing in for a camera
+    else:
+        cap = cv2.VideoCapture(rtsp_url)
     if not cap.isOpened():
         print(f"[{camera_id}] Error: Cannot open RTSP stream.")
         return None
@@ -31,6 +35,8 @@ def record_camera_stream(camera_id, rtsp_url, duration=120, output_folder=r"vide
     start_time = time.time()
 
     while time.time() - start_time < duration:
+        if stop_event is not None and stop_event.is_set():
+            break
         ret, frame = cap.read()
         if not ret:
             print(f"[{camera_id}] Failed to grab frame.")